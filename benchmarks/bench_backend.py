@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Headless benchmarks of the backend: client/server protocol and workers.
+
+The benchmark starts a backend process (``benchmarks/server.py``), connects
+to it with a plain python socket (no Qt needed) and measures the round trip
+latency and the throughput of the following requests, for several document
+sizes:
+
+    - ``echo``: echo_worker with the document text as payload (protocol
+      overhead)
+    - ``findall``: occurrences of a word, the text is sent with the request
+    - ``findall-sync``: same as above, the text is synchronized once and the
+      requests only send the document handle
+    - ``completion``: CodeCompletionWorker with DocumentWordsProvider
+      (synchronized document)
+
+The results are written as json (see ``--output``) so that two runs can be
+compared::
+
+    python benchmarks/bench_backend.py --sizes 1000 10000 -o before.json
+
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..')))
+
+from pyqode.core import __version__
+from pyqode.core.backend.serialization import HEADER, JsonCodec, get_codec
+
+
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                      'server.py')
+
+
+def make_document(nb_lines):
+    """
+    Generates a python like document with ``nb_lines`` lines.
+    """
+    lines = []
+    for i in range(nb_lines):
+        if i % 4 == 0:
+            lines.append('def function_%d(arg, other_arg):' % i)
+        elif i % 4 == 1:
+            lines.append('    value = arg * %d + other_arg' % i)
+        elif i % 4 == 2:
+            lines.append('    return value  # comment %d' % i)
+        else:
+            lines.append('')
+    return '\n'.join(lines)
+
+
+class Backend(object):
+    """
+    Starts a backend process and communicates with it using a blocking
+    socket.
+    """
+    def __init__(self, transport='tcp', codec='json', pool_size=1):
+        if transport == 'local':
+            self.address = os.path.join(
+                tempfile.gettempdir(),
+                'pyqode-bench-%s.sock' % uuid.uuid4().hex[:8])
+            options = ['--transport', 'local']
+        else:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.bind(('127.0.0.1', 0))
+            self.address = sock.getsockname()[1]
+            sock.close()
+            options = []
+        # measure the workers, not the result cache
+        options += ['--pool-size', str(pool_size), '--cache-size', '0']
+        started = time.time()
+        self.process = subprocess.Popen(
+            [sys.executable, SERVER, str(self.address)] + options,
+            stdout=open(os.devnull, 'w'))
+        self.sock = self._connect(transport)
+        self.codec = JsonCodec
+        self.send({'hello': {'codecs': [codec]}})
+        self.codec = get_codec(self.recv()['hello']['codec'])
+        #: Time needed to start the backend and establish the connection
+        self.startup_time = time.time() - started
+
+    def _connect(self, transport, timeout=30):
+        deadline = time.time() + timeout
+        while True:
+            try:
+                if transport == 'local':
+                    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                    sock.connect(self.address)
+                else:
+                    sock = socket.create_connection(
+                        ('127.0.0.1', self.address))
+                    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY,
+                                    1)
+                return sock
+            except socket.error:
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.01)
+
+    def close(self):
+        self.sock.close()
+        self.process.terminate()
+        self.process.wait()
+
+    def send(self, obj):
+        msg = self.codec.dumps(obj)
+        self.sock.sendall(HEADER.pack(len(msg)) + msg)
+        return len(msg)
+
+    def _recv_bytes(self, size):
+        data = bytearray(size)
+        view = memoryview(data)
+        pos = 0
+        while pos < size:
+            nb_bytes = self.sock.recv_into(view[pos:], size - pos)
+            if not nb_bytes:
+                raise EOFError('backend closed the connection')
+            pos += nb_bytes
+        return data
+
+    def recv(self):
+        size = HEADER.unpack(bytes(self._recv_bytes(HEADER.size)))[0]
+        return self.codec.loads(self._recv_bytes(size))
+
+    def request(self, worker, data, **fields):
+        """ Sends a request, returns the request id and the payload size """
+        request_id = str(uuid.uuid4())
+        obj = {'request_id': request_id, 'worker': worker, 'data': data}
+        obj.update(fields)
+        return request_id, self.send(obj)
+
+    def sync(self, document_id, text):
+        """ Synchronizes a document, returns its handle """
+        self.send({'sync': {'id': document_id, 'version': 1, 'text': text}})
+        return {'id': document_id, 'version': 1}
+
+    def stats(self):
+        self.send({'request_id': 'stats', 'stats': True})
+        return self.recv()['results']
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = int(round((len(values) - 1) * percent / 100.0))
+    return values[index]
+
+
+def measure(backend, worker, make_data, repeat, **fields):
+    """
+    Measures the latency (sequential requests) and the throughput (pipelined
+    requests) of a worker.
+    """
+    latencies = []
+    payload = 0
+    for i in range(repeat):
+        start = time.time()
+        request_id, payload = backend.request(worker, make_data(), **fields)
+        response = backend.recv()
+        latencies.append(time.time() - start)
+        assert response['request_id'] == request_id
+        assert not response.get('resync'), 'document not in sync'
+    start = time.time()
+    for i in range(repeat):
+        backend.request(worker, make_data(), **fields)
+    for i in range(repeat):
+        backend.recv()
+    elapsed = time.time() - start
+    return {
+        'request_size': payload,
+        'latency_ms': {
+            'min': min(latencies) * 1000,
+            'median': percentile(latencies, 50) * 1000,
+            'p95': percentile(latencies, 95) * 1000,
+            'max': max(latencies) * 1000,
+        },
+        'throughput_rps': repeat / elapsed if elapsed else None,
+    }
+
+
+def run_benchmarks(backend, sizes, repeat):
+    echo = 'pyqode.core.backend.workers.echo_worker'
+    findall = 'pyqode.core.backend.workers.findall'
+    completion = 'pyqode.core.backend.workers.CodeCompletionWorker'
+    results = []
+    for nb_lines in sizes:
+        text = make_document(nb_lines)
+        handle = backend.sync('bench-%d' % nb_lines, text)
+
+        def findall_data(string=None):
+            data = {'sub': 'value', 'regex': False, 'whole_word': True,
+                    'case_sensitive': True}
+            if string is not None:
+                data['string'] = string
+            return data
+
+        def completion_data():
+            return {'line': nb_lines // 2, 'column': 4, 'path': '',
+                    'encoding': 'utf-8', 'prefix': '', 'request_id': 0,
+                    'abs_pos': 0, 'mime_type': 'text/x-python'}
+
+        benchmarks = [
+            ('echo', echo, lambda: text, {}),
+            ('findall', findall, lambda: findall_data(text), {}),
+            ('findall-sync', findall, findall_data,
+             {'document': dict(handle, key='string')}),
+            ('completion', completion, completion_data,
+             {'document': dict(handle, key='code')}),
+        ]
+        for name, worker, make_data, fields in benchmarks:
+            result = measure(backend, worker, make_data, repeat, **fields)
+            result.update({'name': name, 'lines': nb_lines,
+                           'text_size': len(text)})
+            results.append(result)
+            print('%-14s %8d lines: median %9.2f ms, p95 %9.2f ms, '
+                  '%8.1f req/s' % (
+                      name, nb_lines, result['latency_ms']['median'],
+                      result['latency_ms']['p95'],
+                      result['throughput_rps'] or 0))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[1000, 10000, 100000, 1000000],
+                        help='document sizes (number of lines)')
+    parser.add_argument('--repeat', type=int, default=10,
+                        help='number of requests per measure')
+    parser.add_argument('--codec', default='json',
+                        help='codec proposed to the backend')
+    parser.add_argument('--transport', choices=['tcp', 'local'],
+                        default='tcp')
+    parser.add_argument('--pool-size', type=int, default=1)
+    parser.add_argument('-o', '--output', help='json file where the results '
+                        'are written')
+    args = parser.parse_args()
+
+    backend = Backend(args.transport, args.codec, args.pool_size)
+    try:
+        results = run_benchmarks(backend, args.sizes, args.repeat)
+        report = {
+            'date': datetime.datetime.now().isoformat(),
+            'pyqode.core': __version__,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'codec': backend.codec.name,
+            'transport': args.transport,
+            'pool_size': args.pool_size,
+            'repeat': args.repeat,
+            'startup_time': backend.startup_time,
+            'results': results,
+            'server_stats': backend.stats(),
+        }
+    finally:
+        backend.close()
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print('results written to %s' % args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,18 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Backend used by the benchmarks (same configuration as the test server).
+"""
+import os
+import sys
+# make sure we benchmark the working copy of pyqode.core
+sys.path.insert(0, os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..')))
+
+from pyqode.core import backend
+
+
+if __name__ == '__main__':
+    backend.CodeCompletionWorker.providers.append(
+        backend.DocumentWordsProvider())
+    backend.serve_forever()
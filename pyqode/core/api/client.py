@@ -5,14 +5,18 @@ user throught the backend manager (
 
 """
 import locale
-import json
 import logging
+import os
 import socket
-import struct
 import sys
+import tempfile
+import time
 import uuid
 from weakref import ref
-from pyqode.qt import QtCore, QtNetwork
+from pyqode.qt import QtCore, QtGui, QtNetwork
+from pyqode.core.backend.serialization import (
+    HEADER, JsonCodec, available_codecs, get_codec)
+from pyqode.core.backend.stats import CONNECTION, Statistics
 
 
 def _logger():
@@ -160,66 +164,453 @@ else:
             return self._obj is not None and self._obj() is None
 
 
-class JsonTcpClient(QtNetwork.QTcpSocket):
+def _callback_ref(on_receive):
     """
-    A json tcp client socket used to start and communicate with the pyqode
-    backend.
+    Returns a weak reference to the ``on_receive`` callback (or None if there
+    is no callback).
+    """
+    if on_receive:
+        try:
+            return WeakMethod(on_receive)
+        except TypeError:
+            # unbound method (i.e. free function)
+            return ref(on_receive)
+    return None
+
+
+class DocumentSync(object):
+    """
+    Keeps the backend mirror of a QTextDocument up to date.
+
+    The text changes made to the document are recorded and sent to the
+    backend (as a sync message) right before the next request that needs the
+    document text. The request then only contains a document handle instead
+    of the whole text.
+
+    The whole text is sent again when the changes cannot be tracked reliably
+    (e.g. the document length does not match the length computed from the
+    recorded changes) or when there are too many changes.
+    """
+    #: Maximum number of changes that can be sent in a sync message, when
+    #: exceeded the whole text is sent instead.
+    max_changes = 512
+
+    def __init__(self, document):
+        #: Unique id of the document
+        self.id = str(uuid.uuid4())
+        #: Version of the document, incremented each time a sync message is
+        #: sent.
+        self.version = 0
+        self.document = document
+        self._changes = []
+        self._full = True
+        self._length = self._document_length()
+        document.contentsChange.connect(self._on_contents_change)
+
+    def close(self):
+        """
+        Stops tracking the document changes.
+        """
+        try:
+            self.document.contentsChange.disconnect(self._on_contents_change)
+        except (RuntimeError, TypeError):
+            pass  # document already deleted
+
+    def text(self):
+        """
+        Returns the document text. The whole text will be sent with the next
+        sync message.
+        """
+        self._full = True
+        self._changes[:] = []
+        return self.document.toPlainText()
+
+    def flush(self):
+        """
+        Returns the sync message that brings the backend mirror up to date
+        (or None if there is no change) and the handle of the document.
+        """
+        message = None
+        if self._full or self._changes:
+            self.version += 1
+            message = {'id': self.id, 'version': self.version}
+            if self._full:
+                message['text'] = self.document.toPlainText()
+            else:
+                message['changes'] = self._changes
+            self._full = False
+            self._changes = []
+        return message, {'id': self.id, 'version': self.version}
+
+    def _document_length(self):
+        # characterCount includes the last paragraph separator
+        return self.document.characterCount() - 1
+
+    def _on_contents_change(self, position, removed, added):
+        length = self._document_length()
+        self._length += added - removed
+        if self._full or self._length != length or \
+                len(self._changes) >= self.max_changes:
+            # the change is not reliable (qt sometimes counts the last
+            # paragraph separator), send the whole text
+            self._full = True
+            self._changes[:] = []
+            self._length = length
+            return
+        cursor = QtGui.QTextCursor(self.document)
+        cursor.setPosition(position)
+        cursor.setPosition(position + added, cursor.KeepAnchor)
+        text = cursor.selectedText().replace(
+            '\u2029', '\n').replace('\u2028', '\n').replace('\xa0', ' ')
+        # qt positions are in UTF-16 code units, the backend converts them
+        # (see pyqode.core.backend.documents)
+        self._changes.append((position, removed, text))
+
+
+#: Dictionary of local socket errors messages
+LOCAL_SOCKET_ERROR_STRINGS = {
+    0: 'the connection was refused by the peer (or timed out).',
+    1: 'the remote socket closed the connection.',
+    2: 'the local socket name was not found.',
+    3: 'the socket operation failed because the application lacked the '
+       'required privileges.',
+    4: 'the local system ran out of resources (e.g., too many sockets).',
+    5: 'the socket operation timed out.',
+    7: 'an error occurred with the connection.',
+    - 1: 'an unidentified error occurred.',
+}
+
+
+class BackendStats(QtCore.QObject):
+    """
+    Statistics about the backend requests of an editor (see
+    :attr:`pyqode.core.managers.BackendManager.stats`).
+
+    The client side statistics (round trip time, payload sizes, number of
+    requests, dropped responses, connection setup time) are always up to
+    date. The server side statistics (queue wait time, execution time,...)
+    are fetched from the backend by
+    :meth:`pyqode.core.managers.BackendManager.refresh_stats`, which emits
+    :attr:`updated` once they have been received. Note that the server
+    statistics include the requests of all the editors that share the same
+    backend process.
+    """
+    #: Signal emitted when the statistics have been refreshed, the parameter
+    #: is the dict returned by :meth:`snapshot`.
+    updated = QtCore.Signal(object)
+
+    def __init__(self, parent=None):
+        super(BackendStats, self).__init__(parent)
+        #: Client side statistics
+        #: (:class:`pyqode.core.backend.stats.Statistics`)
+        self.client = Statistics()
+        #: Last server side statistics received (see
+        #: :meth:`pyqode.core.backend.stats.Statistics.snapshot`)
+        self.server = {}
+
+    def snapshot(self):
+        """
+        Returns the client and server statistics::
+
+            {'client': client_stats, 'server': server_stats}
+        """
+        return {'client': self.client.snapshot(), 'server': self.server}
+
+    def reset(self):
+        """ Clears the client side statistics """
+        self.client.reset()
+        self.server = {}
+
+    def _on_server_stats(self, stats):
+        self.server = stats
+        self.updated.emit(self.snapshot())
+
+
+class _JsonClientMixin(object):
+    """
+    Implements the client side of the backend protocol on top of a Qt socket
+    (see :class:`JsonTcpClient` and :class:`JsonLocalClient`).
+
+    The connection is persistent: the same socket is used for every request
+    sent to the backend. Requests are multiplexed on the connection, their
+    responses are dispatched to the corresponding callback using the request
+    id.
 
     It uses a simple message protocol. A message is made up of two parts.
     parts:
       - header: contains the length of the payload. (4bytes)
-      - payload: data as a json string.
+      - payload: data encoded with the codec negotiated with the backend
+        (json or msgpack).
 
     """
-    #: Internal signal emitted when the backend request finished and the
-    #: socket can be removed from the list of sockets maintained by the
-    #: backend manager
-    finished = QtCore.Signal(QtNetwork.QTcpSocket)
-
-    def __init__(self, parent, port, worker_class_or_function, args,
-                 on_receive=None):
-        super(JsonTcpClient, self).__init__(parent)
-        self._port = port
-
-        self._worker = worker_class_or_function
-        self._args = args
+    #: Names of the codecs proposed to the backend, by order of preference.
+    #: Set it to ``['json']`` to disable the binary encodings.
+    codecs = available_codecs()
+
+    #: Socket errors messages
+    _error_strings = SOCKET_ERROR_STRINGS
+    #: Errors that mean that the backend is not listening yet, the
+    #: connection is retried.
+    _retry_errors = (0, )
+
+    #: Delay (in milliseconds) before the first connection retry. The delay
+    #: is doubled after each failed attempt, up to :attr:`max_retry_delay`.
+    retry_delay = 10
+    #: Maximum delay (in milliseconds) between two connection attempts.
+    max_retry_delay = 1000
+
+    def _init_client(self, worker_class_or_function=None, args=None,
+                     on_receive=None):
         self._header_complete = False
-        self._header_buf = bytes()
+        self._header_buf = bytearray()
         self._to_read = 0
-        self._data_buf = bytes()
-        if on_receive:
-            try:
-                self._callback = WeakMethod(on_receive)
-            except TypeError:
-                # unbound method (i.e. free function)
-                self._callback = ref(on_receive)
-        else:
-            self._callback = None
+        self._data_buf = bytearray()
+        self._codec = JsonCodec
+        #: callbacks of the requests waiting for a response, indexed by
+        #: request id.
+        self._callbacks = {}
+        #: requests waiting for the connection to be established.
+        self._outbox = []
+        #: latest request id for each coalescing key.
+        self._latest = {}
+        #: requests made on a synchronized document, kept in case the backend
+        #: asks for the document text (resync).
+        self._sync_requests = {}
+        #: worker name and send time of the pending requests.
+        self._sent = {}
+        #: messages of the pending requests, kept to send them again on
+        #: another connection if the backend crashes (see
+        #: :meth:`take_pending`).
+        self._requests = {}
+        #: pending requests of a lost connection.
+        self._orphans = []
+        self._next_retry_delay = self.retry_delay
+        self._last_message_size = 0
+        #: Client side statistics (round trip time, payload sizes,...)
+        self.stats = Statistics()
+        self._connecting_since = time.time()
         self.is_connected = False
         self._closed = False
         self.connected.connect(self._on_connected)
         self.error.connect(self._on_error)
         self.disconnected.connect(self._on_disconnected)
         self.readyRead.connect(self._on_ready_read)
+        if worker_class_or_function is not None:
+            self.request(worker_class_or_function, args,
+                         on_receive=on_receive)
         self._connect()
 
+    def _address(self):
+        """ Returns the backend address, for logging purpose """
+        raise NotImplementedError()
+
+    def _connect(self):
+        """ Connects our client socket to the backend socket """
+        raise NotImplementedError()
+
+    @property
+    def pending_requests(self):
+        """
+        Returns the number of requests waiting for a response.
+        """
+        return len(self._callbacks)
+
     def close(self):
         self._closed = True  # fix issue with QTimer.singleShot
-        super(JsonTcpClient, self).close()
-        self._callback = None
+        super(_JsonClientMixin, self).close()
+        self._callbacks.clear()
+        self._outbox[:] = []
+        self._latest.clear()
+        self._sync_requests.clear()
+        self._sent.clear()
+        self._requests.clear()
+        self._orphans[:] = []
+
+    def request(self, worker_class_or_function, args, on_receive=None,
+                priority=None, coalesce_key=None, document=None,
+                text_key=None):
+        """
+        Sends a request to the backend. If the socket is not connected yet,
+        the request is queued and sent as soon as the connection has been
+        established.
+
+        :param worker_class_or_function: Worker class or function (or its
+            fully qualified name).
+        :param args: worker args, any Json serializable objects
+        :param on_receive: an optional callback executed when we receive the
+            worker's results (once per partial result for streaming workers).
+        :param priority: optional request priority, overrides the worker
+            priority (see :const:`pyqode.core.backend.PRIORITY_NORMAL`)
+        :param coalesce_key: optional coalescing key. A request supersedes
+            any previous request sent with the same key: the previous request
+            is skipped by the backend if it has not started yet and its
+            results are never delivered.
+        :param document: optional :class:`DocumentSync`. The document changes
+            are sent to the backend before the request and the backend
+            injects the document text into the worker args (under
+            ``text_key``).
+        :param text_key: key of the document text in the worker args.
+
+        :returns: the request id.
+        """
+        if isinstance(worker_class_or_function, str):
+            classname = worker_class_or_function
+        else:
+            classname = '%s.%s' % (worker_class_or_function.__module__,
+                                   worker_class_or_function.__name__)
+        request_id = str(uuid.uuid4())
+        self._callbacks[request_id] = _callback_ref(on_receive)
+        self._sent[request_id] = (classname, time.time())
+        self.stats.count(classname, 'requests')
+        obj = {'request_id': request_id, 'worker': classname, 'data': args}
+        if priority is not None:
+            obj['priority'] = priority
+        if coalesce_key is not None:
+            obj['coalesce_key'] = coalesce_key
+            previous = self._latest.get(coalesce_key)
+            if previous is not None:
+                self._drop(previous)
+            self._latest[coalesce_key] = request_id
+        if document is not None:
+            message, handle = document.flush()
+            if message is not None:
+                self._post({'sync': message})
+            handle['key'] = text_key
+            obj['document'] = handle
+            self._sync_requests[request_id] = (obj, document)
+        self._requests[request_id] = obj
+        self._post(obj)
+        return request_id
+
+    def _post(self, obj):
+        """
+        Sends a message or queues it until the connection is established.
+        """
+        if self.is_connected:
+            self.send(obj)
+        else:
+            self._outbox.append(obj)
+            if self.state() == self.UnconnectedState and not self._closed:
+                self._connecting_since = time.time()
+                self._connect()
+
+    def request_stats(self, on_receive):
+        """
+        Requests the statistics collected by the backend (see
+        :attr:`pyqode.core.backend.JsonServer.stats`).
 
-    def _send_request(self):
+        :param on_receive: callback called with the statistics dict.
+        """
+        request_id = str(uuid.uuid4())
+        self._callbacks[request_id] = _callback_ref(on_receive)
+        self._post({'request_id': request_id, 'stats': True})
+
+    def _resync(self, request_id):
+        """
+        Sends a request again, with the document text inline, because the
+        backend mirror of the document was not in sync.
+        """
+        obj, document = self._sync_requests.pop(request_id)
+        comm('backend asked for a resync of document %s', document.id)
+        self.stats.count(obj['worker'], 'resyncs')
+        obj = dict(obj)
+        key = obj.pop('document')['key']
+        obj['data'] = dict(obj['data'] or {})
+        obj['data'][key] = document.text()
+        self._requests[request_id] = obj
+        self._post(obj)
+
+    def take_pending(self):
+        """
+        Returns the requests that have not been answered yet, including the
+        requests of a lost connection, and forgets about them. They can be
+        sent again on another connection using :meth:`replay`.
+
+        The requests of a streaming worker whose results have started to be
+        delivered are not returned.
+
+        :returns: a list of ``(message, callback, document)``
+        """
+        pending = self._orphans + self._pending()
+        self._orphans = []
+        self._callbacks.clear()
+        self._requests.clear()
+        self._sync_requests.clear()
+        self._sent.clear()
+        self._latest.clear()
+        self._outbox[:] = []
+        return pending
+
+    def replay(self, pending):
         """
-        Sends the request to the backend.
+        Sends requests taken from another client (see :meth:`take_pending`),
+        e.g. after the backend has been restarted. The request ids and the
+        callbacks are preserved. The backend does not know the documents of
+        the previous connection: the document text is sent inline.
+
+        :param pending: requests returned by :meth:`take_pending`.
+        """
+        for obj, callback, document in pending:
+            if callback is not None and callback() is None:
+                continue  # nobody is waiting for the results anymore
+            request_id = obj['request_id']
+            if 'document' in obj:
+                obj = dict(obj)
+                key = obj.pop('document')['key']
+                obj['data'] = dict(obj['data'] or {})
+                obj['data'][key] = document.text()
+            comm('replaying request %s', request_id)
+            self._callbacks[request_id] = callback
+            self._sent[request_id] = (obj['worker'], time.time())
+            self._requests[request_id] = obj
+            if obj.get('coalesce_key'):
+                self._latest[obj['coalesce_key']] = request_id
+            self.stats.count(obj['worker'], 'replayed')
+            self._post(obj)
+
+    def _pending(self):
+        """
+        Returns the pending requests: ``(message, callback, document)``
+        """
+        pending = []
+        for request_id, obj in self._requests.items():
+            document = self._sync_requests.get(request_id, (None, None))[1]
+            pending.append((obj, self._callbacks.get(request_id), document))
+        return pending
+
+    def cancel(self, request_id):
+        """
+        Cancels a request. The callback of the request won't be called.
+
+        :param request_id: id of the request to cancel (as returned by
+            :meth:`request`).
+        """
+        if request_id not in self._callbacks:
+            return
+        comm('cancelling request %s', request_id)
+        if self._drop(request_id) and self.is_connected:
+            self.send({'request_id': request_id, 'cancel': True})
+
+    def _drop(self, request_id):
         """
-        if isinstance(self._worker, str):
-            classname = self._worker
+        Forgets about a pending request.
+
+        :return: True if the request has already been sent to the backend
+        """
+        self._callbacks.pop(request_id, None)
+        self._sync_requests.pop(request_id, None)
+        self._requests.pop(request_id, None)
+        try:
+            worker = self._sent.pop(request_id)[0]
+        except KeyError:
+            pass
         else:
-            classname = '%s.%s' % (self._worker.__module__,
-                                   self._worker.__name__)
-        self.request_id = str(uuid.uuid4())
-        self.send({'request_id': self.request_id, 'worker': classname,
-                   'data': self._args})
+            self.stats.count(worker, 'dropped')
+        for obj in self._outbox:
+            if obj.get('request_id') == request_id:
+                self._outbox.remove(obj)
+                return False
+        return True
 
     def send(self, obj, encoding='utf-8'):
         """
@@ -227,107 +618,168 @@ class JsonTcpClient(QtNetwork.QTcpSocket):
         serialisable**.
 
         :param obj: object to send
-        :param encoding: encoding used to encode the json message into a
-            bytes array, this should match CodeEdit.file.encoding.
+        :param encoding: unused, messages are always utf-8 encoded. Kept for
+            backward compatibility.
         """
         comm('sending request: %r', obj)
-        msg = json.dumps(obj)
-        msg = msg.encode(encoding)
-        header = struct.pack('=I', len(msg))
-        self.write(header)
-        self.write(msg)
-
-    @staticmethod
-    def pick_free_port():
-        """ Picks a free port """
-        test_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        test_socket.bind(('127.0.0.1', 0))
-        free_port = int(test_socket.getsockname()[1])
-        test_socket.close()
-        return free_port
-
-    def _connect(self):
-        """ Connects our client socket to the backend socket """
-        if self is None:
-            return
-        comm('connecting to 127.0.0.1:%d', self._port)
-        address = QtNetwork.QHostAddress('127.0.0.1')
-        self.connectToHost(address, self._port)
+        msg = self._codec.dumps(obj)
+        self.write(HEADER.pack(len(msg)) + msg)
+        if 'worker' in obj:
+            self.stats.record(obj['worker'], 'request_size', len(msg))
 
     def _on_connected(self):
-        comm('connected to backend: %s:%d', self.peerName(), self.peerPort())
+        comm('connected to backend: %s', self._address())
+        # negotiate the codec, the queued requests are sent once the backend
+        # has answered.
+        self.send({'hello': {'codecs': self.codecs}})
+
+    def _on_hello(self, obj):
+        self._codec = get_codec(obj['hello']['codec'])
+        comm('using the %s codec', self._codec.name)
+        if self._connecting_since is not None:
+            self.stats.record(CONNECTION, 'setup_time',
+                              time.time() - self._connecting_since)
+            self._connecting_since = None
         self.is_connected = True
-        self._send_request()
+        self._next_retry_delay = self.retry_delay
+        while self._outbox:
+            self.send(self._outbox.pop(0))
 
     def _on_error(self, error):
-        if error not in SOCKET_ERROR_STRINGS:  # pragma: no cover
+        if error not in self._error_strings:  # pragma: no cover
             error = -1
-        if error == 1 and self.is_connected or (
-                not self.is_connected and error == 0 and not self._closed):
+        retry = (error in self._retry_errors and not self.is_connected and
+                 not self._closed)
+        if error == 1 and self.is_connected or retry:
             log_fct = comm
         else:
             log_fct = _logger().warning
 
-        if error == 0 and not self.is_connected and not self._closed:
-            QtCore.QTimer.singleShot(100, self._connect)
+        if retry:
+            # exponential backoff: the backend may take a while to start
+            QtCore.QTimer.singleShot(self._next_retry_delay, self._connect)
+            self._next_retry_delay = min(2 * self._next_retry_delay,
+                                         self.max_retry_delay)
 
-        log_fct(SOCKET_ERROR_STRINGS[error])
+        log_fct(self._error_strings[error])
 
     def _on_disconnected(self):
         try:
-            comm('disconnected from backend: %s:%d', self.peerName(),
-                 self.peerPort())
+            comm('disconnected from backend: %s', self._address())
         except (AttributeError, RuntimeError):
             # logger might be None if for some reason qt deletes the socket
             # after python global exit
             pass
         try:
             self.is_connected = False
+            # the responses of the pending requests will never come, they
+            # can be replayed on another connection (see take_pending)
+            self._orphans.extend(self._pending())
+            self._requests.clear()
+            self._callbacks.clear()
+            self._sync_requests.clear()
+            self._sent.clear()
+            self._header_complete = False
+            self._header_buf = bytearray()
+            self._data_buf = bytearray()
+            self._codec = JsonCodec
         except AttributeError:
             pass
 
+    def _read(self, size):
+        """ Reads at most ``size`` bytes """
+        data = self.read(size)
+        try:
+            return data.data()  # pyside returns a QByteArray
+        except AttributeError:
+            return data
+
     def _read_header(self):
         comm('reading header')
-        self._header_buf += self.read(4)
-        if len(self._header_buf) == 4:
+        self._header_buf.extend(
+            self._read(HEADER.size - len(self._header_buf)))
+        if len(self._header_buf) == HEADER.size:
             self._header_complete = True
-            try:
-                header = struct.unpack('=I', self._header_buf)
-            except TypeError:
-                # pyside
-                header = struct.unpack('=I', self._header_buf.data())
-            self._to_read = header[0]
-            self._header_buf = bytes()
+            self._to_read = HEADER.unpack(bytes(self._header_buf))[0]
+            del self._header_buf[:]
             comm('header content: %d', self._to_read)
 
     def _read_payload(self):
         """ Reads the payload (=data) """
         comm('reading payload data')
         comm('remaining bytes to read: %d', self._to_read)
-        data_read = self.read(self._to_read)
+        data_read = self._read(self._to_read)
         nb_bytes_read = len(data_read)
         comm('%d bytes read', nb_bytes_read)
-        self._data_buf += data_read
         self._to_read -= nb_bytes_read
+        if self._to_read <= 0 and not self._data_buf:
+            # the whole payload was available, no need to buffer it
+            data = data_read
+        else:
+            self._data_buf.extend(data_read)
+            data = self._data_buf
         if self._to_read <= 0:
+            self._last_message_size = len(data)
+            comm('payload length: %r', len(data))
+            comm('decoding payload (%s)', self._codec.name)
+            self._header_complete = False
+            self._data_buf = bytearray()
             try:
-                data = self._data_buf.decode('utf-8')
-            except AttributeError:
-                data = bytes(self._data_buf.data()).decode('utf-8')
-            comm('payload read: %r', data)
-            comm('payload length: %r', len(self._data_buf))
-            comm('decoding payload as json object')
-            obj = json.loads(data)
+                obj = self._codec.loads(data)
+            except Exception:
+                # drop the message, the next ones can still be read
+                _logger().exception('failed to decode a response')
+                return
             comm('response received: %r', obj)
-            try:
-                results = obj['results']
-            except (KeyError, TypeError):
-                results = None
-            # possible callback
-            if self._callback and self._callback():
-                self._callback()(results)
-            self._header_complete = False
-            self._data_buf = bytes()
+            self._dispatch(obj)
+
+    def _dispatch(self, obj):
+        """
+        Calls the callback of the request that the response ``obj`` answers.
+        """
+        if isinstance(obj, dict) and 'hello' in obj:
+            self._on_hello(obj)
+            return
+        try:
+            request_id = obj['request_id']
+            results = obj['results']
+        except (KeyError, TypeError):
+            request_id = results = None
+        if isinstance(obj, dict) and obj.get('resync') and \
+                request_id in self._sync_requests and \
+                request_id in self._callbacks:
+            self._resync(request_id)
+            return
+        self._sync_requests.pop(request_id, None)
+        # the request is not replayed once its results started to arrive
+        self._requests.pop(request_id, None)
+        # partial results of a streaming worker, more responses will follow
+        partial = isinstance(obj, dict) and obj.get('more')
+        try:
+            if partial:
+                callback = self._callbacks.get(request_id)
+                worker, sent_at = self._sent[request_id]
+            else:
+                callback = self._callbacks.pop(request_id, None)
+                worker, sent_at = self._sent.pop(request_id)
+        except (KeyError, TypeError):
+            pass
+        else:
+            if not partial:
+                self.stats.record(worker, 'round_trip_time',
+                                  time.time() - sent_at)
+            self.stats.record(worker, 'response_size',
+                              self._last_message_size)
+        if isinstance(obj, dict) and obj.get('cancelled'):
+            comm('request %s has been cancelled', request_id)
+            callback = None
+        elif isinstance(obj, dict) and obj.get('end'):
+            # end of stream, the results have already been delivered
+            callback = None
+        # possible callback
+        if callback and callback():
+            callback()(results)
+        if not self._callbacks:
             self.finished.emit(self)
 
     def _on_ready_read(self):
@@ -339,6 +791,81 @@ class JsonTcpClient(QtNetwork.QTcpSocket):
                 self._read_payload()
 
 
+class JsonTcpClient(_JsonClientMixin, QtNetwork.QTcpSocket):
+    """
+    A json tcp client socket used to start and communicate with the pyqode
+    backend through the loopback interface.
+    """
+    #: Internal signal emitted when all the pending requests have been
+    #: answered.
+    finished = QtCore.Signal(QtNetwork.QTcpSocket)
+
+    def __init__(self, parent, port, worker_class_or_function=None, args=None,
+                 on_receive=None):
+        super(JsonTcpClient, self).__init__(parent)
+        self._port = port
+        # don't let Nagle's algorithm delay the small requests
+        self.setSocketOption(self.LowDelayOption, 1)
+        self._init_client(worker_class_or_function, args, on_receive)
+
+    @staticmethod
+    def pick_free_port():
+        """ Picks a free port """
+        test_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        test_socket.bind(('127.0.0.1', 0))
+        free_port = int(test_socket.getsockname()[1])
+        test_socket.close()
+        return free_port
+
+    def _address(self):
+        return '127.0.0.1:%d' % self._port
+
+    def _connect(self):
+        """ Connects our client socket to the backend socket """
+        if self is None:
+            return
+        comm('connecting to 127.0.0.1:%d', self._port)
+        address = QtNetwork.QHostAddress('127.0.0.1')
+        self.connectToHost(address, self._port)
+
+
+class JsonLocalClient(_JsonClientMixin, QtNetwork.QLocalSocket):
+    """
+    A json client socket that communicates with the pyqode backend through a
+    local (unix domain) socket. This avoids the tcp stack and the need to
+    pick a free port.
+    """
+    #: Internal signal emitted when all the pending requests have been
+    #: answered.
+    finished = QtCore.Signal(QtNetwork.QLocalSocket)
+
+    _error_strings = LOCAL_SOCKET_ERROR_STRINGS
+    # the server might not have created its socket file yet
+    _retry_errors = (0, 2)
+
+    def __init__(self, parent, path, worker_class_or_function=None,
+                 args=None, on_receive=None):
+        super(JsonLocalClient, self).__init__(parent)
+        self._path = path
+        self._init_client(worker_class_or_function, args, on_receive)
+
+    @staticmethod
+    def pick_free_path():
+        """ Returns the path of a new local socket """
+        return os.path.join(tempfile.gettempdir(),
+                            'pyqode-%s.sock' % uuid.uuid4().hex[:12])
+
+    def _address(self):
+        return self._path
+
+    def _connect(self):
+        """ Connects our client socket to the backend socket """
+        if self is None:
+            return
+        comm('connecting to %s', self._path)
+        self.connectToServer(self._path)
+
+
 class BackendProcess(QtCore.QProcess):
     """
     Extends QProcess with methods to easily manipulate the backend process.
@@ -2,6 +2,7 @@
 This module contains the syntax highlighter API.
 """
 import logging
+import re
 import sys
 import time
 import weakref
@@ -9,8 +10,8 @@ from pygments.styles import get_style_by_name, get_all_styles
 from pygments.token import Token, Punctuation
 from pygments.util import ClassNotFound
 from pyqode.core.api.mode import Mode
-from pyqode.core.api.utils import drift_color
-from pyqode.qt import QtGui, QtCore, QtWidgets
+from pyqode.core.api.utils import drift_color, TextBlockHelper
+from pyqode.qt import QtGui, QtCore
 
 
 def _logger():
@@ -214,6 +215,16 @@ class SyntaxHighlighter(QtGui.QSyntaxHighlighter, Mode):
         our data in the block user state as a bit-mask. You should always
         use :class:`pyqode.core.api.TextBlockHelper` to retrieve or modify
         those data.
+
+    Highlighting a big document (loading a file, changing the color scheme,
+    typing a multi-line string delimiter,...) does not freeze the editor: the
+    blocks are highlighted synchronously during :attr:`highlight_budget`
+    seconds, after that only the visible blocks are highlighted and the
+    other blocks are deferred. The deferred blocks are highlighted in the
+    background, by steps of :attr:`time_slice` seconds, or as soon as they
+    are scrolled into view. Until then, their state is set to
+    :attr:`NOT_HIGHLIGHTED`: subclasses must not rely on the state of a
+    previous block that has this value.
     """
     #: Signal emitted at the start of highlightBlock. Parameters are the
     #: highlighter instance and the current text block
@@ -223,6 +234,21 @@ class SyntaxHighlighter(QtGui.QSyntaxHighlighter, Mode):
     #: highlighter instance and the current text block
     block_highlight_finished = QtCore.Signal(object, object)
 
+    #: Maximum time (in seconds) spent highlighting blocks synchronously,
+    #: the blocks that are not visible are then highlighted in the
+    #: background.
+    highlight_budget = 0.05
+
+    #: Duration (in seconds) of each background highlighting step.
+    time_slice = 0.02
+
+    #: Block state of the deferred blocks (see :meth:`TextBlockHelper.
+    #: set_state`), subclasses must not use it for their own states.
+    NOT_HIGHLIGHTED = 0xFFFF
+
+    #: Pattern used to find the whitespace runs of a block.
+    WHITESPACES = re.compile(r'\s+')
+
     @property
     def formats(self):
         """
@@ -288,23 +314,47 @@ class SyntaxHighlighter(QtGui.QSyntaxHighlighter, Mode):
         #: Fold detector. Set it to a valid FoldDetector to get code folding
         #: to work. Default is None
         self.fold_detector = None
-        self.WHITESPACES = QtCore.QRegExp(r'\s+')
+        #: start time and budget of the current highlighting batch
+        self._batch_start = None
+        self._budget = self.highlight_budget
+        #: range of block numbers visible during the current batch
+        self._visible = (0, -1)
+        #: first and last deferred block numbers (or None)
+        self._deferred = None
+        self._block_count = 0
+        self._background = QtCore.QTimer()
+        self._background.timeout.connect(self._highlight_deferred)
 
     def on_state_changed(self, state):
         if self._on_close:
             return
         if state:
+            # connected before the highlighter so that the deferred range is
+            # up to date when the changed blocks are highlighted
+            self.editor.document().contentsChange.connect(
+                self._on_contents_change)
             self.setDocument(self.editor.document())
+            self.editor.verticalScrollBar().valueChanged.connect(
+                self._on_scrolled)
         else:
+            self._cancel_deferred()
+            try:
+                self.editor.document().contentsChange.disconnect(
+                    self._on_contents_change)
+            except (RuntimeError, TypeError):
+                pass
             self.setDocument(None)
+            try:
+                self.editor.verticalScrollBar().valueChanged.disconnect(
+                    self._on_scrolled)
+            except (RuntimeError, TypeError):
+                pass
 
     def _highlight_whitespaces(self, text):
-        index = self.WHITESPACES.indexIn(text, 0)
-        while index >= 0:
-            index = self.WHITESPACES.pos(0)
-            length = len(self.WHITESPACES.cap(0))
-            self.setFormat(index, length, self.formats['whitespace'])
-            index = self.WHITESPACES.indexIn(text, index + length)
+        fmt = self.formats['whitespace']
+        for match in self.WHITESPACES.finditer(text):
+            start, end = match.span()
+            self.setFormat(start, end - start, fmt)
 
     @staticmethod
     def _find_prev_non_blank_block(current_block):
@@ -329,6 +379,10 @@ class SyntaxHighlighter(QtGui.QSyntaxHighlighter, Mode):
         current_block = self.currentBlock()
         previous_block = self._find_prev_non_blank_block(current_block)
         if self.editor:
+            if self._must_defer(current_block):
+                # the fold level is detected when the block is highlighted
+                self._defer(current_block)
+                return
             self.highlight_block(text, current_block)
             if self.editor.show_whitespaces:
                 self._highlight_whitespaces(text)
@@ -346,19 +400,168 @@ class SyntaxHighlighter(QtGui.QSyntaxHighlighter, Mode):
         """
         raise NotImplementedError()
 
+    def _must_defer(self, block):
+        """
+        Checks if the highlighting of a block must be deferred: the budget of
+        the current batch has been spent and the block is not visible.
+        """
+        now = time.time()
+        if self._batch_start is None:
+            # new batch: all the blocks highlighted until the event loop
+            # regains control belong to the same batch
+            self._start_batch(now, self.highlight_budget)
+            QtCore.QTimer.singleShot(0, self._end_batch)
+        if now - self._batch_start < self._budget:
+            return False
+        first, last = self._visible
+        return not first <= block.blockNumber() <= last
+
+    def _start_batch(self, start, budget):
+        self._batch_start = start
+        self._budget = budget
+        self._visible = self._visible_range()
+
+    def _end_batch(self):
+        self._batch_start = None
+
+    def _visible_range(self):
+        """
+        Returns the numbers of the first and of the last visible blocks.
+        """
+        editor = self.editor
+        first = editor.firstVisibleBlock().blockNumber()
+        nb_lines = editor.viewport().height() // max(
+            1, editor.fontMetrics().height())
+        return first, first + nb_lines + 1
+
+    def _defer(self, block):
+        """
+        Defers the highlighting of a block, it will be highlighted in the
+        background.
+
+        The state of the block is set to :attr:`NOT_HIGHLIGHTED`, the next
+        blocks are not highlighted again if it already had this state.
+        """
+        TextBlockHelper.set_state(block, self.NOT_HIGHLIGHTED)
+        number = block.blockNumber()
+        if self._deferred is None:
+            self._deferred = [number, number]
+            self._block_count = self.document().blockCount()
+            self._background.start(0)
+        else:
+            self._deferred[0] = min(self._deferred[0], number)
+            self._deferred[1] = max(self._deferred[1], number)
+
+    def _cancel_deferred(self):
+        self._background.stop()
+        self._deferred = None
+
+    def _on_contents_change(self, position, *_):
+        """
+        Shifts the deferred range when lines are added or removed before or
+        inside it.
+        """
+        document = self.document()
+        if document is None:
+            return
+        count = document.blockCount()
+        delta = count - self._block_count
+        self._block_count = count
+        if self._deferred is None or not delta:
+            return
+        number = document.findBlock(position).blockNumber()
+        first, last = self._deferred
+        if number < first:
+            first = max(number, first + delta)
+        if number <= last:
+            last = max(number, last + delta)
+        self._deferred = [first, last]
+
+    def _highlight_range(self, budget):
+        """
+        Highlights the deferred blocks, in order, during ``budget`` seconds.
+        """
+        document = self.document()
+        start = time.time()
+        self._start_batch(start, budget)
+        try:
+            block = document.findBlockByNumber(self._deferred[0])
+            while block.isValid() and \
+                    block.blockNumber() <= self._deferred[1] and \
+                    time.time() - start < budget:
+                # the deferred range grows if the highlighting cascades to
+                # the next blocks and exhausts the budget
+                self._deferred[0] = block.blockNumber() + 1
+                self.rehighlightBlock(block)
+                block = block.next()
+        finally:
+            self._end_batch()
+        if not block.isValid() or \
+                self._deferred[0] > self._deferred[1]:
+            self._cancel_deferred()
+
+    def _highlight_deferred(self):
+        """
+        Highlights the deferred blocks during :attr:`time_slice` seconds.
+        """
+        if self.document() is None or self._deferred is None or \
+                not self.editor:
+            self._cancel_deferred()
+            return
+        self._highlight_range(self.time_slice)
+
+    def _on_scrolled(self, *_):
+        """
+        Highlights the deferred blocks that have been scrolled into view.
+        """
+        if self._deferred is None or not self.editor:
+            return
+        first, last = self._visible_range()
+        first = max(first, self._deferred[0])
+        last = min(last, self._deferred[1])
+        if first > last:
+            return
+        self._start_batch(time.time(), self.highlight_budget)
+        try:
+            block = self.document().findBlockByNumber(first)
+            while block.isValid() and block.blockNumber() <= last:
+                self.rehighlightBlock(block)
+                block = block.next()
+        finally:
+            self._end_batch()
+
+    @property
+    def highlighting(self):
+        """
+        True while some blocks remain to be highlighted in the background.
+        """
+        return self._deferred is not None
+
     def rehighlight(self):
         """
-        Rehighlight the entire document, may be slow.
+        Rehighlight the entire document. Only the visible blocks are
+        highlighted right away on big documents, the other blocks are
+        highlighted in the background.
         """
         start = time.time()
-        QtWidgets.QApplication.setOverrideCursor(
-            QtGui.QCursor(QtCore.Qt.WaitCursor))
+        self._cancel_deferred()
         try:
-            super(SyntaxHighlighter, self).rehighlight()
+            document = self.document()
+            if document is None or not self.editor:
+                return
+            # the whole document is deferred, the blocks are highlighted in
+            # order during the highlight budget (and the visible blocks),
+            # unlike QSyntaxHighlighter.rehighlight that goes through all the
+            # blocks.
+            self._block_count = document.blockCount()
+            self._deferred = [0, self._block_count - 1]
+            self._highlight_range(self.highlight_budget)
+            if self._deferred is not None:
+                self._on_scrolled()
+                self._background.start(0)
         except RuntimeError:
             # cloned widget, no need to rehighlight the same document twice ;)
             pass
-        QtWidgets.QApplication.restoreOverrideCursor()
         end = time.time()
         _logger().debug('rehighlight duration: %fs' % (end - start))
 
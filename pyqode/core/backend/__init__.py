@@ -9,7 +9,13 @@ analysis (lint), code completion,...
 Protocol
 --------
 
-We use a worker based json messaging server using the TCP/IP transport.
+We use a worker based json messaging server using the TCP/IP transport (or a
+unix domain socket, see :func:`default_parser`).
+
+The client opens one single, persistent connection to the server and sends
+all its requests through it. Several requests can be in flight at the same
+time, responses are matched with their request using the ``request_id``
+field.
 
 We build our own, very simple protocol where each message is made up of two
 parts:
@@ -17,6 +23,9 @@ parts:
   - a header: simply contains the length of the payload
   - a payload: a json formatted string, the content of the message.
 
+The payload is encoded in json unless the client negotiates another codec
+(see `Codec negotiation`_).
+
 There are two type of json object: a request and a response.
 
 Request
@@ -27,6 +36,25 @@ For a request, the object will contains the following fields:
   - 'worker': fully qualified name to the worker callable (class or function),
     e.g. 'pyqode.core.backend.workers.echo_worker'
   - 'data': data specific to the chose worker.
+  - 'priority': optional, overrides the priority of the worker (see
+    :const:`PRIORITY_HIGH`, :const:`PRIORITY_NORMAL` and
+    :const:`PRIORITY_LOW`).
+  - 'coalesce_key': optional, a request supersedes the pending requests
+    sent on the same connection with the same key. Superseded requests are
+    skipped if they have not started yet, their results are dropped
+    otherwise.
+
+  - 'document': optional document handle (``{'id': document_id, 'version':
+    version, 'key': text_key}``). The server injects the text of its copy of
+    the document into the worker data (``data[text_key]``), see `Documents`_.
+
+A pending request can be cancelled by sending a message with the following
+fields: ``{'request_id': id_of_the_request, 'cancel': True}``
+
+The statistics collected by the server (see
+:class:`pyqode.core.backend.stats.Statistics`) can be requested with a
+``{'request_id': id, 'stats': True}`` message, they are sent back in the
+``results`` field of the response.
 
 E.g::
 
@@ -50,6 +78,52 @@ E.g::
         'results': ['some code', 0]
     }
 
+The response of a cancelled (or superseded) request contains an additional
+``'cancelled': True`` field.
+
+The response of a request whose document is not in sync contains an
+additional ``'resync': True`` field, the client must send the request again
+with the document text inline.
+
+Streaming workers (workers with a ``streaming`` attribute set to True, see
+:func:`pyqode.core.backend.server.is_streaming`) may send several responses
+for the same request: each partial result is sent in a response with an
+additional ``'more': True`` field. The last response of the stream contains
+an additional ``'end': True`` field and no results.
+
+Codec negotiation
++++++++++++++++++
+
+The first message sent by the client proposes the codecs it supports, by order
+of preference::
+
+    {'hello': {'codecs': ['msgpack', 'json']}}
+
+The server answers with the codec it picked (json if none of the proposed
+codecs is available, e.g. msgpack is not installed on a python2 backend)::
+
+    {'hello': {'codec': 'msgpack'}}
+
+Both messages are encoded in json, all the following messages use the
+negotiated codec (see :mod:`pyqode.core.backend.serialization`).
+
+Documents
++++++++++
+
+To avoid sending the whole document text with every request, the server keeps
+a copy of the client documents. The client keeps them up to date by sending
+sync messages (see :func:`pyqode.core.backend.documents.sync`)::
+
+    {
+        'sync': {
+            'id': 'e2c04d9c-5e5e-4a4c-9a4d-0a3c3b2e4a31',
+            'version': 2,
+            'changes': [[12, 0, 'some text'], [42, 3, '']]
+        }
+    }
+
+The documents are closed when the connection is closed.
+
 Server script
 -------------
 
@@ -85,6 +159,9 @@ Here is the most simple and basic example of a server script:
     print to sys.stderr.
 
 """
+from .pool import PRIORITY_HIGH
+from .pool import PRIORITY_LOW
+from .pool import PRIORITY_NORMAL
 from .server import JsonServer
 from .server import default_parser
 from .server import serve_forever
@@ -119,6 +196,9 @@ class NotRunning(Exception):
 
 
 __all__ = [
+    'PRIORITY_HIGH',
+    'PRIORITY_LOW',
+    'PRIORITY_NORMAL',
     'JsonServer',
     'default_parser',
     'serve_forever',
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the cache of the worker results.
+
+Outline, checker or occurrences requests are often made again for the same
+text (undo/redo, focus changes, cloned editors,...). The results of the
+workers that opt in (workers with a ``cacheable`` attribute set to True, see
+:meth:`pyqode.core.backend.JsonServer.cache_key`) are cached by the server,
+the same request is then answered without running the worker. The text of
+a synchronized document is identified by its digest, computed once per
+version (see :func:`pyqode.core.backend.documents.digest`).
+
+.. warning::
+    This module runs on the server side and must support python2 syntax.
+"""
+import collections
+import hashlib
+import json
+import threading
+
+
+class ResultCache(object):
+    """
+    Thread safe LRU cache of worker results.
+
+    Results are indexed by a hash of the worker name and of the request data
+    (which contains the document text, or the handle of a synchronized
+    document), the least recently used results are evicted when the cache is
+    full.
+    """
+    def __init__(self, max_size=256):
+        """
+        :param max_size: maximum number of results, 0 disables the cache.
+        """
+        #: Maximum number of cached results.
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def key(worker_name, data, text_key=None, digest=None):
+        """
+        Computes the cache key of a request.
+
+        The document handle (``data['document']``) is not part of the key:
+        requests made on different documents (or versions of a document)
+        share their results if they have the same text.
+
+        :param worker_name: fully qualified name of the worker
+        :param data: worker data
+        :param text_key: key of the document text in ``data``
+        :param digest: digest of the document text (see
+            :func:`pyqode.core.backend.documents.digest`), the text is then
+            not hashed again.
+        :return: the key or None if the data cannot be hashed.
+        """
+        if isinstance(data, dict):
+            excluded = ['document']
+            if digest is not None:
+                excluded.append(text_key)
+            data = dict((k, v) for k, v in data.items() if k not in excluded)
+        if digest is not None:
+            data = [data, digest]
+        try:
+            dumped = json.dumps([worker_name, data], sort_keys=True)
+        except (TypeError, ValueError):
+            return None
+        return hashlib.sha1(dumped.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """
+        Returns the results cached for a key, None if there are no cached
+        results (or if key is None).
+
+        :param key: cache key (see :meth:`key`)
+        """
+        if key is None:
+            return None
+        with self._lock:
+            try:
+                results = self._entries.pop(key)
+            except KeyError:
+                return None
+            self._entries[key] = results
+            return results
+
+    def put(self, key, results):
+        """
+        Caches the results of a request, evicting the least recently used
+        results if the cache is full.
+
+        :param key: cache key (see :meth:`key`), nothing is cached if None.
+        :param results: worker results.
+        """
+        if key is None or not self.max_size:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = results
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Clears the cache.
+        """
+        with self._lock:
+            self._entries.clear()
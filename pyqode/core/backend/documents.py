@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the server side mirror of the documents opened on the
+client side.
+
+The client keeps the mirror of its documents up to date by sending the text
+changes (deltas) instead of sending the whole text with every request. A
+request that needs the document text only sends a document handle (the
+document id and version), the server then injects the text of the mirror
+into the worker data.
+
+The positions of the changes are expressed in UTF-16 code units (like the
+positions of a QTextDocument), they are converted to python string indexes
+when the text contains characters outside of the basic multilingual plane.
+
+.. warning::
+    This module runs on the server side and must support python2 syntax.
+"""
+import hashlib
+import logging
+import re
+import sys
+import threading
+
+
+def _logger():
+    """ Returns the module's logger """
+    return logging.getLogger(__name__)
+
+
+if sys.maxunicode > 0xFFFF:
+    #: Characters encoded with two UTF-16 code units (a surrogate pair)
+    _ASTRAL = re.compile(u'[\U00010000-\U0010FFFF]')
+else:
+    # narrow python build: strings are already made of UTF-16 code units
+    _ASTRAL = None
+
+if sys.version_info[0] >= 3:
+    # the text may contain lone surrogates (json escapes)
+    _ENCODING_ERRORS = 'surrogatepass'
+else:
+    _ENCODING_ERRORS = 'strict'
+
+
+class Document(object):
+    """
+    Server side mirror of a client document.
+    """
+    def __init__(self, document_id, text, version):
+        #: Unique id of the document (generated client side).
+        self.id = document_id
+        #: Version of the document, incremented by the client each time it
+        #: sends changes.
+        self.version = version
+        #: The document text.
+        self.text = text
+        # True if the text may contain astral characters, the UTF-16
+        # positions must then be converted.
+        self._astral = _ASTRAL is not None and bool(_ASTRAL.search(text))
+        # (version, digest) of the last computed digest (see digest)
+        self._digest = None
+
+    def _index(self, offset):
+        """
+        Converts a UTF-16 offset to an index in :attr:`text`.
+        """
+        index = offset
+        for match in _ASTRAL.finditer(self.text):
+            if match.start() >= index:
+                break
+            # the character counts for two code units
+            index -= 1
+        return index
+
+    def apply_change(self, position, removed, added):
+        """
+        Applies a text change.
+
+        :param position: position of the change (in UTF-16 code units).
+        :param removed: number of UTF-16 code units removed at position
+        :param added: text inserted at position
+        """
+        start, end = position, position + removed
+        if self._astral:
+            start, end = self._index(start), self._index(end)
+        elif _ASTRAL is not None and _ASTRAL.search(added):
+            self._astral = True
+        self.text = ''.join((self.text[:start], added, self.text[end:]))
+
+
+_documents = {}
+_lock = threading.Lock()
+
+
+def get(document_id):
+    """
+    Returns the document mirror with the given id or None if the document is
+    unknown.
+
+    :param document_id: id of the document.
+    """
+    with _lock:
+        return _documents.get(document_id)
+
+
+def digest(document_id, version):
+    """
+    Returns a hash of the text of a document mirror. The hash is computed
+    once per version, documents (or versions) that have the same text have
+    the same digest.
+
+    :param document_id: id of the document
+    :param version: version of the document
+    :return: the digest (hex string) or None if the document is unknown or
+        if its version changed.
+    """
+    with _lock:
+        document = _documents.get(document_id)
+        if document is None or document.version != version:
+            return None
+        if document._digest is None or document._digest[0] != version:
+            text = document.text.encode('utf-8', _ENCODING_ERRORS)
+            document._digest = (version, hashlib.sha1(text).hexdigest())
+        return document._digest[1]
+
+
+def close(document_id):
+    """
+    Removes a document mirror.
+
+    :param document_id: id of the document to close
+    """
+    with _lock:
+        _documents.pop(document_id, None)
+
+
+def sync(data):
+    """
+    Updates a document mirror from a sync message sent by the client.
+
+    A sync message contains the following fields:
+
+        - 'id': the document id
+        - 'version': the new document version
+        - 'text': the full document text, to (re)open the document
+        - 'changes': a list of changes (position, nb_chars_removed,
+          added_text) to apply on the previous version of the document.
+        - 'close': True to close the document.
+
+    If the changes cannot be applied (the previous version is unknown), the
+    document is closed: requests made on that document will ask the client to
+    send the whole text again.
+
+    :param data: sync message data
+    :return: The updated document or None
+    """
+    document_id = data['id']
+    if data.get('close'):
+        close(document_id)
+        return None
+    with _lock:
+        if 'text' in data:
+            document = Document(document_id, data['text'], data['version'])
+            _documents[document_id] = document
+            return document
+        document = _documents.get(document_id)
+        if document is None or document.version != data['version'] - 1:
+            _logger().warning('document %s out of sync', document_id)
+            _documents.pop(document_id, None)
+            return None
+        for position, removed, added in data['changes']:
+            document.apply_change(position, removed, added)
+        document.version = data['version']
+        return document
@@ -0,0 +1,453 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the trigram index used to speed up the project searches
+(see :func:`pyqode.core.backend.workers.find_in_files`).
+
+The index maps each trigram (sequence of 3 bytes, lower case) of the words
+of the files to the files that contain it. A search then only has to scan the
+files that contain all the trigrams of the words of the searched string (the
+candidates).
+
+The index is persisted in a cache directory and updated incrementally: only
+the files whose modification time or size changed are indexed again.
+
+.. warning::
+    This module runs on the server side and must support python2 syntax.
+"""
+import array
+import hashlib
+import logging
+import os
+import pickle
+import re
+import sys
+import tempfile
+import threading
+
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+from . import search
+
+try:
+    unichr
+except NameError:
+    unichr = chr
+
+
+def _logger():
+    """ Returns the module's logger """
+    return logging.getLogger(__name__)
+
+
+#: Files bigger than this size (in bytes) are not indexed, they are always
+#: searched.
+MAX_FILE_SIZE = 4 * 1024 * 1024
+
+
+def default_cache_dir():
+    """
+    Returns the default directory where the indexes are persisted.
+    """
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA', tempfile.gettempdir())
+    else:
+        base = os.environ.get('XDG_CACHE_HOME',
+                              os.path.expanduser('~/.cache'))
+    return os.path.join(base, 'pyqode', 'index')
+
+
+_WORDS = re.compile(br'\w{3,}')
+
+
+def trigrams(data):
+    """
+    Returns the set of the trigrams of the words (sequences of ascii letters,
+    digits and underscores) of a bytes string. Letters are lower cased so
+    that the index can be used for case insensitive searches.
+
+    Trigrams that contain punctuation or white spaces are not indexed, they
+    would make the index much bigger without narrowing the searches much.
+    """
+    result = set()
+    for word in set(_WORDS.findall(data.lower())):
+        result.update(zip(word, word[1:], word[2:]))
+    return result
+
+
+def index_file(path):
+    """
+    Computes the trigrams of a file.
+
+    This is a module level function so that it can be run in a child process.
+
+    :returns: ``(path, mtime, size, trigrams)``. ``trigrams`` is None if the
+        file is too big to be indexed, binary files (that are never searched)
+        have no trigrams.
+    """
+    try:
+        stat = os.stat(path)
+        if stat.st_size > MAX_FILE_SIZE:
+            return path, stat.st_mtime, stat.st_size, None
+        with open(path, 'rb') as f:
+            data = f.read()
+    except (IOError, OSError):
+        return path, 0, -1, set()
+    if data[:search.BINARY_CHECK_SIZE].find(b'\0') != -1:
+        return path, stat.st_mtime, stat.st_size, set()
+    return path, stat.st_mtime, stat.st_size, trigrams(data)
+
+
+def _index_files(paths):
+    return [index_file(path) for path in paths]
+
+
+def required_literals(sub, regex=False):
+    """
+    Returns the strings that any match of a search string contains. For a
+    regular expression, this is the sequences of literal characters of the
+    top level of the expression (the analysis is conservative: no literal is
+    returned for an alternation).
+
+    :param sub: search string
+    :param regex: True if ``sub`` is a regular expression
+    """
+    if not regex:
+        return [sub]
+    try:
+        parsed = sre_parse.parse(sub)
+    except Exception:
+        return []
+    literals = []
+    current = []
+    for op, value in parsed:
+        if op == sre_parse.LITERAL:
+            current.append(unichr(value))
+        else:
+            if current:
+                literals.append(''.join(current))
+            current = []
+    if current:
+        literals.append(''.join(current))
+    return literals
+
+
+class TrigramIndex(object):
+    """
+    Trigram index of the files of a directory tree.
+
+    Files are identified by an integer id. When a file is modified or
+    removed, its id is marked as dead and the modified file gets a new id:
+    the posting lists do not need to be updated, they are compacted when
+    there are too many dead ids.
+    """
+    #: Version of the persisted index format
+    VERSION = 1
+
+    def __init__(self, root, cache_dir=None):
+        """
+        :param root: root directory of the indexed files
+        :param cache_dir: directory where the index is persisted (see
+            :func:`default_cache_dir`)
+        """
+        self.root = os.path.normpath(os.path.abspath(root))
+        if cache_dir is None:
+            cache_dir = default_cache_dir()
+        name = hashlib.sha1(self.root.encode('utf-8')).hexdigest()[:16]
+        #: Path of the persisted index
+        self.path = os.path.join(cache_dir, '%s-py%d.idx' % (
+            name, sys.version_info[0]))
+        self.lock = threading.Lock()
+        self._clear()
+        self.load()
+
+    def _clear(self):
+        #: (mtime, size, id) of each indexed file, indexed by path
+        self.files = {}
+        #: Paths of the files, indexed by id (None for dead ids)
+        self.paths = []
+        #: Ids of the files that contain each trigram (arrays of ints)
+        self.postings = {}
+        #: Ids of the files that are too big to be indexed
+        self.unindexed = set()
+        self._dead = 0
+
+    def load(self):
+        """
+        Loads the persisted index, if any.
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                state = pickle.load(f)
+            if state['version'] != self.VERSION or state['root'] != self.root:
+                return
+            self.files = state['files']
+            self.paths = state['paths']
+            self.postings = state['postings']
+            self.unindexed = state['unindexed']
+            self._dead = state['dead']
+        except (IOError, OSError, EOFError, KeyError, ValueError, TypeError,
+                pickle.UnpicklingError):
+            self._clear()
+
+    def save(self):
+        """
+        Persists the index.
+        """
+        state = {'version': self.VERSION, 'root': self.root,
+                 'files': self.files, 'paths': self.paths,
+                 'postings': self.postings, 'unindexed': self.unindexed,
+                 'dead': self._dead}
+        try:
+            directory = os.path.dirname(self.path)
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+            tmp = '%s.%d.tmp' % (self.path, os.getpid())
+            with open(tmp, 'wb') as f:
+                pickle.dump(state, f, 2)
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            os.rename(tmp, self.path)
+        except (IOError, OSError):
+            _logger().exception('failed to save the index %s', self.path)
+
+    def _remove(self, path):
+        file_id = self.files.pop(path)[2]
+        self.paths[file_id] = None
+        self.unindexed.discard(file_id)
+        self._dead += 1
+
+    def _add(self, path, mtime, size, file_trigrams):
+        file_id = len(self.paths)
+        self.paths.append(path)
+        self.files[path] = (mtime, size, file_id)
+        if file_trigrams is None:
+            self.unindexed.add(file_id)
+            return
+        postings = self.postings
+        for trigram in file_trigrams:
+            try:
+                postings[trigram].append(file_id)
+            except KeyError:
+                postings[trigram] = array.array('i', [file_id])
+
+    def _compact(self):
+        """
+        Renumbers the files to get rid of the dead ids.
+        """
+        ids = {}
+        paths = []
+        for file_id, path in enumerate(self.paths):
+            if path is not None:
+                ids[file_id] = len(paths)
+                paths.append(path)
+        postings = {}
+        for trigram, file_ids in self.postings.items():
+            file_ids = [ids[i] for i in file_ids if i in ids]
+            if file_ids:
+                postings[trigram] = array.array('i', file_ids)
+        self.postings = postings
+        self.paths = paths
+        self.files = dict((path, (mtime, size, ids[file_id]))
+                          for path, (mtime, size, file_id)
+                          in self.files.items())
+        self.unindexed = set(ids[i] for i in self.unindexed)
+        self._dead = 0
+
+    def update(self, paths):
+        """
+        Indexes the new and the modified files and forgets about the removed
+        files.
+
+        :param paths: paths of the files of the tree (see
+            :func:`pyqode.core.backend.search.walk`). Indexed files that are
+            not in the list are only removed if they do not exist anymore.
+        :return: True if the index changed.
+        """
+        seen = set()
+        modified = []
+        for path in paths:
+            seen.add(path)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entry = self.files.get(path)
+            if entry is None or entry[0] != stat.st_mtime or \
+                    entry[1] != stat.st_size:
+                modified.append(path)
+        removed = [path for path in self.files
+                   if path not in seen and not os.path.exists(path)]
+        for path in removed + [p for p in modified if p in self.files]:
+            self._remove(path)
+        pool = search._get_pool()
+        batches = list(search._batches(modified))
+        if pool is not None:
+            results = pool.imap(_index_files, batches)
+        else:
+            results = (_index_files(batch) for batch in batches)
+        for batch in results:
+            for path, mtime, size, file_trigrams in batch:
+                self._add(path, mtime, size, file_trigrams)
+        if self._dead > len(self.files):
+            self._compact()
+        return bool(removed or modified)
+
+    def candidates(self, subs, regex=False, encoding='utf-8'):
+        """
+        Returns the paths of the files that may contain one of the search
+        strings, None if the index cannot narrow the search (e.g. strings
+        shorter than 3 bytes).
+
+        :param subs: list of search strings
+        :param regex: True if the search strings are regular expressions
+        :param encoding: encoding of the files
+        """
+        required = self._required(subs, regex, encoding)
+        if required is None:
+            return None
+        return set(self.paths[i] for i in self._candidate_ids(required)
+                   if self.paths[i] is not None)
+
+    @staticmethod
+    def _required(subs, regex, encoding):
+        """
+        Returns the set of trigrams required by each search string, None if
+        one of the search strings does not require any trigram.
+        """
+        result = []
+        for sub in subs:
+            required = set()
+            for literal in required_literals(sub, regex):
+                if not isinstance(literal, bytes):
+                    literal = literal.encode(encoding)
+                required.update(trigrams(literal))
+            if not required:
+                return None
+            result.append(required)
+        return result
+
+    def _candidate_ids(self, required):
+        """
+        Returns the ids of the indexed files that contain all the trigrams of
+        one of the sets of ``required`` (and of the unindexed files).
+        """
+        ids = set()
+        for trigram_set in required:
+            postings = sorted((self.postings.get(t, ())
+                               for t in trigram_set), key=len)
+            ids.update(set(postings[0]).intersection(*postings[1:]))
+        ids.update(self.unindexed)
+        return ids
+
+    def iter_filter(self, paths, sub, regex=False, encoding='utf-8'):
+        """
+        Generates the files of ``paths`` that may contain a match, while
+        updating the index: the paths are consumed lazily, the files are
+        generated as soon as they are known to be candidates (the new and the
+        modified files are indexed by batches). The index is saved once all
+        the paths have been consumed.
+
+        The index is locked until the generator is exhausted or closed.
+
+        :param paths: paths of the files to search (can be a generator, see
+            :func:`pyqode.core.backend.search.walk`).
+        :param sub: search string or list of search strings
+        :param regex: True if the search strings are regular expressions
+        :param encoding: encoding of the files
+        """
+        subs = sub if isinstance(sub, (list, tuple)) else [sub]
+        required = self._required(subs, regex, encoding)
+        if required is None:
+            # the index cannot narrow the search
+            for path in paths:
+                yield path
+            return
+        with self.lock:
+            ids = self._candidate_ids(required)
+            seen = set()
+            modified = []
+            changed = False
+            for path in paths:
+                seen.add(path)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entry = self.files.get(path)
+                if entry is not None and entry[0] == stat.st_mtime and \
+                        entry[1] == stat.st_size:
+                    if entry[2] in ids:
+                        yield path
+                    continue
+                modified.append(path)
+                if len(modified) == search.BATCH_SIZE:
+                    for candidate in self._index_batch(modified, required):
+                        yield candidate
+                    modified = []
+                changed = True
+            for candidate in self._index_batch(modified, required):
+                yield candidate
+            removed = [path for path in self.files
+                       if path not in seen and not os.path.exists(path)]
+            for path in removed:
+                self._remove(path)
+            if self._dead > len(self.files):
+                self._compact()
+            if changed or removed:
+                self.save()
+
+    def _index_batch(self, paths, required):
+        """
+        Indexes a batch of new or modified files and generates the ones that
+        contain all the trigrams of one of the sets of ``required``.
+        """
+        if not paths:
+            return
+        pool = search._get_pool()
+        if pool is not None:
+            batch = pool.apply(_index_files, (paths, ))
+        else:
+            batch = _index_files(paths)
+        for path, mtime, size, file_trigrams in batch:
+            if path in self.files:
+                self._remove(path)
+            self._add(path, mtime, size, file_trigrams)
+            if file_trigrams is None or any(
+                    trigram_set <= file_trigrams for trigram_set in required):
+                yield path
+
+    def filter(self, paths, sub, regex=False, encoding='utf-8'):
+        """
+        Updates the index and returns the files of ``paths`` that may contain
+        a match (see :meth:`iter_filter`).
+
+        :param paths: list of the paths of the files to search
+        :param sub: search string or list of search strings
+        :param regex: True if the search strings are regular expressions
+        :param encoding: encoding of the files
+        """
+        return list(self.iter_filter(paths, sub, regex, encoding))
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(root, cache_dir=None):
+    """
+    Returns the index of a directory tree. Indexes are loaded once and kept
+    in memory.
+
+    :param root: root directory
+    :param cache_dir: directory where the index is persisted
+    """
+    key = (os.path.normpath(os.path.abspath(root)), cache_dir)
+    with _indexes_lock:
+        try:
+            return _indexes[key]
+        except KeyError:
+            index = _indexes[key] = TrigramIndex(root, cache_dir)
+            return index
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the pool used by the server to execute the worker
+requests concurrently.
+
+.. warning::
+    This module runs on the server side and must support python2 syntax.
+"""
+import bisect
+import itertools
+import logging
+import sys
+import threading
+import traceback
+
+
+def _logger():
+    """ Returns the module's logger """
+    return logging.getLogger(__name__)
+
+
+#: Priority of latency critical workers (e.g. code completion).
+PRIORITY_HIGH = 0
+#: Default worker priority.
+PRIORITY_NORMAL = 50
+#: Priority of bulk workers (e.g. linters, outline).
+PRIORITY_LOW = 100
+
+#: Yielded by a streaming worker once its next results only need some
+#: waiting (e.g. for other threads): the rest of the stream is consumed by a
+#: dedicated thread and the pool thread is released.
+DETACH = object()
+
+
+class WorkerPool(object):
+    """
+    Executes jobs in a pool of threads.
+
+    Jobs are queued and run by order of priority (the lowest value first),
+    jobs of the same priority run in the order they were submitted.
+
+    Each job belongs to a group (usually the worker name), the number of jobs
+    of the same group running concurrently can be limited.
+
+    Background jobs (long running jobs such as project searches) run in their
+    own threads (``background_size``): they never hold the threads of the
+    other jobs.
+
+    When ``use_processes`` is True, the pool also creates a
+    ``multiprocessing.Pool`` of the same size. Jobs can then delegate the
+    actual work to a child process using :meth:`execute`.
+    """
+    def __init__(self, size=1, use_processes=False, background_size=1):
+        """
+        :param size: Number of jobs that can run concurrently.
+        :param use_processes: True to run the work in child processes instead
+            of threads.
+        :param background_size: Number of background jobs that can run
+            concurrently (in addition to the other jobs).
+        """
+        self.size = max(1, size)
+        self.background_size = max(1, background_size)
+        self._condition = threading.Condition()
+        self._queue = []
+        self._running = {}
+        self._counter = itertools.count()
+        self._stopped = False
+        self._process_pool = None
+        if use_processes:
+            import multiprocessing
+            self._process_pool = multiprocessing.Pool(self.size)
+        self._threads = []
+        for background in [False] * self.size + [True] * self.background_size:
+            thread = threading.Thread(target=self._run, args=(background, ))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    @property
+    def busy(self):
+        """
+        True if there is at least one job running or waiting to run.
+        """
+        with self._condition:
+            return bool(self._queue) or any(self._running.values())
+
+    def submit(self, job, priority=PRIORITY_NORMAL, group=None, limit=0,
+               background=False):
+        """
+        Submits a job.
+
+        :param job: callable to run in one of the pool threads.
+        :param priority: job priority, lowest values run first.
+        :param group: group of the job, used to limit concurrency.
+        :param limit: maximum number of jobs of the same group that can run
+            concurrently. 0 means no limit.
+        :param background: True to run the job in one of the background
+            threads.
+        """
+        with self._condition:
+            bisect.insort(self._queue, (priority, next(self._counter),
+                                        job, group, limit, background))
+            self._condition.notify_all()
+
+    def execute(self, function, *args):
+        """
+        Executes ``function(*args)`` in a child process if the pool uses
+        processes, in the calling thread otherwise.
+
+        The function must be a module level function and its arguments/return
+        value must be picklable.
+        """
+        if self._process_pool is None:
+            return function(*args)
+        return self._process_pool.apply(function, args)
+
+    def stop(self):
+        """
+        Stops the pool, queued jobs are discarded.
+        """
+        with self._condition:
+            self._stopped = True
+            self._queue[:] = []
+            self._condition.notify_all()
+        if self._process_pool is not None:
+            self._process_pool.terminate()
+
+    def _next_job(self, background):
+        """
+        Returns the first queued job (of the background jobs or of the other
+        jobs) whose group has not reached its concurrency limit (or None).
+        """
+        for i, item in enumerate(self._queue):
+            group, limit = item[3], item[4]
+            if item[5] != background:
+                continue
+            if not limit or self._running.get(group, 0) < limit:
+                return self._queue.pop(i)
+        return None
+
+    def _run(self, background):
+        while True:
+            with self._condition:
+                item = self._next_job(background)
+                while item is None:
+                    if self._stopped:
+                        return
+                    self._condition.wait()
+                    item = self._next_job(background)
+                job, group = item[2], item[3]
+                self._running[group] = self._running.get(group, 0) + 1
+            try:
+                job()
+            except Exception:
+                _logger().warning('failed to run job %r', job)
+                exc1, exc2, exc3 = sys.exc_info()
+                traceback.print_exception(exc1, exc2, exc3, file=sys.stderr)
+            finally:
+                with self._condition:
+                    self._running[group] -= 1
+                    self._condition.notify_all()
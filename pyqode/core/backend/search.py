@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the functions used to search the files of a directory
+tree (find in files, see :func:`pyqode.core.backend.workers.find_in_files`).
+
+Files are memory mapped and searched with a bytes regular expression: they
+are never decoded, only the lines that contain a match are. The files are
+searched in a pool of processes.
+
+.. warning::
+    This module runs on the server side and must support python2 syntax.
+"""
+import collections
+import fnmatch
+import logging
+import mmap
+import os
+import re
+import sys
+
+
+def _logger():
+    """ Returns the module's logger """
+    return logging.getLogger(__name__)
+
+
+#: Default ignore patterns (unix shell-style wildcards matched against the
+#: file and directory names), shared with
+#: :class:`pyqode.core.widgets.FileSystemTreeView`.
+IGNORED_PATTERNS = ['*.pyc', '*.pyo', '*.coverage', '.DS_Store',
+                    '__pycache__']
+
+#: Number of processes used to search the files. None to use one process per
+#: cpu, 0 to search the files in the calling thread (default for frozen
+#: applications).
+processes = 0 if hasattr(sys, 'frozen') else None
+
+#: Number of files searched by a process in one go.
+BATCH_SIZE = 64
+
+#: Number of bytes checked to detect binary files (files that contain a null
+#: byte are skipped)
+BINARY_CHECK_SIZE = 1024
+
+_pool = None
+_pool_size = 0
+
+
+def _get_pool():
+    """
+    Returns the process pool (created on the first use), None if files must
+    be searched in the calling thread.
+    """
+    global _pool, _pool_size
+    if processes == 0:
+        return None
+    if _pool is None:
+        import multiprocessing
+        try:
+            _pool_size = processes or multiprocessing.cpu_count()
+            _pool = multiprocessing.Pool(_pool_size)
+        except (OSError, ImportError, NotImplementedError):
+            _logger().exception('failed to create the search process pool')
+            return None
+    return _pool
+
+
+def is_ignored(name, ignored_patterns):
+    """
+    Checks if a file or directory name matches one of the ignore patterns.
+    """
+    for ptrn in ignored_patterns:
+        if fnmatch.fnmatch(name, ptrn):
+            return True
+    return False
+
+
+def walk(root, ignored_patterns=None, include_patterns=None):
+    """
+    Generates the paths of the files of a directory tree.
+
+    :param root: root directory
+    :param ignored_patterns: files and directories whose name matches one of
+        these patterns are skipped. Default is :attr:`IGNORED_PATTERNS`.
+    :param include_patterns: if set, only the files whose name matches one
+        of these patterns are generated.
+    """
+    if ignored_patterns is None:
+        ignored_patterns = IGNORED_PATTERNS
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames
+                             if not is_ignored(d, ignored_patterns))
+        for name in sorted(filenames):
+            if is_ignored(name, ignored_patterns):
+                continue
+            if include_patterns and not is_ignored(name, include_patterns):
+                continue
+            yield os.path.join(dirpath, name)
+
+
+def search_file(path, pattern, flags, encoding='utf-8'):
+    """
+    Searches a file.
+
+    :param path: path of the file.
+    :param pattern: bytes regular expression (see
+        :func:`pyqode.core.backend.workers.compile_search`).
+    :param flags: regular expression flags.
+    :param encoding: encoding of the file, used to decode the lines that
+        contain a match.
+
+    :returns: the list of matches: ``(line, column, length, line_text)``.
+        Lines and columns are 0 based, columns and lengths are expressed in
+        characters.
+    """
+    try:
+        with open(path, 'rb') as f:
+            if not os.fstat(f.fileno()).st_size:
+                return []
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (IOError, OSError, ValueError):
+        return []
+    try:
+        if data[:BINARY_CHECK_SIZE].find(b'\0') != -1:
+            return []
+        matches = []
+        line = 0
+        pos = 0
+        for match in re.finditer(pattern, data, flags):
+            start, end = match.span()
+            line += data[pos:start].count(b'\n')
+            pos = start
+            line_start = data.rfind(b'\n', 0, start) + 1
+            line_end = data.find(b'\n', start)
+            if line_end == -1:
+                line_end = len(data)
+            text = data[line_start:line_end].decode(encoding, 'replace')
+            matches.append((
+                line, len(data[line_start:start].decode(encoding, 'replace')),
+                len(data[start:end].decode(encoding, 'replace')),
+                text.rstrip('\r')))
+        return matches
+    finally:
+        data.close()
+
+
+def search_files(paths, pattern, flags, encoding='utf-8'):
+    """
+    Searches several files, returns the list of ``(path, matches)`` of the
+    files that contain at least one match (see :func:`search_file`).
+
+    This is a module level function so that it can be run in a child process.
+    """
+    results = []
+    for path in paths:
+        matches = search_file(path, pattern, flags, encoding)
+        if matches:
+            results.append((path, matches))
+    return results
+
+
+def _batches(paths):
+    batch = []
+    for path in paths:
+        batch.append(path)
+        if len(batch) == BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def find_in_files(paths, pattern, flags, encoding='utf-8', limit=0):
+    """
+    Searches files, by batches of :attr:`BATCH_SIZE` files, in the process
+    pool (see :attr:`processes`).
+
+    This is a generator: the results of each batch are generated as soon as
+    they are available, closing the generator stops the search.
+
+    :param paths: paths of the files to search (can be a generator, see
+        :func:`walk`).
+    :param pattern: bytes regular expression.
+    :param flags: regular expression flags.
+    :param encoding: encoding of the files.
+    :param limit: maximum number of matches, 0 means no limit.
+
+    :returns: generates ``(nb_files, results)`` where ``nb_files`` is the
+        number of files searched and ``results`` the list of ``(path,
+        matches)`` of the batch (see :func:`search_files`).
+    """
+    pool = _get_pool()
+    pending = collections.deque()
+    batches = _batches(paths)
+    nb_matches = 0
+    while True:
+        if pool is not None:
+            # keep all the processes busy
+            while len(pending) < 2 * _pool_size:
+                try:
+                    batch = next(batches)
+                except StopIteration:
+                    break
+                pending.append((len(batch), pool.apply_async(
+                    search_files, (batch, pattern, flags, encoding))))
+            if not pending:
+                return
+            nb_files, results = pending.popleft()
+            results = results.get()
+        else:
+            try:
+                batch = next(batches)
+            except StopIteration:
+                return
+            nb_files = len(batch)
+            results = search_files(batch, pattern, flags, encoding)
+        if limit:
+            for i, (path, matches) in enumerate(results):
+                nb_matches += len(matches)
+                if nb_matches >= limit:
+                    del matches[len(matches) - (nb_matches - limit):]
+                    yield nb_files, results[:i + 1]
+                    return
+        yield nb_files, results
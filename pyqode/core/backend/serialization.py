@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the codecs used to encode the messages exchanged between
+the client and the server.
+
+JSON is always available and is used by default. A more compact binary
+encoding (msgpack) is used when the ``msgpack`` package can be imported on
+both sides and when both sides run python 3 (python 2 strings would be packed
+as binary data, the peer would get bytes instead of text). The codec is
+negotiated when the connection is established (see the protocol description
+in :mod:`pyqode.core.backend`).
+
+.. warning::
+    This module runs on the server side and must support python2 syntax.
+"""
+import json
+import struct
+import sys
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+    MSGPACK_VERSION = None
+else:
+    MSGPACK_VERSION = getattr(msgpack, 'version', (0, ))
+
+
+#: Format of the message header (length of the payload)
+HEADER = struct.Struct('=I')
+
+
+class JsonCodec(object):
+    """
+    Encodes messages as utf-8 json strings. This codec is always available.
+    """
+    name = 'json'
+
+    @staticmethod
+    def dumps(obj):
+        """
+        Encodes a python object.
+
+        :param obj: object to encode
+        :return: bytes
+        """
+        return json.dumps(obj).encode('utf-8')
+
+    @staticmethod
+    def loads(data):
+        """
+        Decodes a message payload.
+
+        :param data: payload (bytes or bytearray)
+        :return: the decoded object
+        """
+        return json.loads(bytes(data).decode('utf-8'))
+
+
+class MsgPackCodec(object):
+    """
+    Encodes messages with msgpack. Only available if msgpack is installed.
+    """
+    name = 'msgpack'
+
+    @staticmethod
+    def dumps(obj):
+        return msgpack.packb(obj, use_bin_type=True)
+
+    @staticmethod
+    def loads(data):
+        if MSGPACK_VERSION >= (1, 0):
+            # msgpack >= 1.0 only accepts str/bytes map keys by default
+            return msgpack.unpackb(data, raw=False, strict_map_key=False)
+        if MSGPACK_VERSION >= (0, 5, 2):
+            return msgpack.unpackb(data, raw=False)
+        return msgpack.unpackb(bytes(data), encoding='utf-8')
+
+
+#: Supported codecs, by order of preference.
+CODECS = [MsgPackCodec, JsonCodec]
+
+
+def available_codecs():
+    """
+    Returns the names of the codecs that can be used in this interpreter, by
+    order of preference.
+    """
+    return [codec.name for codec in CODECS
+            if codec is not MsgPackCodec or
+            (msgpack is not None and sys.version_info[0] >= 3)]
+
+
+def get_codec(name):
+    """
+    Returns the codec with the given name.
+
+    :param name: name of the codec.
+    :raise ValueError: if the codec is not available.
+    """
+    for codec in CODECS:
+        if codec.name == name and name in available_codecs():
+            return codec
+    raise ValueError('codec not available: %r' % name)
+
+
+def negotiate(names):
+    """
+    Returns the first codec of ``names`` that is available in this
+    interpreter. Falls back to :class:`JsonCodec`.
+
+    :param names: codec names proposed by the peer, by order of preference.
+    """
+    available = available_codecs()
+    for name in names:
+        if name in available:
+            return get_codec(name)
+    return JsonCodec
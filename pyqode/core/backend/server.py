@@ -3,15 +3,16 @@
 This module contains the server socket definition.
 """
 import argparse
+import functools
 import inspect
 import logging
-import json
 import os
-import struct
+import socket
 import sys
 import time
 import traceback
 import threading
+import types
 
 
 try:
@@ -21,13 +22,21 @@ except ImportError:
     import SocketServer as socketserver
     PY33 = False
 
+from . import documents
+from .cache import ResultCache
+from .serialization import HEADER, JsonCodec, negotiate
+from .stats import Statistics
+from .pool import WorkerPool, DETACH, PRIORITY_LOW, PRIORITY_NORMAL
+
 
 def _logger():
     """ Returns the module's logger """
     return logging.getLogger(__name__)
 
 
-HEARTBEAT_DELAY = 60  # delay max without heartbeat signal
+#: Delay (in seconds) after which the server shuts down when there is no
+#: client connected anymore.
+HEARTBEAT_DELAY = 60
 
 
 def import_class(klass):
@@ -52,103 +61,529 @@ def import_class(klass):
         return klass
 
 
-class JsonServer(socketserver.TCPServer):
+#: Imported workers, indexed by fully qualified name.
+_workers = {}
+#: Instances of the persistent workers, indexed by fully qualified name.
+_instances = {}
+_workers_lock = threading.RLock()
+
+
+def resolve_worker(worker_name):
+    """
+    Imports a worker class or function. Workers are imported once, the result
+    is cached.
+
+    :param worker_name: fully qualified name of the worker class or function
+    :raise ImportError: if the worker cannot be imported.
+    """
+    try:
+        return _workers[worker_name]
+    except KeyError:
+        worker = import_class(worker_name)
+        _workers[worker_name] = worker
+        return worker
+
+
+def get_worker(worker_name):
+    """
+    Returns the callable that must handle a request made to a worker.
+
+    Worker classes are instantiated for every request, unless they define a
+    ``persistent`` class attribute set to True. A persistent worker is
+    instantiated once and its instance handles all the requests, it can thus
+    keep expensive state (parsed code, indexes,...) between requests. The
+    following optional methods let a persistent worker manage its state:
+
+        - ``setup()``: called once, before the first request
+        - ``close_document(document_id)``: called when a synchronized
+          document is closed. Requests made on a synchronized document
+          receive the document handle (``{'id': ..., 'version': ...}``)
+          in ``data['document']``, the worker can use it to key its per
+          document state.
+        - ``teardown()``: called when the server is closed.
+
+    Persistent workers may be called from several pool threads concurrently,
+    use a ``max_concurrency`` of 1 if the worker is not thread safe. When the
+    server uses a process pool, each child process has its own instance and
+    only ``setup`` is called.
+
+    :param worker_name: fully qualified name of the worker class or function
+    :raise ImportError: if the worker cannot be imported.
+    """
+    worker = resolve_worker(worker_name)
+    if not inspect.isclass(worker):
+        return worker
+    if not getattr(worker, 'persistent', False):
+        return worker()
+    with _workers_lock:
+        try:
+            return _instances[worker_name]
+        except KeyError:
+            _logger().debug('setting up persistent worker %s', worker_name)
+            instance = worker()
+            setup = getattr(instance, 'setup', None)
+            if setup is not None:
+                setup()
+            _instances[worker_name] = instance
+            return instance
+
+
+def _notify_workers(method_name, *args):
+    """
+    Calls a lifecycle method on all the persistent worker instances.
+    """
+    with _workers_lock:
+        instances = list(_instances.values())
+    for instance in instances:
+        method = getattr(instance, method_name, None)
+        if method is None:
+            continue
+        try:
+            method(*args)
+        except Exception:
+            _logger().exception('%s failed on worker %r', method_name,
+                                instance)
+
+
+def close_document(document_id):
+    """
+    Closes a document mirror and lets the persistent workers release their
+    state for that document.
+
+    :param document_id: id of the document to close.
+    """
+    documents.close(document_id)
+    _notify_workers('close_document', document_id)
+
+
+def teardown_workers():
+    """
+    Tears down the persistent workers.
+    """
+    _notify_workers('teardown')
+    with _workers_lock:
+        _instances.clear()
+
+
+def is_streaming(worker_name):
+    """
+    Checks if a worker streams its results: a streaming worker (class or
+    function with a ``streaming`` attribute set to True, or to a function
+    that returns True) may return a generator, each item is sent to the
+    client as soon as it is produced.
+
+    Streaming workers always run in the server threads, even if the server
+    uses a process pool. A streaming worker that waits for something may
+    yield None from time to time: None is not sent to the client but lets
+    the server stop the stream if the request has been cancelled or
+    superseded. A streaming worker that only has to wait for its next
+    results yields :data:`pyqode.core.backend.pool.DETACH`: the rest of the
+    stream is then consumed by a dedicated thread instead of a pool thread.
+
+    :param worker_name: fully qualified name of the worker class or function
+    """
+    try:
+        streaming = getattr(resolve_worker(worker_name), 'streaming', False)
+    except ImportError:
+        return False
+    if callable(streaming):
+        streaming = streaming()
+    return streaming
+
+
+def run_worker(worker_name, data):
+    """
+    Runs a worker and returns its results.
+
+    This is a module level function so that it can be run in a child process
+    when the server uses a process pool.
+
+    :param worker_name: fully qualified name of the worker class or function
+    :param data: worker data
+    :return: the worker results (an empty list if the worker failed)
+    """
+    try:
+        worker = get_worker(worker_name)
+    except ImportError:
+        _logger().exception('Failed to import worker class')
+        return []
+    except Exception:
+        _logger().exception('Failed to setup worker %s', worker_name)
+        return []
+    _logger().log(1, 'worker: %r', worker)
+    _logger().log(1, 'data: %r', data)
+    try:
+        ret_val = worker(data)
+    except Exception:
+        _logger().exception(
+            'something went bad with worker %r(data=%r)', worker, data)
+        ret_val = None
+    if ret_val is None:
+        ret_val = []
+    return ret_val
+
+
+class JsonServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
     """
     A server socket based on a json messaging system.
+
+    Client connections are persistent: a client opens one single connection
+    and sends all its requests through it. Responses are matched with their
+    request by the client using the ``request_id`` field.
+
+    Each connection is served by its own thread, this is needed when the
+    backend process is shared between several editors (each editor has its
+    own connection).
+
+    Requests are executed by a pool of threads (or processes, see
+    :func:`pyqode.core.backend.default_parser`), by order of priority. The
+    priority of a worker is read from its ``priority`` attribute (see
+    :const:`pyqode.core.backend.PRIORITY_HIGH`) and the number of concurrent
+    executions of a worker can be limited using a ``max_concurrency``
+    attribute. Both can also be configured from the server script using
+    :attr:`priorities` and :attr:`concurrency_limits`, e.g.::
+
+        JsonServer.priorities['my_package.workers.lint'] = PRIORITY_LOW
+        JsonServer.concurrency_limits['my_package.workers.lint'] = 1
+
+    Requests of priority :const:`pyqode.core.backend.PRIORITY_LOW` (or
+    lower) run in the background threads of the pool: a long project search
+    does not delay the completion or occurrences requests.
+
+    The results of the workers that only depend on the request data (e.g.
+    outline, linters) can be cached, see :meth:`cache_key`.
     """
+    #: Worker priorities, indexed by fully qualified worker name. Overrides
+    #: the worker ``priority`` attribute.
+    priorities = {}
+
+    #: Maximum number of concurrent executions of a worker, indexed by fully
+    #: qualified worker name. Overrides the worker ``max_concurrency``
+    #: attribute.
+    concurrency_limits = {}
+
+    #: Tells if the results of a worker are cached, indexed by fully
+    #: qualified worker name. Overrides the worker ``cacheable`` attribute.
+    caching = {}
+
+    #: Don't wait for the connection threads when shutting down.
+    daemon_threads = True
 
     class _Handler(socketserver.BaseRequestHandler):
+        def setup(self):
+            self.srv.connection_opened()
+            if self.srv.path is None:
+                # don't let Nagle's algorithm delay the small responses
+                self.request.setsockopt(socket.IPPROTO_TCP,
+                                        socket.TCP_NODELAY, 1)
+            #: lock used to serialize the responses written on the socket.
+            self._send_lock = threading.Lock()
+            self._lock = threading.Lock()
+            #: ids of the requests scheduled but not answered yet.
+            self._pending = set()
+            #: ids of the pending requests that have been cancelled.
+            self._cancelled = set()
+            #: latest request id for each coalescing key.
+            self._latest = {}
+            #: ids of the documents synchronized through this connection.
+            self._documents = set()
+            #: codec used to encode/decode the messages, negotiated by the
+            #: client (json until then).
+            self.codec = JsonCodec
+
+        def finish(self):
+            # the client is gone, so are its documents
+            for document_id in self._documents:
+                close_document(document_id)
+            self.srv.connection_closed()
+
         def read_bytes(self, size):
             """
             Read x bytes
 
             :param size: number of bytes to read.
 
+            :return: bytearray
+            :raise EOFError: if the connection has been closed by the client.
             """
-            if not PY33:
-                data = ''
-            else:
-                data = bytes()
-            while len(data) < size:
-                tmp = self.request.recv(size - len(data))
-                data += tmp
-                if tmp == '':
-                    raise RuntimeError("socket connection broken")
+            data = bytearray(size)
+            view = memoryview(data)
+            pos = 0
+            while pos < size:
+                nb_bytes = self.request.recv_into(view[pos:], size - pos)
+                if not nb_bytes:
+                    raise EOFError("socket connection broken")
+                pos += nb_bytes
             return data
 
         def get_msg_len(self):
             """ Gets message len """
-            data = self.read_bytes(4)
-            payload = struct.unpack('=I', data)
-            return payload[0]
+            data = self.read_bytes(HEADER.size)
+            return HEADER.unpack(bytes(data))[0]
 
         def read(self):
-            """ Reads a json string from socket and load it. """
+            """ Reads a message from the socket and decodes it. """
             size = self.get_msg_len()
-            data = self.read_bytes(size).decode('utf-8')
-            return json.loads(data)
+            self.last_message_size = size
+            return self.codec.loads(self.read_bytes(size))
 
-        def send(self, obj):
+        def send(self, obj, worker=None):
             """
-            Sends a python obj as a json string on the socket.
+            Encodes a python obj and sends it on the socket.
 
             :param obj: The object to send, must be Json serializable.
+            :param worker: name of the worker whose results are sent, the
+                size of the payload is recorded in its statistics before
+                the payload is sent.
+            :return: the size of the payload
             """
-            msg = json.dumps(obj).encode('utf-8')
+            msg = self.codec.dumps(obj)
             _logger().log(1, 'sending %d bytes for the payload', len(msg))
-            header = struct.pack('=I', len(msg))
-            self.request.sendall(header)
-            self.request.sendall(msg)
+            if worker is not None:
+                self.srv.stats.record(worker, 'response_size', len(msg))
+            header = HEADER.pack(len(msg))
+            with self._send_lock:
+                self.request.sendall(header + msg)
+            return len(msg)
+
+        def hello(self, data):
+            """
+            Chooses the codec used for the next messages among the codecs
+            proposed by the client. The answer is sent with the previous
+            codec.
+            """
+            codec = negotiate(data['hello'].get('codecs', []))
+            self.send({'hello': {'codec': codec.name}})
+            self.codec = codec
+            _logger().log(1, 'using the %s codec', codec.name)
 
         def handle(self):
             """
-            Hanlde the request and keep it alive while shutdown signal
-            has not been received
+            Handle the requests sent on the connection until the client
+            closes it.
+            """
+            while True:
+                try:
+                    data = self.read()
+                except (EOFError, socket.error):
+                    _logger().log(1, 'connection closed by the client')
+                    return
+                except Exception:
+                    # the payload has been consumed, the next messages can
+                    # still be read
+                    _logger().exception('failed to decode a message')
+                    try:
+                        self.send({'request_id': None, 'results': [],
+                                   'error': 'malformed message'})
+                    except socket.error:
+                        return
+                    continue
+                try:
+                    if 'hello' in data:
+                        self.hello(data)
+                        continue
+                    if data.get('cancel'):
+                        self.cancel(data['request_id'])
+                        continue
+                    if data.get('stats'):
+                        self.send({'request_id': data['request_id'],
+                                   'results': self.srv.stats.snapshot()})
+                        continue
+                    if 'sync' in data:
+                        self._documents.add(data['sync']['id'])
+                        if data['sync'].get('close'):
+                            close_document(data['sync']['id'])
+                        else:
+                            documents.sync(data['sync'])
+                        continue
+                    if 'document' in data and not self.resolve_document(data):
+                        self.send({'request_id': data['request_id'],
+                                   'results': [], 'resync': True})
+                        continue
+                    key = data.get('coalesce_key')
+                    with self._lock:
+                        self._pending.add(data['request_id'])
+                        if key:
+                            self._latest[key] = data['request_id']
+                    self.srv.stats.count(data['worker'], 'requests')
+                    self.srv.stats.record(data['worker'], 'request_size',
+                                          self.last_message_size)
+                except (AttributeError, KeyError, TypeError):
+                    pass  # malformed request, reported by _handle
+                self.srv.schedule(self, data)
+
+        def resolve_document(self, data):
+            """
+            Injects the text of the document mirror referenced by the request
+            into the worker data.
+
+            The document handle is also made available to the worker under
+            the ``document`` key (``{'id': document_id, 'version': version}``)
+
+            :param data: request data
+            :return: False if the document mirror is not available (unknown
+                document or wrong version).
+            """
+            handle = data['document']
+            document = documents.get(handle['id'])
+            if document is None or document.version != handle['version']:
+                _logger().log(1, 'document %r not in sync', handle)
+                return False
+            data['data'][handle['key']] = document.text
+            data['data']['document'] = {'id': document.id,
+                                        'version': document.version}
+            return True
+
+        def cancel(self, request_id):
+            """
+            Cancels a request: the request is skipped if it has not started
+            yet, its results are dropped otherwise.
+
+            :param request_id: id of the request to cancel.
+            """
+            _logger().log(1, 'cancelling request %r', request_id)
+            with self._lock:
+                if request_id in self._pending:
+                    self._cancelled.add(request_id)
+
+        def is_stale(self, data):
+            """
+            Checks if a request has been cancelled or superseded by a more
+            recent request with the same coalescing key.
+
+            :param data: request data
+            """
+            request_id = data['request_id']
+            key = data.get('coalesce_key')
+            with self._lock:
+                return (request_id in self._cancelled or
+                        (key and self._latest.get(key) != request_id))
+
+        def _stream(self, data, results):
+            """
+            Sends the results of a streaming worker as they are produced.
+
+            Each chunk is sent in a response flagged with ``'more': True``.
+            The stream is interrupted if the request is cancelled or
+            superseded.
+
+            :param data: request data
+            :param results: generator returned by the worker.
+            :return: True if the stream has been detached (see
+                :data:`pyqode.core.backend.pool.DETACH`), the final response
+                is then sent by the thread that consumes the stream.
+            """
+            worker = data['worker']
+            try:
+                for chunk in results:
+                    if self.is_stale(data):
+                        break
+                    if chunk is None:
+                        continue
+                    if chunk is DETACH:
+                        thread = threading.Thread(
+                            target=self._finish_stream, args=(data, results))
+                        thread.daemon = True
+                        thread.start()
+                        return True
+                    self.send({'request_id': data['request_id'],
+                               'results': chunk, 'more': True}, worker)
+            except Exception:
+                _logger().exception(
+                    'something went bad with streaming worker %r(data=%r)',
+                    worker, data['data'])
+            results.close()
+            return False
+
+        def _finish_stream(self, data, results):
+            """
+            Consumes the rest of a detached stream and sends the final
+            response.
             """
-            self.srv.reset_heartbeat()
-            # make sure to have enough time to handle the request
-            self.srv.timeout = HEARTBEAT_DELAY * 10
-            data = self.read()
-            self._handle(data)
-            self.srv.timeout = HEARTBEAT_DELAY
-            self.srv.reset_heartbeat()
+            if self._stream(data, results):
+                return
+            if self.is_stale(data):
+                response = {'request_id': data['request_id'], 'results': [],
+                            'cancelled': True}
+            else:
+                response = {'request_id': data['request_id'], 'results': [],
+                            'end': True}
+            self._respond(data, response)
+
+        def _respond(self, data, response):
+            """
+            Sends the final response of a request.
+            """
+            with self._lock:
+                self._pending.discard(data['request_id'])
+                self._cancelled.discard(data['request_id'])
+            _logger().log(1, 'sending response: %r', response)
+            if response.get('cancelled'):
+                self.srv.stats.count(data['worker'], 'dropped')
+            try:
+                self.send(response, data['worker'])
+            except socket.error:
+                pass
 
-        def _handle(self, data):
+        def _handle(self, data, queued_at=None):
             """
             Handles a work request.
+
+            :param data: request data
+            :param queued_at: time at which the request has been queued.
             """
+            stats = self.srv.stats
             try:
                 _logger().log(1, 'handling request %r', data)
                 assert data['worker']
                 assert data['request_id']
                 assert data['data'] is not None
+                cancelled = {'request_id': data['request_id'], 'results': [],
+                             'cancelled': True}
                 response = {'request_id': data['request_id'], 'results': []}
+                worker = data['worker']
+                detached = False
                 try:
-                    worker = import_class(data['worker'])
-                except ImportError:
-                    _logger().exception('Failed to import worker class')
-                else:
-                    if inspect.isclass(worker):
-                        worker = worker()
-                    _logger().log(1, 'worker: %r', worker)
-                    _logger().log(1, 'data: %r', data['data'])
-                    try:
-                        ret_val = worker(data['data'])
-                    except Exception:
-                        _logger().exception(
-                            'something went bad with worker %r(data=%r)',
-                            worker, data['data'])
-                        ret_val = None
-                    if ret_val is None:
-                        ret_val = []
-                    response = {'request_id': data['request_id'],
-                                'results': ret_val}
+                    start = time.time()
+                    if queued_at is not None:
+                        stats.record(worker, 'queue_time', start - queued_at)
+                    if self.is_stale(data):
+                        _logger().log(1, 'skipping stale request %r',
+                                      data['request_id'])
+                        response = cancelled
+                        return
+                    cache_key, worker_data, view = self.srv.cache_request(
+                        worker, data['data'], data.get('document'))
+                    ret_val = self.srv.cache.get(cache_key)
+                    if ret_val is not None:
+                        stats.count(worker, 'cache_hits')
+                    elif is_streaming(worker):
+                        # generators cannot be sent back by a child process
+                        ret_val = run_worker(worker, worker_data)
+                    else:
+                        ret_val = self.srv.pool.execute(
+                            run_worker, worker, worker_data)
+                    streamed = isinstance(ret_val, types.GeneratorType)
+                    if not streamed:
+                        self.srv.cache.put(cache_key, ret_val)
+                    if view is not None:
+                        ret_val = view(ret_val)
+                        streamed = isinstance(ret_val, types.GeneratorType)
+                    if streamed:
+                        detached = self._stream(data, ret_val)
+                    stats.record(worker, 'execution_time',
+                                 time.time() - start)
+                    if self.is_stale(data):
+                        response = cancelled
+                    elif streamed:
+                        response = {'request_id': data['request_id'],
+                                    'results': [], 'end': True}
+                    else:
+                        response = {'request_id': data['request_id'],
+                                    'results': ret_val}
                 finally:
-                    _logger().log(1, 'sending response: %r', response)
-                    try:
-                        self.send(response)
-                    except ConnectionAbortedError:
-                        pass
+                    if not detached:
+                        self._respond(data, response)
             except:
                 _logger().warn('error with data=%r', data)
                 exc1, exc2, exc3 = sys.exc_info()
@@ -160,31 +595,190 @@ class JsonServer(socketserver.TCPServer):
             use its own argument parser (using
             :meth:`pyqode.core.backend.default_parser`)
         """
-        self.reset_heartbeat()
         if not args:
             args = default_parser().parse_args()
         self.port = args.port
+        #: The server shuts down if no client has been connected for
+        #: ``timeout`` seconds.
         self.timeout = HEARTBEAT_DELAY
+        self._connections = 0
+        self._connections_lock = threading.Lock()
+        self._idle_timer = None
+        #: Statistics about the requests handled by the server (see
+        #: :class:`pyqode.core.backend.stats.Statistics`). The client can
+        #: query them with a ``{'request_id': id, 'stats': True}`` message.
+        self.stats = Statistics()
+        #: The pool that executes the requests.
+        self.pool = WorkerPool(
+            size=getattr(args, 'pool_size', 1),
+            use_processes=getattr(args, 'pool_type', 'thread') == 'process',
+            background_size=getattr(args, 'background_pool_size', 2))
+        #: Cache of the worker results (see :meth:`cache_key`).
+        self.cache = ResultCache(getattr(args, 'cache_size', 256))
         self._Handler.srv = self
-        socketserver.TCPServer.__init__(
-            self, ('127.0.0.1', int(args.port)), self._Handler)
-        print('started on 127.0.0.1:%d' % int(args.port))
+        #: Path of the unix domain socket (local transport) or None.
+        self.path = None
+        if getattr(args, 'transport', 'tcp') == 'local':
+            self.address_family = socket.AF_UNIX
+            self.path = args.port
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            address = self.path
+        else:
+            address = ('127.0.0.1', int(args.port))
+        socketserver.TCPServer.__init__(self, address, self._Handler)
+        if self.path:
+            print('started on %s' % self.path)
+        else:
+            print('started on 127.0.0.1:%d' % int(args.port))
         print('running with python %d.%d.%d' % (sys.version_info[:3]))
-        self._heartbeat_thread = threading.Thread(target=self.heartbeat)
-        self._heartbeat_thread.setDaemon(True)
-        self._heartbeat_thread.start()
+        # the client must connect within the timeout
+        self._start_idle_timer()
 
-    def reset_heartbeat(self):
-        self.last_time = time.time()
-        self.elapsed_time = 0
+    def schedule(self, handler, data):
+        """
+        Queues a request, it will be handled by one of the pool threads.
 
-    def heartbeat(self):
-        while True:
-            elapsed_time = time.time() - self.last_time
-            if elapsed_time > self.timeout:
-                self.shutdown()
-                sys.exit(1)
-            time.sleep(1)
+        :param handler: the request handler of the connection
+        :param data: the request data
+        """
+        try:
+            name = data['worker']
+            worker = resolve_worker(name)
+        except (ImportError, KeyError, TypeError, AttributeError):
+            name = worker = None
+        try:
+            priority = data['priority']
+        except (KeyError, TypeError):
+            priority = self.priorities.get(
+                name, getattr(worker, 'priority', PRIORITY_NORMAL))
+        limit = self.concurrency_limits.get(
+            name, getattr(worker, 'max_concurrency', 0))
+        self.pool.submit(functools.partial(handler._handle, data, time.time()),
+                         priority=priority, group=name, limit=limit,
+                         background=priority >= PRIORITY_LOW)
+
+    def cache_key(self, worker_name, data, document=None):
+        """
+        Returns the key used to cache the results of a request, None if the
+        results of the worker must not be cached.
+
+        Workers opt in by defining a ``cacheable`` attribute set to True (or
+        using :attr:`caching`): they must be idempotent, their results must
+        only depend on the request data (the document text is part of the
+        data). Streamed results are never cached.
+
+        :param worker_name: fully qualified name of the worker
+        :param data: worker data
+        :param document: handle of the synchronized document of the request,
+            the digest of the document text is used instead of hashing the
+            text again (see :func:`pyqode.core.backend.documents.digest`).
+        """
+        if self._cacheable_worker(worker_name) is None:
+            return None
+        digest = None
+        if document is not None:
+            digest = documents.digest(document['id'], document['version'])
+        if digest is None:
+            return ResultCache.key(worker_name, data)
+        return ResultCache.key(worker_name, data, document['key'], digest)
+
+    def cache_request(self, worker_name, data, document=None):
+        """
+        Returns the cache key of a request (see :meth:`cache_key`), the data
+        the worker must be run with and the function that computes the
+        results of the request from the worker results (or None).
+
+        Workers can define a ``cache_view`` function to share their cached
+        results between requests that only differ by a few parameters (e.g.
+        the caret position of the occurrences requests). ``cache_view`` is
+        called with the worker data and returns the data of the request
+        whose results are cached and a function that computes the results of
+        the original request from them, or None if the request must not be
+        cached.
+
+        :param worker_name: fully qualified name of the worker
+        :param data: worker data
+        :param document: handle of the synchronized document of the request
+        """
+        worker = self._cacheable_worker(worker_name)
+        if worker is None:
+            return None, data, None
+        cache_view = getattr(worker, 'cache_view', None)
+        if cache_view is None:
+            return self.cache_key(worker_name, data, document), data, None
+        view = cache_view(data)
+        if view is None:
+            return None, data, None
+        data, view = view
+        return self.cache_key(worker_name, data, document), data, view
+
+    def _cacheable_worker(self, worker_name):
+        """
+        Returns the worker if its results can be cached, None otherwise.
+        """
+        if not self.cache.max_size:
+            return None
+        try:
+            worker = resolve_worker(worker_name)
+        except ImportError:
+            return None
+        if self.caching.get(worker_name, getattr(worker, 'cacheable', False)):
+            return worker
+        return None
+
+    def server_close(self):
+        self._stop_idle_timer()
+        self.pool.stop()
+        teardown_workers()
+        socketserver.TCPServer.server_close(self)
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def connection_opened(self):
+        """
+        Called when a client connects.
+        """
+        with self._connections_lock:
+            self._connections += 1
+            self._stop_idle_timer()
+
+    def connection_closed(self):
+        """
+        Called when a client closes its connection. The server shuts down if
+        no client connects within :attr:`timeout` seconds.
+
+        Clients keep their connection open as long as they are alive, the
+        connection is closed by the OS if the client process dies: there is
+        no need to poll the client (heartbeat).
+        """
+        with self._connections_lock:
+            self._connections -= 1
+            if not self._connections:
+                self._start_idle_timer()
+
+    def _start_idle_timer(self):
+        self._stop_idle_timer()
+        self._idle_timer = threading.Timer(self.timeout, self._on_idle)
+        self._idle_timer.daemon = True
+        self._idle_timer.start()
+
+    def _stop_idle_timer(self):
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+            self._idle_timer = None
+
+    def _on_idle(self):
+        with self._connections_lock:
+            if self._connections:
+                return
+            if self.pool.busy:
+                # make sure to have enough time to handle the pending
+                # requests
+                self._start_idle_timer()
+                return
+        _logger().info('no client connected, shutting down')
+        self.shutdown()
 
 
 def default_parser():
@@ -192,15 +786,51 @@ def default_parser():
     Configures and return the default argument parser. You should use this
     parser as a base if you want to add custom arguments.
 
-    The default parser only has one argument, the tcp port used to start the
-    server socket. *(CodeEdit picks up a free port and use it to run
+    The default parser has one positional argument, the tcp port used to start
+    the server socket. *(CodeEdit picks up a free port and use it to run
     the server and connect its client socket)*
 
+    With ``--transport local``, the positional argument is the path of a unix
+    domain socket instead (not available on Windows).
+
+    The following options can be used to configure the pool that executes the
+    requests (use the ``args`` parameter of
+    :meth:`pyqode.core.managers.BackendManager.start`):
+
+        - ``--pool-size``: number of requests that can be executed
+          concurrently (default is 1).
+        - ``--background-pool-size``: number of low priority requests
+          (project searches, linters,...) that can be executed concurrently,
+          in addition to the other requests (default is 2).
+        - ``--pool-type``: ``thread`` (default) or ``process``. Workers run
+          in child processes with the ``process`` type, workers cannot keep
+          any state in the server process in that case. On platforms that
+          don't fork (Windows), the configuration made in the ``__main__``
+          block of the server script (e.g. code completion providers) is not
+          available in the child processes.
+        - ``--cache-size``: maximum number of worker results kept in the
+          cache (see :meth:`JsonServer.cache_key`), 0 disables the cache.
+
     :returns: The default server argument parser.
     """
     parser = argparse.ArgumentParser()
     parser.add_argument("port", help="the local tcp port to use to run "
-                        "the server")
+                        "the server (or the socket path with the local "
+                        "transport)")
+    parser.add_argument("--transport", choices=['tcp', 'local'],
+                        default='tcp', help="communicate through the "
+                        "loopback interface (tcp) or through a unix domain "
+                        "socket (local)")
+    parser.add_argument("--pool-size", type=int, default=1,
+                        help="number of requests executed concurrently")
+    parser.add_argument("--background-pool-size", type=int, default=2,
+                        help="number of low priority requests executed "
+                        "concurrently, in addition to the other requests")
+    parser.add_argument("--pool-type", choices=['thread', 'process'],
+                        default='thread', help="execute the requests in a "
+                        "pool of threads or in a pool of processes")
+    parser.add_argument("--cache-size", type=int, default=256,
+                        help="maximum number of worker results cached")
     return parser
 
 
@@ -228,6 +858,7 @@ def serve_forever(args=None):
 
     server = JsonServer(args=args)
     server.serve_forever()
+    server.server_close()
 
 
 # Server script example
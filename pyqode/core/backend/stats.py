@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the statistics collected about the backend requests
+(latency, payload sizes, number of requests,...).
+
+The same class is used on the server side (see
+:attr:`pyqode.core.backend.JsonServer.stats`) and on the client side (see
+:attr:`pyqode.core.managers.BackendManager.stats`).
+
+.. warning::
+    This module runs on the server side and must support python2 syntax.
+"""
+import threading
+
+
+#: Name of the group used for the metrics that are not related to a worker
+CONNECTION = 'connection'
+
+
+class Statistics(object):
+    """
+    Thread safe collection of metrics, grouped by worker.
+
+    Two kinds of metrics are collected:
+
+        - counters (e.g. number of requests, number of dropped responses),
+          see :meth:`count`
+        - measures (e.g. execution time, payload size), see :meth:`record`.
+          The number of samples, the total, the mean and the maximum value
+          are kept.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._measures = {}
+
+    def count(self, group, name, value=1):
+        """
+        Increments a counter.
+
+        :param group: group of the counter (usually the worker name).
+        :param name: name of the counter.
+        :param value: increment
+        """
+        with self._lock:
+            counters = self._counters.setdefault(group, {})
+            counters[name] = counters.get(name, 0) + value
+
+    def record(self, group, name, value):
+        """
+        Records a measure.
+
+        :param group: group of the measure (usually the worker name).
+        :param name: name of the measure (e.g. 'execution_time').
+        :param value: measured value (seconds for durations, bytes for
+            sizes).
+        """
+        with self._lock:
+            measures = self._measures.setdefault(group, {})
+            try:
+                measure = measures[name]
+            except KeyError:
+                measures[name] = [1, value, value]
+            else:
+                measure[0] += 1
+                measure[1] += value
+                measure[2] = max(measure[2], value)
+
+    def snapshot(self):
+        """
+        Returns the collected metrics as a json serializable dict::
+
+            {
+                group: {
+                    counter_name: value,
+                    measure_name: {'count': n, 'total': t, 'mean': m,
+                                   'max': x},
+                }
+            }
+        """
+        with self._lock:
+            snapshot = {}
+            for group, counters in self._counters.items():
+                snapshot[group] = dict(counters)
+            for group, measures in self._measures.items():
+                metrics = snapshot.setdefault(group, {})
+                for name, (count, total, maximum) in measures.items():
+                    metrics[name] = {'count': count, 'total': total,
+                                     'mean': total / float(count),
+                                     'max': maximum}
+            return snapshot
+
+    def reset(self):
+        """
+        Clears all the metrics.
+        """
+        with self._lock:
+            self._counters.clear()
+            self._measures.clear()
@@ -16,11 +16,26 @@ A worker is always tightly coupled with its caller, so are the data.
     python2, which might happen in pyqode.python to support python2 syntax).
 
 """
+import bisect
+import collections
+import heapq
+import itertools
 import logging
 import re
 import sys
+import threading
+import time
 import traceback
 
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from . import search
+from .index import get_index
+from .pool import DETACH, PRIORITY_HIGH, PRIORITY_LOW
+
 
 def echo_worker(data):
     """
@@ -31,6 +46,8 @@ def echo_worker(data):
     """
     return data
 
+echo_worker.priority = PRIORITY_HIGH
+
 
 class CodeCompletionWorker(object):
     """
@@ -47,10 +64,69 @@ class CodeCompletionWorker(object):
 
         from pyqode.core.backend import CodeCompletionWorker
         CodeCompletionWorker.providers.insert(0, MyProvider())
+
+    The worker is persistent: providers may keep state between requests.
+    The optional ``setup``, ``close_document`` and ``teardown`` methods of the
+    providers are called by the server (see
+    :func:`pyqode.core.backend.server.get_worker`).
+
+    The completions are filtered and ranked against the completion prefix
+    before being sent back (see :meth:`filter`) so that the client only
+    receives what it can show. The request may contain the following optional
+    keys:
+
+        - 'case_sensitive': True to match the prefix case sensitively
+          (default is False)
+        - 'max_results': maximum number of completions to send back, overrides
+          :attr:`max_results`.
+
+    The worker returns ``[(line, column, request_id, more)] + completions``
+    where ``more`` is True if some completions have been cut off. When
+    :attr:`parallel` is set, the worker may return these results twice: once
+    the deadline expired and once the late providers have answered.
     """
     #: The list of code completion provider to run on each completion request.
     providers = []
 
+    #: Code completion requests jump ahead of the other requests.
+    priority = PRIORITY_HIGH
+
+    #: One single instance handles all the completion requests.
+    persistent = True
+
+    #: Default maximum number of completions sent back to the client, 0 means
+    #: no limit.
+    max_results = 0
+
+    #: True to query the providers concurrently instead of stopping at the
+    #: first provider that answers. The completions of all the providers are
+    #: merged, by order of priority (the order of :attr:`providers`).
+    parallel = False
+
+    #: Time (in seconds) given to the providers when :attr:`parallel` is True.
+    #: The completions received before the deadline are sent right away, the
+    #: completions of the late providers are sent in a follow-up response.
+    #: The request may override it with a 'deadline' key.
+    deadline = 0.1
+
+    #: Maximum time (in seconds) the late providers are waited for after the
+    #: deadline, their completions are dropped after that.
+    late_timeout = 2.0
+
+    #: While waiting for the providers, the worker yields None every
+    #: ``poll_interval`` seconds so that the server can stop a stream that
+    #: has been cancelled or superseded.
+    poll_interval = 0.02
+
+    @classmethod
+    def streaming(cls):
+        """
+        The completions are streamed when the providers are queried
+        concurrently (see :func:`pyqode.core.backend.server.is_streaming`),
+        the late completions are then sent in a follow-up response.
+        """
+        return cls.parallel and len(cls.providers) > 1
+
     class Provider(object):
         """
         This class describes the expected interface for code completion
@@ -63,7 +139,13 @@ class CodeCompletionWorker(object):
             def complete(self, code, line, column, path, encoding, prefix):
                 pass
 
+        Providers that set :attr:`uses_document` to True also receive the
+        handle of the synchronized document (``{'id': ..., 'version': ...}``
+        or None) in a ``document`` keyword argument. They can use it to keep
+        per document state (see :class:`DocumentWordsProvider`).
         """
+        #: True to receive the document handle.
+        uses_document = False
 
         def complete(self, code, line, column, path, encoding, mime_type, prefix, abs_pos):
             """
@@ -90,42 +172,297 @@ class CodeCompletionWorker(object):
             """
             raise NotImplementedError()
 
+    def _notify_providers(self, method_name, *args):
+        for prov in CodeCompletionWorker.providers:
+            method = getattr(prov, method_name, None)
+            if method is None:
+                continue
+            try:
+                method(*args)
+            except Exception:
+                sys.stderr.write('%s failed on provider %r\n' %
+                                 (method_name, prov))
+                exc1, exc2, exc3 = sys.exc_info()
+                traceback.print_exception(exc1, exc2, exc3, file=sys.stderr)
+
+    def setup(self):
+        """
+        Sets up the providers.
+        """
+        self._notify_providers('setup')
+
+    def close_document(self, document_id):
+        """
+        Lets the providers release the state of a closed document.
+        """
+        self._notify_providers('close_document', document_id)
+
+    def teardown(self):
+        """
+        Tears down the providers.
+        """
+        self._notify_providers('teardown')
+
+    @staticmethod
+    def filter(completions, prefix, case_sensitive=False, max_results=0):
+        """
+        Filters and ranks completions against a prefix.
+
+        A completion matches if it contains the prefix, or a start of the
+        prefix followed (not necessarily directly) by the rest of the prefix.
+        The rank is the position of the match plus a penalty for each
+        character of the prefix that had to be split off. This mimics the
+        ranking of
+        :class:`pyqode.core.modes.code_completion.SubsequenceSortFilterProxyModel`.
+
+        :param completions: list of completion dicts.
+        :param prefix: completion prefix.
+        :param case_sensitive: True to match the prefix case sensitively.
+        :param max_results: maximum number of completions to return, 0 means
+            no limit.
+
+        :returns: the best completions (sorted by rank, the order of the
+            provider is kept for completions of the same rank) and a flag
+            that tells whether some completions have been cut off.
+        """
+        if not case_sensitive:
+            prefix = prefix.lower()
+        ranked = []
+        for i, completion in enumerate(completions):
+            name = completion['name']
+            if not case_sensitive:
+                name = name.lower()
+            rank = _match_rank(name, prefix)
+            if rank is not None:
+                ranked.append((rank, i, completion))
+        more = 0 < max_results < len(ranked)
+        if more:
+            ranked = heapq.nsmallest(max_results, ranked)
+        else:
+            ranked.sort()
+        return [completion for _, _, completion in ranked], more
+
+    def _complete(self, prov, data):
+        """
+        Gets the completions of one provider, returns None if the provider
+        failed.
+        """
+        kwargs = {}
+        if getattr(prov, 'uses_document', False):
+            kwargs['document'] = data.get('document')
+        try:
+            return prov.complete(
+                data['code'], data['line'], data['column'], data['path'],
+                data['encoding'], data['mime_type'], data['prefix'],
+                data['abs_pos'], **kwargs)
+        except:
+            sys.stderr.write('Failed to get completions from provider %r'
+                             % prov)
+            exc1, exc2, exc3 = sys.exc_info()
+            traceback.print_exception(exc1, exc2, exc3, file=sys.stderr)
+            return None
+
+    def _results(self, data, completions):
+        """
+        Filters the completions and prepends the request context.
+        """
+        completions, more = self.filter(
+            completions, data['prefix'],
+            case_sensitive=data.get('case_sensitive', False),
+            max_results=data.get('max_results', self.max_results))
+        return [(data['line'], data['column'], data['request_id'], more),
+                completions]
+
+    def _fan_out(self, data):
+        """
+        Queries all the providers concurrently.
+
+        Yields the merged completions of the providers that answered before
+        the deadline, then, if some providers were late, the merged
+        completions of all the providers that answered before
+        :attr:`late_timeout`. Completions with the same name are only kept
+        once, from the first provider of the list.
+
+        None is yielded while waiting (see :attr:`poll_interval`), the
+        providers that have not answered when the stream is closed are not
+        waited for. The late providers are waited for in a dedicated thread
+        (see :data:`pyqode.core.backend.pool.DETACH`), not in a pool thread.
+        """
+        providers = list(CodeCompletionWorker.providers)
+        answers = queue.Queue()
+
+        def run(index, prov):
+            answers.put((index, self._complete(prov, data)))
+
+        for index, prov in enumerate(providers):
+            thread = threading.Thread(target=run, args=(index, prov))
+            thread.daemon = True
+            thread.start()
+        received = {}
+
+        def wait(until):
+            while len(received) < len(providers):
+                remaining = until - time.time()
+                if remaining <= 0:
+                    return
+                try:
+                    index, results = answers.get(
+                        timeout=min(remaining, self.poll_interval))
+                except queue.Empty:
+                    yield None
+                else:
+                    received[index] = results
+
+        deadline = time.time() + data.get('deadline', self.deadline)
+        for heartbeat in wait(deadline):
+            yield heartbeat
+        if received:
+            yield self._results(data, self._merge(received))
+        if len(received) < len(providers):
+            nb_received = len(received)
+            yield DETACH
+            for heartbeat in wait(deadline + self.late_timeout):
+                yield heartbeat
+            if len(received) > nb_received:
+                yield self._results(data, self._merge(received))
+
+    @staticmethod
+    def _merge(received):
+        names = set()
+        merged = []
+        for index in sorted(received):
+            for completion in received[index] or []:
+                if completion['name'] not in names:
+                    names.add(completion['name'])
+                    merged.append(completion)
+        return merged
+
     def __call__(self, data):
         """
         Do the work (this will be called in the child process by the
         SubprocessServer).
         """
-        code = data['code']
-        line = data['line']
-        column = data['column']
-        path = data['path']
-        encoding = data['encoding']
-        prefix = data['prefix']
-        req_id = data['request_id']
-        abs_pos = data['abs_pos']
-        mime_type = data['mime_type']
-        completions = []
+        if self.streaming():
+            return self._fan_out(data)
         for prov in CodeCompletionWorker.providers:
-            try:
-                results = prov.complete(
-                    code, line, column, path, encoding, mime_type, prefix, abs_pos)
-                completions.append(results)
-                if len(completions):
-                    break
-            except:
-                sys.stderr.write('Failed to get completions from provider %r'
-                                 % prov)
-                exc1, exc2, exc3 = sys.exc_info()
-                traceback.print_exception(exc1, exc2, exc3, file=sys.stderr)
-        return [(line, column, req_id)] + completions
+            results = self._complete(prov, data)
+            if results is not None:
+                return self._results(data, results)
+        return [(data['line'], data['column'], data['request_id'], False)]
 
 
-class DocumentWordsProvider(object):
+def _match_rank(name, prefix):
+    """
+    Returns the rank of a completion name for the given prefix (the lower,
+    the better) or None if the name does not match the prefix.
     """
-    Provides completions based on the document words
+    if len(name) < len(prefix):
+        return None
+    for penalty, cut in enumerate(range(len(prefix), 0, -1)):
+        head, tail = prefix[:cut], prefix[cut:]
+        start = name.find(head)
+        while start != -1:
+            if name.find(tail, start + cut) != -1:
+                return start + penalty * 10
+            start = name.find(head, start + 1)
+    return 0 if not prefix else None
+
+
+class WordIndex(object):
     """
-    words = {}
+    A sorted multiset of words: words are kept sorted (which allows fast
+    prefix lookups using bisect) along with their number of occurrences.
+    """
+    def __init__(self, words=()):
+        self.counts = {}
+        for word in words:
+            self.counts[word] = self.counts.get(word, 0) + 1
+        #: sorted list of the distinct words
+        self.words = sorted(self.counts)
+
+    def add(self, words):
+        """ Adds words to the index """
+        for word in words:
+            count = self.counts.get(word, 0)
+            if not count:
+                bisect.insort(self.words, word)
+            self.counts[word] = count + 1
+
+    def remove(self, words):
+        """ Removes words from the index """
+        for word in words:
+            count = self.counts.get(word, 0) - 1
+            if count > 0:
+                self.counts[word] = count
+            elif count == 0:
+                del self.counts[word]
+                del self.words[bisect.bisect_left(self.words, word)]
+
+    def lookup(self, prefix):
+        """
+        Returns the words that start with ``prefix`` (sorted).
+        """
+        words = self.words
+        start = i = bisect.bisect_left(words, prefix)
+        while i < len(words) and words[i].startswith(prefix):
+            i += 1
+        return words[start:i]
 
+    def match(self, prefix):
+        """
+        Returns the words that match ``prefix``, ignoring case, the way the
+        completions are filtered (see :meth:`CodeCompletionWorker.filter`):
+        words that contain the prefix or a subsequence of its parts.
+        """
+        prefix = prefix.lower()
+        return [word for word in self.words
+                if _match_rank(word.lower(), prefix) is not None]
+
+
+def _common_prefix_length(str1, str2):
+    """ Returns the length of the common prefix of two strings """
+    low, high = 0, min(len(str1), len(str2))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if str1[low:middle] == str2[low:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def _changed_lines(old, new):
+    """
+    Returns the lines that differ between two versions of a text: the old
+    lines and the new lines (as two strings).
+    """
+    prefix = _common_prefix_length(old, new)
+    max_suffix = min(len(old), len(new)) - prefix
+    suffix = _common_prefix_length(old[::-1][:max_suffix],
+                                   new[::-1][:max_suffix])
+    start = old.rfind('\n', 0, prefix) + 1
+    old_end, new_end = old.find('\n', len(old) - suffix), \
+        new.find('\n', len(new) - suffix)
+    if old_end == -1:
+        old_end, new_end = len(old), len(new)
+    return old[start:old_end], new[start:new_end]
+
+
+class DocumentWordsProvider(object):
+    """
+    Provides completions based on the document words.
+
+    The words of each document are indexed (see :class:`WordIndex`), the
+    index is updated from the lines that changed since the previous request.
+    Documents are identified by their id when they are synchronized with the
+    backend (see :mod:`pyqode.core.backend.documents`), by their path
+    otherwise. The server does not tell when a document that is not
+    synchronized is closed, only the last :attr:`max_unsynced_documents`
+    of these documents are kept.
+
+    When a prefix is given, only the words that match the prefix (ignoring
+    case, see :meth:`WordIndex.match`) are provided.
+    """
     # word separators
     separators = [
         '~', '!', '@', '#', '$', '%', '^', '&', '*', '(', ')', '+', '{',
@@ -133,6 +470,29 @@ class DocumentWordsProvider(object):
         ']', '\\', '\n', '\t', '=', '-', ' '
     ]
 
+    #: True to provide the words of all the open documents, False to provide
+    #: the words of the current document only.
+    all_documents = False
+
+    #: The provider wants the document handle (see
+    #: :meth:`CodeCompletionWorker.Provider.complete`).
+    uses_document = True
+
+    #: Maximum number of documents identified by their path that are kept.
+    max_unsynced_documents = 16
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        #: text and word index of each document, indexed by document key.
+        self._documents = {}
+        #: keys of the documents identified by their path, least recently
+        #: used first.
+        self._unsynced = collections.OrderedDict()
+        #: words of all the documents (see :attr:`all_documents`)
+        self._all_words = WordIndex()
+        self._split_regex = None
+        self._split_separators = None
+
     @staticmethod
     def split(txt, seps):
         """
@@ -144,89 +504,253 @@ class DocumentWordsProvider(object):
         :return: A **set** of words found in the document (excluding
             punctuations, numbers, ...)
         """
-        # replace all possible separators with a default sep
-        default_sep = seps[0]
-        for sep in seps[1:]:
-            if sep:
-                txt = txt.replace(sep, default_sep)
-        # now we can split using the default_sep
-        raw_words = txt.split(default_sep)
-        words = set()
-        for word in raw_words:
-            # w = w.strip()
-            if word.replace('_', '').isalpha():
-                words.add(word)
-        return sorted(words)
-
-    def complete(self, code, *args):
+        regex = re.compile('[^%s]+' % re.escape(''.join(seps)))
+        return sorted(set(word for word in regex.findall(txt)
+                          if word.replace('_', '').isalpha()))
+
+    def tokenize(self, txt):
+        """
+        Returns the list of words found in ``txt`` (with duplicates).
+        """
+        if self._split_separators != self.separators:
+            self._split_separators = list(self.separators)
+            self._split_regex = re.compile(
+                '[^%s]+' % re.escape(''.join(self.separators)))
+        return [word for word in self._split_regex.findall(txt)
+                if word.replace('_', '').isalpha()]
+
+    def index(self, key, code):
+        """
+        Updates the word index of a document and returns it.
+
+        :param key: document key
+        :param code: new document text
+        :return: :class:`WordIndex`
+        """
+        try:
+            text, index = self._documents[key]
+        except KeyError:
+            index = WordIndex(self.tokenize(code))
+            if self.all_documents:
+                self._all_words.add(index.counts)
+        else:
+            if text == code:
+                return index
+            old_lines, new_lines = _changed_lines(text, code)
+            removed = self.tokenize(old_lines)
+            added = self.tokenize(new_lines)
+            new_words = set(w for w in added if w not in index.counts)
+            index.remove(removed)
+            index.add(added)
+            if self.all_documents:
+                # the global index counts the documents that contain a word
+                self._all_words.remove(set(w for w in removed
+                                           if w not in index.counts))
+                self._all_words.add(new_words)
+        self._documents[key] = (code, index)
+        return index
+
+    def close_document(self, document_id):
+        """
+        Drops the index of a closed document.
+        """
+        with self._lock:
+            self._close(document_id)
+
+    def _close(self, key):
+        self._unsynced.pop(key, None)
+        try:
+            text, index = self._documents.pop(key)
+        except KeyError:
+            return
+        if self.all_documents:
+            self._all_words.remove(index.counts)
+
+    def complete(self, code, line=0, column=0, path=None, encoding=None,
+                 mime_type=None, prefix='', abs_pos=0, document=None):
         """
         Provides completions based on the document words.
 
         :param code: code to complete
-        :param args: additional (unused) arguments.
+        :param path: file path, used as the document key if the document is
+            not synchronized
+        :param document: handle of the synchronized document (or None)
         """
-        completions = []
-        for word in self.split(code, self.separators):
-            completions.append({'name': word})
-        return completions
+        key = document['id'] if document else path
+        with self._lock:
+            index = self.index(key, code)
+            if not document:
+                self._unsynced.pop(key, None)
+                self._unsynced[key] = True
+                while len(self._unsynced) > self.max_unsynced_documents:
+                    self._close(next(iter(self._unsynced)))
+            if self.all_documents:
+                index = self._all_words
+            if prefix:
+                words = index.match(prefix)
+            else:
+                words = index.words
+            return [{'name': word} for word in words]
+
+
+def compile_search(sub, regex=False, case_sensitive=False,
+                   whole_word=False, encoding=None):
+    """
+    Compiles the regular expression that finds all the occurrences of one or
+    several search strings in a single pass.
+
+    When several strings are searched, the alternative of each string is a
+    named group (``_0``, ``_1``,...) so that the string that matched can be
+    retrieved with ``match.lastgroup``.
+
+    :param sub: string to search or list of strings to search
+    :param regex: True if the search strings are regular expressions
+    :param case_sensitive: True to match case, False to ignore case
+    :param whole_word: True to match whole words only (the match must be
+        surrounded by :attr:`DocumentWordsProvider.separators`)
+    :param encoding: if set, the regular expression is compiled for searching
+        bytes encoded with this encoding (e.g. memory mapped files). Case
+        insensitive matching of bytes is limited to ascii letters.
+    :return: the compiled regular expression or None if there is nothing to
+        search.
+    """
+    subs = sub if isinstance(sub, (list, tuple)) else [sub]
+    patterns = []
+    for i, string in enumerate(subs):
+        if string:
+            patterns.append((i, string if regex else re.escape(string)))
+    if not patterns:
+        return None
+    if whole_word:
+        seps = re.escape(''.join(DocumentWordsProvider.separators))
+        if regex:
+            template = '(?<![^{0}])(?:{1})(?![^{0}])'
+        else:
+            # the lookbehind is put after the string so that the regex engine
+            # can quickly skip to the next occurrence of the string (3 times
+            # faster)
+            template = '{1}(?<![^{0}]{1})(?![^{0}])'
+        patterns = [(i, template.format(seps, ptrn)) for i, ptrn in patterns]
+    if isinstance(sub, (list, tuple)):
+        if not regex:
+            # longest strings first, python regex alternatives are not greedy
+            patterns.sort(key=lambda item: -len(subs[item[0]]))
+        pattern = '|'.join('(?P<_%d>%s)' % item for item in patterns)
+    else:
+        pattern = patterns[0][1]
+    flags = re.MULTILINE
+    if not case_sensitive:
+        flags |= re.IGNORECASE
+    if encoding is not None and not isinstance(pattern, bytes):
+        pattern = pattern.encode(encoding)
+    return re.compile(pattern, flags)
 
 
 def finditer_noregex(string, sub, whole_word):
     """
-    Search occurrences using str.find instead of regular expressions.
+    Search occurrences of a plain string (case sensitive).
 
     :param string: string to parse
     :param sub: search string
     :param whole_word: True to select whole words only
     """
-    start = 0
-    while True:
-        start = string.find(sub, start)
-        if start == -1:
-            return
-        if whole_word:
-            if start:
-                pchar = string[start - 1]
-            else:
-                pchar = ' '
-            try:
-                nchar = string[start + len(sub)]
-            except IndexError:
-                nchar = ' '
-            if nchar in DocumentWordsProvider.separators and \
-                    pchar in DocumentWordsProvider.separators:
-                yield start
-            start += len(sub)
-        else:
-            yield start
-            start += 1
+    regex = compile_search(sub, case_sensitive=True, whole_word=whole_word)
+    if regex is None:
+        return
+    for match in _finditer(regex, string, overlapping=not whole_word):
+        yield match.start()
+
+
+def _finditer(expr, string, pos=0, overlapping=False):
+    """
+    Iterates over the matches of ``expr`` from ``pos``. If ``overlapping`` is
+    True, the next match is searched from the character that follows the
+    start of the previous one (e.g. 'aa' is found twice in 'aaa').
+    """
+    if not overlapping:
+        for match in expr.finditer(string, pos):
+            yield match
+        return
+    match = expr.search(string, pos)
+    while match is not None:
+        yield match
+        match = expr.search(string, match.start() + 1)
+
+
+def _finditer_from(expr, string, position, overlapping=False):
+    """
+    Iterates over the matches of ``expr``, starting from the line that
+    contains ``position`` and wrapping around at the end of the string.
+    """
+    start = string.rfind('\n', 0, position) + 1
+    for match in _finditer(expr, string, start, overlapping):
+        yield match
+    if start:
+        for match in _finditer(expr, string, 0, overlapping):
+            if match.start() >= start:
+                return
+            yield match
 
 
 def findalliter(string, sub, regex=False, case_sensitive=False,
-                whole_word=False):
+                whole_word=False, position=0):
     """
     Generator that finds all occurrences of ``sub`` in  ``string``
     :param string: string to parse
-    :param sub: string to search
+    :param sub: string to search, or list of strings to search
     :param regex: True to search using regex
     :param case_sensitive: True to match case, False to ignore case
-    :param whole_word: True to returns only whole words
-    :return:
+    :param whole_word: True to returns only whole words (ignored for regex
+        searches)
+    :param position: the search starts at the line that contains
+        ``position`` and wraps around at the end of the string (the
+        occurrences are not sorted if ``position`` is not 0).
+    :return: the span of each occurrence, followed by the index of the
+        search string that matched if ``sub`` is a list.
+
+    The occurrences of a plain string may overlap (e.g. 'aa' is found
+    twice in 'aaa') unless ``whole_word`` is True.
     """
-    if not sub:
+    whole_word = whole_word and not regex
+    expr = compile_search(sub, regex=regex, case_sensitive=case_sensitive,
+                          whole_word=whole_word)
+    if expr is None:
         return
-    if regex:
-        flags = re.MULTILINE
-        if not case_sensitive:
-            flags |= re.IGNORECASE
-        for val in re.finditer(sub, string, flags):
-            yield val.span()
+    overlapping = not regex and not whole_word
+    if position:
+        matches = _finditer_from(expr, string, position, overlapping)
     else:
-        if not case_sensitive:
-            string = string.lower()
-            sub = sub.lower()
-        for val in finditer_noregex(string, sub, whole_word):
-            yield val, val + len(sub)
+        matches = _finditer(expr, string, overlapping=overlapping)
+    if isinstance(sub, (list, tuple)):
+        for match in matches:
+            start, end = match.span()
+            yield start, end, int(match.lastgroup[1:])
+    else:
+        for match in matches:
+            yield match.span()
+
+
+def _compact(matches):
+    """
+    Converts the (start, end[, index]) matches to (start, length[, index]).
+    """
+    for match in matches:
+        yield (match[0], match[1] - match[0]) + tuple(match[2:])
+
+
+def _chunks(matches, chunk_size, compact):
+    """
+    Groups the matches in chunks of ``chunk_size`` matches. The last chunk
+    (which may be empty) is flagged with ``'done': True``.
+    """
+    while True:
+        chunk = list(itertools.islice(matches, chunk_size))
+        done = len(chunk) < chunk_size
+        if compact:
+            chunk = [value for match in chunk for value in match]
+        yield {'matches': chunk, 'done': done}
+        if done:
+            return
 
 
 def findall(data):
@@ -237,13 +761,159 @@ def findall(data):
     :param data: Request data dict::
         {
             'string': string to search in text
-            'sub': input text
+            'sub': input text, or list of input texts to search in a
+                   single pass
             'regex': True to consider string as a regular expression
             'whole_word': True to match whole words only.
             'case_sensitive': True to match case, False to ignore case
+            'compact': optional, True to get the results as a flat list of
+                       integers (see below)
+            'position': optional, position where the search starts (e.g.
+                        the caret position). The occurrences of the line
+                        of ``position`` and of the following lines come
+                        first, the search then wraps around.
+            'limit': optional, maximum number of occurrences, the search
+                     stops as soon as the limit has been reached.
+            'chunk_size': optional, streams the occurrences by chunks of
+                          ``chunk_size`` occurrences (see below)
         }
-    :return: list of occurrence positions in text
+    :return: list of occurrence positions in text: ``(start, end)`` or
+        ``(start, end, index_of_sub)`` if ``sub`` is a list. The compact
+        results are ``[start, length, start, length, ...]`` (or ``[start,
+        length, index_of_sub, ...]`` if ``sub`` is a list), this is much
+        cheaper to send when there are a lot of occurrences.
+
+        If ``chunk_size`` is set, the worker streams the results: each
+        chunk is a dict ``{'matches': occurrences, 'done': bool}`` where
+        ``occurrences`` uses the format described above and ``done`` is
+        True for the last chunk.
     """
-    return list(findalliter(
+    matches = findalliter(
         data['string'], data['sub'], regex=data['regex'],
-        whole_word=data['whole_word'], case_sensitive=data['case_sensitive']))
+        whole_word=data['whole_word'], case_sensitive=data['case_sensitive'],
+        position=data.get('position', 0))
+    return _findall_results(data, matches)
+
+
+def _findall_results(data, matches):
+    """
+    Applies the ``limit``, ``compact`` and ``chunk_size`` parameters of a
+    findall request to the occurrences found.
+    """
+    if data.get('limit'):
+        matches = itertools.islice(matches, data['limit'])
+    compact = data.get('compact', False)
+    if data.get('chunk_size'):
+        if compact:
+            matches = _compact(matches)
+        return _chunks(matches, data['chunk_size'], compact)
+    if not compact:
+        return list(matches)
+    results = []
+    extend = results.extend
+    if isinstance(data['sub'], (list, tuple)):
+        for start, end, index in matches:
+            extend((start, end - start, index))
+    else:
+        for start, end in matches:
+            extend((start, end - start))
+    return results
+
+
+def _findall_cache_view(data):
+    """
+    Caches all the occurrences of a search (up to
+    ``findall.max_cached_matches``), the requests that only differ by their
+    ``position``, ``limit``, ``compact`` or ``chunk_size`` parameters share
+    the cached occurrences (see :meth:`JsonServer.cache_request`).
+    """
+    full_data = dict((key, value) for key, value in data.items()
+                     if key not in ('position', 'chunk_size', 'compact'))
+    full_data['limit'] = findall.max_cached_matches + 1
+
+    def view(matches):
+        if len(matches) > findall.max_cached_matches:
+            # too many occurrences to cache them all
+            return findall(data)
+        position = data.get('position', 0)
+        if position:
+            # same order as _finditer_from
+            start = data['string'].rfind('\n', 0, position) + 1
+            index = bisect.bisect_left(matches, (start, ))
+            matches = matches[index:] + matches[:index]
+        return _findall_results(data, iter(matches))
+
+    return full_data, view
+
+
+findall.priority = PRIORITY_HIGH
+
+#: Search requests are often made again for the same text
+findall.cacheable = True
+findall.cache_view = _findall_cache_view
+
+#: Maximum number of occurrences cached for a search.
+findall.max_cached_matches = 10000
+
+#: findall streams its results when the request has a chunk_size.
+findall.streaming = True
+
+
+def find_in_files(data):
+    """
+    Worker that searches the files of a directory tree (find in files).
+
+    The files are searched in a process pool (see
+    :mod:`pyqode.core.backend.search`) and the results are streamed as soon
+    as they are available.
+
+    :param data: Request data dict::
+        {
+            'root': root directory
+            'sub': input text, or list of input texts to search in a
+                   single pass
+            'regex': True to consider string as a regular expression
+            'whole_word': True to match whole words only.
+            'case_sensitive': True to match case, False to ignore case
+            'ignored_patterns': optional, files and directories to skip
+                                (see
+                                :attr:`pyqode.core.backend.search.IGNORED_PATTERNS`)
+            'include_patterns': optional, only search the files whose name
+                                matches one of these patterns (e.g. '*.py')
+            'encoding': optional, encoding of the files (default is utf-8)
+            'limit': optional, maximum number of matches
+            'use_index': optional, True to only search the files that may
+                         contain a match according to the trigram index of
+                         the root directory (see
+                         :class:`pyqode.core.backend.index.TrigramIndex`)
+            'index_dir': optional, directory where the index is persisted
+        }
+    :return: chunks of results: ``{'files': files, 'searched': nb_files,
+        'done': bool}`` where ``files`` is a list of ``(path, matches)``,
+        each match being ``(line, column, length, line_text)`` (0 based),
+        ``searched`` the number of files searched so far and ``done`` is
+        True for the last chunk.
+    """
+    encoding = data.get('encoding', 'utf-8')
+    expr = compile_search(
+        data['sub'], regex=data['regex'], whole_word=data['whole_word'],
+        case_sensitive=data['case_sensitive'], encoding=encoding)
+    searched = 0
+    if expr is not None:
+        paths = search.walk(data['root'], data.get('ignored_patterns'),
+                            data.get('include_patterns'))
+        if data.get('use_index'):
+            index = get_index(data['root'], data.get('index_dir'))
+            paths = index.iter_filter(paths, data['sub'], data['regex'],
+                                      encoding)
+        for nb_files, files in search.find_in_files(
+                paths, expr.pattern, expr.flags, encoding,
+                data.get('limit', 0)):
+            searched += nb_files
+            yield {'files': files, 'searched': searched, 'done': False}
+    yield {'files': [], 'searched': searched, 'done': True}
+
+find_in_files.priority = PRIORITY_LOW
+find_in_files.streaming = True
+#: Leaves a background thread to the other low priority requests (linters).
+find_in_files.max_concurrency = 1
@@ -4,11 +4,14 @@ This module contains the backend controller
 import logging
 import socket
 import sys
-from pyqode.qt import QtCore
+import time
 
-from pyqode.core.api.client import JsonTcpClient, BackendProcess
+from pyqode.core.api.client import (
+    JsonTcpClient, JsonLocalClient, BackendProcess, BackendStats,
+    DocumentSync)
 from pyqode.core.api.manager import Manager
-from pyqode.core.backend import NotRunning, echo_worker
+from pyqode.core.backend import NotRunning
+from pyqode.qt import QtCore
 
 
 def _logger():
@@ -23,6 +26,255 @@ def comm(msg, *args):
     _logger().log(COMM, msg, *args)
 
 
+#: Spare backend processes, indexed by (script, interpreter, args,
+#: transport), see :func:`start_backend_process`.
+_spares = {}
+
+
+def _take_spare(key, parent):
+    """
+    Returns the spare process started for the given key (if it is still
+    running) and its address.
+    """
+    try:
+        process, address, client = _spares.pop(key)
+    except KeyError:
+        return None, None
+    # the spare process was kept alive by this connection, the backend
+    # shuts down if no client connects within its idle timeout
+    client.close()
+    client.deleteLater()
+    if process.state() == process.NotRunning:
+        process.deleteLater()
+        return None, None
+    process.setParent(parent)
+    return process, address
+
+
+def _start_spare(key):
+    """
+    Starts a spare process for the given key. The spare process is connected
+    right away, it is ready to handle requests when it is taken.
+    """
+    script, interpreter, args, transport = key
+    process, address = start_backend_process(
+        None, script, interpreter, list(args), transport)
+    if transport == 'local':
+        client = JsonLocalClient(None, address)
+    else:
+        client = JsonTcpClient(None, address)
+    _spares[key] = (process, address, client)
+
+
+def stop_spare_processes():
+    """
+    Stops the spare backend processes (see the ``use_spare`` parameter of
+    :func:`start_backend_process`).
+
+    Spare processes shut down by themselves once the application has exited,
+    call this function to stop them right away.
+    """
+    while _spares:
+        process, address, client = _spares.popitem()[1]
+        client.close()
+        client.deleteLater()
+        stop_backend_process(process)
+        process.deleteLater()
+
+
+def start_backend_process(parent, script, interpreter, args, transport,
+                          error_callback=None, use_spare=False):
+    """
+    Starts a backend process.
+
+    :param parent: parent of the process (or None)
+    :param script: path to the backend script.
+    :param interpreter: python interpreter used to run the script.
+    :param args: list of additional command line args.
+    :param transport: 'tcp' or 'local'
+    :param error_callback: optional callback connected to the process error
+        signal.
+    :param use_spare: True to use the spare process started for the same
+        script (if any) and to start a new spare process. The spare process
+        is already up and connected, using it saves the interpreter startup
+        time (e.g. when a crashed backend is restarted).
+    :returns: the process and the address of the backend (port or socket
+        path)
+    """
+    if use_spare:
+        key = (script, interpreter, tuple(args or []), transport)
+        process, address = _take_spare(key, parent)
+        _start_spare(key)
+        if process is not None:
+            comm('using spare backend process %s', address)
+            if error_callback:
+                process.error.connect(error_callback)
+            return process, address
+    backend_script = script.replace('.pyc', '.py')
+    if transport == 'local':
+        address = JsonLocalClient.pick_free_path()
+    else:
+        address = BackendManager.pick_free_port()
+    if hasattr(sys, "frozen") and not backend_script.endswith('.py'):
+        # frozen backend script on windows/mac does not need an
+        # interpreter
+        program = backend_script
+        pgm_args = [str(address)]
+    else:
+        program = interpreter
+        pgm_args = [backend_script, str(address)]
+    if transport == 'local':
+        pgm_args += ['--transport', 'local']
+    if args:
+        pgm_args += args
+    process = BackendProcess(parent)
+    if error_callback:
+        process.error.connect(error_callback)
+    process.start(program, pgm_args)
+    comm('starting backend process: %s %s', program, ' '.join(pgm_args))
+    return process, address
+
+
+def stop_backend_process(process):
+    """
+    Stops a backend process and waits for it to finish.
+    """
+    comm('stopping backend process')
+    # prevent crash logs from being written if we are busy killing
+    # the process
+    process._prevent_logs = True
+    while process.state() != process.NotRunning:
+        process.waitForFinished(1)
+        if sys.platform == 'win32':
+            # Console applications on Windows that do not run an event
+            # loop, or whose event loop does not handle the WM_CLOSE
+            # message, can only be terminated by calling kill().
+            process.kill()
+        else:
+            process.terminate()
+    process._prevent_logs = False
+    comm('backend process terminated')
+
+
+class BackendPool(object):
+    """
+    A pool of backend processes shared by the editors that start the same
+    backend script (see the ``reuse`` parameter of
+    :meth:`BackendManager.start`).
+
+    Each editor is attached to one process of the pool: an idle process if
+    there is one, a new process if the pool is not full, the process that
+    serves the fewest editors otherwise. An editor keeps using the same
+    process (affinity), so that the state kept by the backend for its
+    document (document copy, persistent workers) stays warm.
+
+    Processes are reference counted, a process is stopped when the last
+    editor attached to it is released.
+    """
+    class Slot(object):
+        """ A process of the pool """
+        def __init__(self):
+            self.process = None
+            self.address = None
+            #: Number of editors attached to the process
+            self.users = 0
+
+    #: Pools indexed by (script, interpreter, args, transport)
+    _pools = {}
+
+    #: Pool and slot of the last editor attached to a process (used by the
+    #: deprecated BackendManager.LAST_* attributes)
+    _last = (None, None)
+
+    def __init__(self, key, size):
+        self.key = key
+        #: Maximum number of processes
+        self.size = max(1, size)
+        self.slots = []
+
+    @classmethod
+    def acquire(cls, script, interpreter, args, transport, size,
+                error_callback=None, use_spare=False):
+        """
+        Attaches an editor to a process of the pool of the given script.
+
+        :returns: the pool and the slot of the process attached to the editor
+        """
+        key = (script, interpreter, tuple(args or []), transport)
+        try:
+            pool = cls._pools[key]
+        except KeyError:
+            pool = cls._pools[key] = BackendPool(key, size)
+        slot = pool._attach(error_callback, use_spare)
+        cls._last = (pool, slot)
+        return pool, slot
+
+    @classmethod
+    def last_slot(cls):
+        """
+        Returns the pool and the slot of the last editor attached to a
+        process, (None, None) if that process has been stopped since.
+        """
+        pool, slot = cls._last
+        if pool is None or slot not in pool.slots:
+            return None, None
+        return pool, slot
+
+    def _attach(self, error_callback, use_spare=False):
+        slot = min(self.slots, key=lambda s: s.users) if self.slots else None
+        if slot is None or (slot.users and len(self.slots) < self.size):
+            slot = BackendPool.Slot()
+            self.slots.append(slot)
+        if slot.process is None or \
+                slot.process.state() == slot.process.NotRunning:
+            # new process or crashed process
+            crashed = slot.process
+            script, interpreter, args, transport = self.key
+            slot.process, slot.address = start_backend_process(
+                None, script, interpreter, list(args), transport,
+                error_callback, use_spare)
+            if crashed is not None:
+                # pooled processes have no parent, the crashed process
+                # would never be deleted
+                crashed.deleteLater()
+        slot.users += 1
+        return slot
+
+    def release(self, slot):
+        """
+        Detaches an editor from its process. The process is stopped if no
+        other editor uses it.
+        """
+        slot.users -= 1
+        if slot.users > 0:
+            return
+        self.slots.remove(slot)
+        stop_backend_process(slot.process)
+        slot.process.deleteLater()
+        if not self.slots:
+            self._pools.pop(self.key, None)
+
+
+class _SharedBackendAttribute(object):
+    """
+    Read-only attribute that exposes the state of the last shared backend
+    process (see :meth:`BackendPool.last_slot`). It replaces the
+    BackendManager class attributes used before the backend pools.
+    """
+    def __init__(self, getter, default=None):
+        self.getter = getter
+        self.default = default
+
+    def __get__(self, instance, owner):
+        pool, slot = BackendPool.last_slot()
+        if slot is None:
+            return self.default
+        return self.getter(pool, slot)
+
+    def __set__(self, instance, value):
+        raise AttributeError('read-only attribute')
+
+
 class BackendManager(Manager):
     """
     The backend controller takes care of controlling the client-server
@@ -35,23 +287,78 @@ class BackendManager(Manager):
         - stop
         - send_request
 
+    Once started, the backend process is supervised: if it crashes, it is
+    restarted (with an exponential backoff if it keeps crashing) and the
+    requests that were not answered are sent again to the new process. The
+    requests sent while the backend is restarting are queued.
+
+    .. deprecated:: 2.9.0
+        The ``LAST_PORT``, ``LAST_PROCESS``, ``LAST_TRANSPORT`` and
+        ``SHARE_COUNT`` class attributes are read-only, they describe the
+        process of the last editor started with ``reuse=True``. Use
+        :class:`BackendPool` instead.
     """
-    LAST_PORT = None
-    LAST_PROCESS = None
-    SHARE_COUNT = 0
+    LAST_PORT = _SharedBackendAttribute(lambda pool, slot: slot.address)
+    LAST_PROCESS = _SharedBackendAttribute(lambda pool, slot: slot.process)
+    LAST_TRANSPORT = _SharedBackendAttribute(lambda pool, slot: pool.key[3])
+    SHARE_COUNT = _SharedBackendAttribute(lambda pool, slot: slot.users, 0)
+
+    #: Number of backend processes shared by the editors that start the same
+    #: script with ``reuse=True``.
+    pool_size = 1
+
+    #: True to send the document changes to the backend instead of sending the
+    #: whole document text with every request (see the ``text_key`` parameter
+    #: of :meth:`send_request`).
+    incremental_sync = True
+
+    #: True to restart the backend process when it crashes.
+    supervised = True
+
+    #: Delay (in milliseconds) before restarting a backend that crashed
+    #: shortly after having been restarted. The delay is doubled after each
+    #: crash, up to :attr:`max_restart_delay`.
+    restart_delay = 100
+
+    #: Maximum delay (in milliseconds) before restarting a crashed backend.
+    max_restart_delay = 5000
+
+    #: Number of consecutive crashes after which the backend is not restarted
+    #: anymore (:meth:`send_request` then raises NotRunning).
+    max_restarts = 10
+
+    #: A backend that ran for that many seconds before crashing is restarted
+    #: right away.
+    stable_time = 10
+
+    #: True to keep a spare backend process, started in advance, so that a
+    #: crashed backend can be replaced without waiting for the interpreter to
+    #: start (see :func:`start_backend_process`).
+    spare_process = False
 
     def __init__(self, editor):
         super(BackendManager, self).__init__(editor)
         self._process = None
-        self._sockets = []
+        self._socket = None
+        self._document_sync = None
+        self._transport = 'tcp'
         self.server_script = None
         self.interpreter = None
         self.args = None
-        self._shared = False
-        self._heartbeat_timer = QtCore.QTimer()
-        self._heartbeat_timer.setInterval(1000)
-        self._heartbeat_timer.timeout.connect(self._send_heartbeat)
-        self._heartbeat_timer.start()
+        self._pool = None
+        self._slot = None
+        self._error_callback = None
+        #: True between start and stop: the process is restarted if it
+        #: crashes.
+        self._supervising = False
+        self._restarts = 0
+        self._started_at = 0
+        #: callbacks to call once the backend has been started (see
+        #: :meth:`call_when_started`)
+        self._waiting = []
+        #: Statistics about the requests sent to the backend (see
+        #: :class:`pyqode.core.api.client.BackendStats`).
+        self.stats = BackendStats()
 
     @staticmethod
     def pick_free_port():
@@ -63,7 +370,7 @@ class BackendManager(Manager):
         return free_port
 
     def start(self, script, interpreter=sys.executable, args=None,
-              error_callback=None, reuse=False):
+              error_callback=None, reuse=False, transport='tcp'):
         """
         Starts the backend process.
 
@@ -83,82 +390,80 @@ class BackendManager(Manager):
             application (frozen backends do not require an interpreter).
         :param args: list of additional command line args to use to start
             the backend process.
-        :param reuse: True to reuse an existing backend process. WARNING: to
-            use this, your application must have one single server script. If
-            you're creating an app which supports multiple programming
-            languages you will need to merge all backend scripts into one
-            single script, otherwise the wrong script might be picked up).
-        """
-        self._shared = reuse
-        if reuse and BackendManager.SHARE_COUNT:
-            self._port = BackendManager.LAST_PORT
-            self._process = BackendManager.LAST_PROCESS
-            BackendManager.SHARE_COUNT += 1
+        :param reuse: True to share the backend processes with the other
+            editors that start the same script (with the same interpreter,
+            args and transport). See :class:`BackendPool`, the number of
+            processes is set by :attr:`pool_size`.
+        :param transport: ``'tcp'`` to communicate with the backend through
+            the loopback interface, ``'local'`` to use a unix domain socket
+            (faster and no need to find a free port). The local transport is
+            not available on Windows, tcp is used instead.
+        """
+        self._restarts = 0
+        self._start(script, interpreter, args, error_callback, reuse,
+                    transport)
+        # callers that could not send their request before the backend was
+        # started (see call_when_started)
+        waiting, self._waiting = self._waiting, []
+        for callback in waiting:
+            QtCore.QTimer.singleShot(0, callback)
+
+    def _start(self, script, interpreter, args, error_callback, reuse,
+               transport):
+        # the connection to the previous backend (if any) is useless now
+        self.stop()
+        self.server_script = script
+        self.interpreter = interpreter
+        self.args = args
+        if transport == 'local' and sys.platform == 'win32':
+            transport = 'tcp'
+        self._transport = transport
+        self._error_callback = error_callback
+        if reuse:
+            self._pool, self._slot = BackendPool.acquire(
+                script, interpreter, args, transport, self.pool_size,
+                error_callback, self.spare_process)
+            self._process = self._slot.process
+            self._port = self._slot.address
         else:
-            if self.running:
-                self.stop()
-            self.server_script = script
-            self.interpreter = interpreter
-            self.args = args
-            backend_script = script.replace('.pyc', '.py')
-            self._port = self.pick_free_port()
-            if hasattr(sys, "frozen") and not backend_script.endswith('.py'):
-                # frozen backend script on windows/mac does not need an
-                # interpreter
-                program = backend_script
-                pgm_args = [str(self._port)]
-            else:
-                program = interpreter
-                pgm_args = [backend_script, str(self._port)]
-            if args:
-                pgm_args += args
-            self._process = BackendProcess(self.editor)
-            if error_callback:
-                self._process.error.connect(error_callback)
-            self._process.start(program, pgm_args)
-
-            if reuse:
-                BackendManager.LAST_PROCESS = self._process
-                BackendManager.LAST_PORT = self._port
-                BackendManager.SHARE_COUNT += 1
-            comm('starting backend process: %s %s', program,
-                 ' '.join(pgm_args))
-            self._heartbeat_timer.start()
+            self._process, self._port = start_backend_process(
+                self.editor, script, interpreter, args, transport,
+                error_callback, self.spare_process)
+        self._process.finished.connect(self._on_process_finished)
+        self._process.error.connect(self._on_process_error)
+        self._started_at = time.time()
+        self._supervising = True
+        # connect right away: the backend shuts itself down if no client is
+        # connected (there is no heartbeat)
+        self._connect_socket()
 
     def stop(self):
         """
         Stops the backend process.
+
+        If the process is shared with other editors, it is only stopped when
+        the last editor stops using it.
         """
+        self._supervising = False
         if self._process is None:
             return
-        if self._shared:
-            BackendManager.SHARE_COUNT -= 1
-            if BackendManager.SHARE_COUNT:
-                return
-        comm('stopping backend process')
-        # close all sockets
-        for s in self._sockets:
-            s._callback = None
-            s.close()
-
-        self._sockets[:] = []
-        # prevent crash logs from being written if we are busy killing
-        # the process
-        self._process._prevent_logs = True
-        while self._process.state() != self._process.NotRunning:
-            self._process.waitForFinished(1)
-            if sys.platform == 'win32':
-                # Console applications on Windows that do not run an event
-                # loop, or whose event loop does not handle the WM_CLOSE
-                # message, can only be terminated by calling kill().
-                self._process.kill()
-            else:
-                self._process.terminate()
-        self._process._prevent_logs = False
-        self._heartbeat_timer.stop()
-        comm('backend process terminated')
+        try:
+            self._process.finished.disconnect(self._on_process_finished)
+            self._process.error.disconnect(self._on_process_error)
+        except (RuntimeError, TypeError):
+            pass
+        self._close_socket()
+        if self._pool is not None:
+            self._pool.release(self._slot)
+            self._pool = self._slot = None
+            self._process = None
+        else:
+            stop_backend_process(self._process)
+            self._process.deleteLater()
+            self._process = None
 
-    def send_request(self, worker_class_or_function, args, on_receive=None):
+    def send_request(self, worker_class_or_function, args, on_receive=None,
+                     priority=None, coalesce_key=None, text_key=None):
         """
         Requests some work to be done by the backend. You can get notified of
         the work results by passing a callback (on_receive).
@@ -167,45 +472,181 @@ class BackendManager(Manager):
         :param args: worker args, any Json serializable objects
         :param on_receive: an optional callback executed when we receive the
             worker's results. The callback will be called with one arguments:
-            the results of the worker (object)
-
-        :raise: backend.NotRunning if the backend process is not running.
+            the results of the worker (object). Streaming workers may
+            produce several results, the callback is called for each of
+            them.
+        :param priority: optional request priority, overrides the priority of
+            the worker (see :const:`pyqode.core.backend.PRIORITY_NORMAL`).
+        :param coalesce_key: optional coalescing key: the new request
+            supersedes any pending request sent with the same key (the
+            pending request is skipped by the backend and its results are
+            dropped). Use it for requests where only the latest result
+            matters.
+        :param text_key: if set, the editor text is added to the worker args
+            under that key. When :attr:`incremental_sync` is enabled, only the
+            text changes are sent to the backend, which then injects the text
+            of its own copy of the document into the worker args.
+
+        :returns: The request id, it can be used to cancel the request (see
+            :meth:`cancel_request`).
+
+        :raise: backend.NotRunning if the backend has not been started (or
+            has been stopped, or keeps crashing). Use
+            :meth:`call_when_started` to send the request once the backend
+            has been started. Requests sent while a crashed backend is
+            being restarted are queued.
         """
-        if not self.running:
+        if not self.running and not self._supervising:
+            raise NotRunning()
+        comm('sending request, worker=%r' % worker_class_or_function)
+        self._connect_socket()
+        document = None
+        if text_key is not None:
+            if self.incremental_sync:
+                document = self._get_document_sync()
+            else:
+                args = dict(args)
+                args[text_key] = self.editor.toPlainText()
+        request_id = self._socket.request(
+            worker_class_or_function, args, on_receive=on_receive,
+            priority=priority, coalesce_key=coalesce_key,
+            document=document, text_key=text_key)
+        return request_id
+
+    def call_when_started(self, callback):
+        """
+        Calls ``callback`` once the backend has been started (right away if
+        it is already running). Use it to send a request again when
+        :meth:`send_request` raised NotRunning, instead of polling the
+        backend::
+
             try:
-                # try to restart the backend if it crashed.
-                self.start(self.server_script, interpreter=self.interpreter,
-                           args=self.args)
-            except AttributeError:
-                pass  # not started yet
-            finally:
-                # caller should try again, later
-                raise NotRunning()
+                editor.backend.send_request(worker, data, on_receive=cb)
+            except NotRunning:
+                editor.backend.call_when_started(self.request)
+
+        A callback is only called once, even if it has been registered
+        several times.
+        """
+        if self.running:
+            QtCore.QTimer.singleShot(0, callback)
+        elif callback not in self._waiting:
+            self._waiting.append(callback)
+
+    def _on_process_finished(self, exit_code=0,
+                             exit_status=QtCore.QProcess.NormalExit):
+        """
+        Restarts the backend process when it crashes.
+
+        A backend that exits normally (e.g. it shut itself down because no
+        client was connected anymore) is not restarted.
+        """
+        if not self.supervised or not self._supervising:
+            return
+        if exit_code == 0 and exit_status == QtCore.QProcess.NormalExit:
+            comm('backend process exited')
+            self._supervising = False
+            return
+        if time.time() - self._started_at > self.stable_time:
+            self._restarts = 0
+        if self._restarts >= self.max_restarts:
+            _logger().warning('the backend process keeps crashing, it won\'t '
+                              'be restarted')
+            self._supervising = False
+            return
+        if self._restarts:
+            delay = min(self.restart_delay * 2 ** (self._restarts - 1),
+                        self.max_restart_delay)
         else:
-            comm('sending request, worker=%r' % worker_class_or_function)
-            # create a socket, the request will be send as soon as the socket
-            # has connected
-            socket = JsonTcpClient(
-                self.editor, self._port, worker_class_or_function, args,
-                on_receive=on_receive)
-            socket.finished.connect(self._rm_socket)
-            self._sockets.append(socket)
-            # restart heartbeat timer
-            self._heartbeat_timer.start()
-
-    def _send_heartbeat(self):
-        try:
-            self.send_request(echo_worker, {'heartbeat': True})
-        except NotRunning:
-            self._heartbeat_timer.stop()
+            delay = 0
+        self._restarts += 1
+        comm('backend process exited, restarting it in %d ms', delay)
+        QtCore.QTimer.singleShot(delay, self._restart)
+
+    def _on_process_error(self, error):
+        if error == 0:
+            # failed to start, there won't be any finished signal
+            self._on_process_finished(-1, QtCore.QProcess.CrashExit)
 
-    def _rm_socket(self, socket):
+    def _restart(self):
+        """
+        Restarts the backend process and sends the pending requests again.
+        """
+        if not self._supervising or self.running:
+            return
+        pending = []
+        if self._socket is not None:
+            pending = self._socket.take_pending()
+        self._start(self.server_script, self.interpreter, self.args,
+                    self._error_callback, self._pool is not None,
+                    self._transport)
+        if pending:
+            comm('replaying %d requests', len(pending))
+            self._socket.replay(pending)
+
+    def cancel_request(self, request_id):
+        """
+        Cancels a pending request: the backend skips the request if it has
+        not been processed yet and the ``on_receive`` callback won't be
+        called.
+
+        :param request_id: id of the request to cancel, as returned by
+            :meth:`send_request`.
+        """
+        if self._socket is not None:
+            self._socket.cancel(request_id)
+
+    def refresh_stats(self):
+        """
+        Fetches the statistics collected by the backend process,
+        :attr:`stats` emits its ``updated`` signal when they have been
+        received.
+        """
+        if self._socket is None or not self.running:
+            self.stats.updated.emit(self.stats.snapshot())
+        else:
+            self._socket.request_stats(self.stats._on_server_stats)
+
+    def _connect_socket(self):
+        """
+        Creates the connection to the backend (if needed), requests will be
+        sent as soon as the socket has connected.
+        """
+        if self._socket is not None:
+            return
+        if self._transport == 'local':
+            self._socket = JsonLocalClient(self.editor, self._port)
+        else:
+            self._socket = JsonTcpClient(self.editor, self._port)
+        self._socket.stats = self.stats.client
+
+    def _get_document_sync(self):
+        """
+        Returns the object that tracks the changes of the editor's document.
+        """
+        document = self.editor.document()
+        if self._document_sync is not None and \
+                self._document_sync.document != document:
+            self._document_sync.close()
+            self._document_sync = None
+        if self._document_sync is None:
+            self._document_sync = DocumentSync(document)
+        return self._document_sync
+
+    def _close_socket(self):
+        if self._document_sync is not None:
+            # the backend drops its copy of the document with the connection
+            self._document_sync.close()
+            self._document_sync = None
+        if self._socket is None:
+            return
         try:
-            socket.close()
-            self._sockets.remove(socket)
-            socket.deleteLater()
-        except ValueError:
+            self._socket.close()
+            self._socket.deleteLater()
+        except RuntimeError:
+            # already deleted by qt
             pass
+        self._socket = None
 
     @property
     def running(self):
@@ -225,9 +666,9 @@ class BackendManager(Manager):
         """
         Checks if the client socket is connected to the backend.
 
-        .. deprecated: Since v2.3, a socket is created per request. Checking
-            for global connection status does not make any sense anymore. This
-            property now returns ``running``. This will be removed in v2.5
+        .. deprecated: Since v2.3, this property returns ``running``, the
+            connection is (re-)established automatically when a request is
+            sent. This will be removed in v2.5
         """
         return self.running
 
@@ -235,10 +676,13 @@ class BackendManager(Manager):
     def exit_code(self):
         """
         Returns the backend process exit status or None if the
-        process is till running.
+        process is till running (or shared).
 
         """
-        if self.running:
+        if self.running or self._process is None:
             return None
-        else:
+        try:
             return self._process.exitCode()
+        except RuntimeError:
+            # shared process replaced (and deleted) by another editor
+            return None
@@ -6,7 +6,7 @@ import logging
 from pyqode.core.api import TextBlockUserData
 from pyqode.core.api.decoration import TextDecoration
 from pyqode.core.api.mode import Mode
-from pyqode.core.backend import NotRunning
+from pyqode.core.backend import NotRunning, PRIORITY_LOW
 from pyqode.core.api.utils import DelayJobRunner
 from pyqode.qt import QtCore, QtGui
 
@@ -335,7 +335,6 @@ class CheckerMode(Mode, QtCore.QObject):
         except KeyError:
             max_line_length = 79
         request_data = {
-            'code': self.editor.toPlainText(),
             'path': self.editor.file.path,
             'encoding': self.editor.file.encoding,
             'ignore_rules': self.ignore_rules,
@@ -343,8 +342,9 @@ class CheckerMode(Mode, QtCore.QObject):
         }
         try:
             self.editor.backend.send_request(
-                self._worker, request_data, on_receive=self._on_work_finished)
+                self._worker, request_data, on_receive=self._on_work_finished,
+                priority=PRIORITY_LOW, text_key='code')
             self._finished = False
         except NotRunning:
-            # retry later
-            QtCore.QTimer.singleShot(100, self._request)
+            # retry once the backend has been started
+            self.editor.backend.call_when_started(self._request)
@@ -241,6 +241,27 @@ class CodeCompletionMode(Mode, QtCore.QObject):
                     # this should never happen since we're working with clones
                     pass
 
+    @property
+    def max_results(self):
+        """
+        Maximum number of completions sent by the backend, the backend filters
+        and ranks the completions against the completion prefix and only sends
+        the best ones. 0 means no limit.
+        """
+        return self._max_results
+
+    @max_results.setter
+    def max_results(self, value):
+        self._max_results = value
+        if self.editor:
+            # propagate changes to every clone
+            for clone in self.editor.clones:
+                try:
+                    clone.modes.get(CodeCompletionMode).max_results = value
+                except KeyError:
+                    # this should never happen since we're working with clones
+                    pass
+
     @property
     def completion_prefix(self):
         """
@@ -276,6 +297,7 @@ class CodeCompletionMode(Mode, QtCore.QObject):
         self._trigger_len = 1
         self._trigger_symbols = ['.']
         self._case_sensitive = False
+        self._max_results = 100
         self._completer = None
         self._filter_mode = self.FILTER_PREFIX
         self._last_cursor_line = -1
@@ -283,6 +305,10 @@ class CodeCompletionMode(Mode, QtCore.QObject):
         self._tooltips = {}
         self._show_tooltips = False
         self._request_id = self._last_request_id = 0
+        # prefix of the last request and whether the backend cut off some of
+        # the completions matching it
+        self._last_prefix = ''
+        self._more_available = False
 
     def clone_settings(self, original):
         self.trigger_key = original.trigger_key
@@ -290,6 +316,7 @@ class CodeCompletionMode(Mode, QtCore.QObject):
         self.trigger_symbols = original.trigger_symbols
         self.show_tooltips = original.show_tooltips
         self.case_sensitive = original.case_sensitive
+        self.max_results = original.max_results
 
     #
     # Mode interface
@@ -437,7 +464,9 @@ class CodeCompletionMode(Mode, QtCore.QObject):
                         results, self.completion_prefix)
         context = results[0]
         results = results[1:]
-        line, column, request_id = context
+        line, column, request_id = context[:3]
+        # older backends do not tell if completions were cut off
+        self._more_available = len(context) > 3 and context[3]
         debug('request context: %r', context)
         debug('latest context: %r', (self._last_cursor_line,
                                                self._last_cursor_column,
@@ -471,6 +500,18 @@ class CodeCompletionMode(Mode, QtCore.QObject):
             len(self.completion_prefix)
         same_context = (line == self._last_cursor_line and
                         column == self._last_cursor_column)
+        prefix, last_prefix = self.completion_prefix, self._last_prefix
+        if not self._case_sensitive:
+            prefix, last_prefix = prefix.lower(), last_prefix.lower()
+        if same_context and not prefix.startswith(last_prefix):
+            # the backend filtered the completions with a longer prefix, the
+            # completions that only match the new prefix are missing
+            same_context = False
+        if same_context and self._more_available and \
+                prefix != last_prefix:
+            # the completions we have were cut off by the backend, some of
+            # the completions matching the new prefix might be missing
+            same_context = False
         if same_context:
             if self._request_id - 1 == self._last_request_id:
                 # context has not changed and the correct results can be
@@ -485,20 +526,22 @@ class CodeCompletionMode(Mode, QtCore.QObject):
         else:
             debug('requesting completion')
             data = {
-                'code': self.editor.toPlainText(),
                 'line': line,
                 'column': column,
                 'path': self.editor.file.path,
                 'encoding': self.editor.file.encoding,
                 'prefix': self.completion_prefix,                
-				'request_id': self._request_id,
+                'request_id': self._request_id,
                 'abs_pos' : self._helper.cursor_absolute_poition(),
-                'mime_type' : self.editor.current_mime_type
+                'mime_type' : self.editor.current_mime_type,
+                'case_sensitive': self._case_sensitive,
+                'max_results': self._max_results
             }
             try:
                 self.editor.backend.send_request(
                     backend.CodeCompletionWorker, args=data,
-                    on_receive=self._on_results_available)
+                    on_receive=self._on_results_available,
+                    coalesce_key='code_completion', text_key='code')
             except NotRunning:
                 _logger().exception('failed to send the completion request')
                 return False
@@ -506,6 +549,7 @@ class CodeCompletionMode(Mode, QtCore.QObject):
                 debug('request sent: %r', data)
                 self._last_cursor_column = column
                 self._last_cursor_line = line
+                self._last_prefix = data['prefix']
                 self._request_id += 1
                 return True
 
@@ -130,25 +130,30 @@ class OccurrencesHighlighterMode(Mode):
             select_whole_word=True).selectedText()
         if not cursor.hasSelection() or cursor.selectedText() == self._sub:
             request_data = {
-                'string': self.editor.toPlainText(),
                 'sub': self._sub,
                 'regex': False,
                 'whole_word': True,
-                'case_sensitive': True
+                'case_sensitive': True,
+                'compact': True,
+                # limit number of results (on very big file where a lots of
+                # occurrences can be found, this would totally freeze the
+                # editor during a few seconds, with a limit of 500 we can make
+                # sure the editor will always remain responsive). The
+                # occurrences closest to the cursor are found first.
+                'position': cursor.position(),
+                'limit': 500
             }
             try:
-                self.editor.backend.send_request(findall, request_data,
-                                                 self._on_results_available)
+                self.editor.backend.send_request(
+                    findall, request_data, self._on_results_available,
+                    coalesce_key='occurrences', text_key='string')
             except NotRunning:
-                self._request_highlight()
+                self.editor.backend.call_when_started(self._send_request)
 
     def _on_results_available(self, results):
-        if len(results) > 500:
-            # limit number of results (on very big file where a lots of
-            # occurrences can be found, this would totally freeze the editor
-            # during a few seconds, with a limit of 500 we can make sure
-            # the editor will always remain responsive).
-            results = results[:500]
+        # compact results: start, length, start, length,...
+        results = [(start, start + length) for start, length in
+                   zip(results[0::2], results[1::2])]
         current = self.editor.textCursor().position()
         if len(results) > 1:
             for start, end in results:
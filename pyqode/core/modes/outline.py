@@ -1,7 +1,7 @@
 import logging
 from pyqode.core.api import Mode
 from pyqode.core.api import DelayJobRunner
-from pyqode.core.backend import NotRunning
+from pyqode.core.backend import NotRunning, PRIORITY_LOW
 from pyqode.core.share import Definition
 from pyqode.qt import QtCore
 
@@ -61,16 +61,17 @@ class OutlineMode(Mode, QtCore.QObject):
             return
         if self.enabled:
             request_data = {
-                'code': self.editor.toPlainText(),
                 'path': self.editor.file.path,
                 'encoding': self.editor.file.encoding
             }
             try:
                 self.editor.backend.send_request(
                     self._worker, request_data,
-                    on_receive=self._on_results_available)
+                    on_receive=self._on_results_available,
+                    priority=PRIORITY_LOW, coalesce_key='outline',
+                    text_key='code')
             except NotRunning:
-                QtCore.QTimer.singleShot(100, self._run_analysis)
+                self.editor.backend.call_when_started(self._run_analysis)
         else:
             self._results = []
             self.document_changed.emit()
@@ -5,25 +5,37 @@ on pygments.
 
 .. note: This code is taken and adapted from the IPython project.
 """
+import collections
+import fnmatch
+import importlib
+import json
 import logging
 import mimetypes
+import os
+import re
 import sys
+import threading
 
+import pygments
 from pygments.formatters.html import HtmlFormatter
 from pygments.lexer import Error, RegexLexer, Text, _TokenType
-from pygments.lexers import get_lexer_for_filename, get_lexer_for_mimetype
+from pygments.lexers import (
+    LEXERS, get_lexer_for_filename, get_lexer_for_mimetype)
 from pygments.lexers.agile import PythonLexer
 from pygments.lexers.compiled import CLexer, CppLexer
 from pygments.lexers.dotnet import CSharpLexer
 from pygments.lexers.special import TextLexer
 from pygments.styles import get_style_by_name, get_all_styles
 from pygments.token import Whitespace, Comment, Token
+from pygments.plugin import (
+    LEXER_ENTRY_POINT, find_plugin_lexers, iter_entry_points)
 from pygments.util import ClassNotFound
 from pyqode.qt import QtGui
-from pyqode.qt.QtCore import QRegExp
 
 from pyqode.core.api.syntax_highlighter import (
-    SyntaxHighlighter, ColorScheme, TextBlockUserData)
+    SyntaxHighlighter, ColorScheme)
+from pyqode.core.api.utils import TextBlockHelper
+from pyqode.core.backend.index import default_cache_dir
 
 
 def _logger():
@@ -127,6 +139,231 @@ CppLexer.tokens['comment'] = COMMENT_STATE
 CSharpLexer.tokens['comment'] = COMMENT_STATE
 
 
+# Resolving a lexer with pygments means matching the file name against the
+# patterns of all the lexers (and importing the plugins), on every file. The
+# lexers are resolved once per pygments version and set of lexer plugins
+# instead, in a background thread, and the resulting index is stored in the
+# user cache directory. Pygments is used until the index is available.
+_GLOB_CHARS = re.compile(r'[*?[]')
+# version of the index format, the index is built again if it changes
+_LEXER_INDEX_VERSION = 2
+_lexer_index = None
+_index_thread = None
+# shared lexer instances, by lexer class
+_lexers = {}
+
+
+def _suffixes(filename):
+    """
+    Yields the extensions of a file name, the longest first.
+    """
+    index = filename.find('.')
+    while index != -1:
+        yield filename[index:]
+        index = filename.find('.', index + 1)
+
+
+def _lexer_patterns():
+    """
+    Yields the module, the class name, the file name patterns and the mime
+    types of the pygments lexers (including the plugin lexers).
+    """
+    for class_name, info in LEXERS.items():
+        yield info[0], class_name, info[3], info[4]
+    for lexer_class in find_plugin_lexers():
+        yield (lexer_class.__module__, lexer_class.__name__,
+               lexer_class.filenames, lexer_class.mimetypes)
+
+
+def _build_lexer_index():
+    """
+    Builds the index of the lexers by file name, extension (simple "*.ext"
+    patterns), file name pattern (all the other patterns) and mime type.
+
+    All the lexers that match a file name or an extension are stored, the
+    lexer is chosen when a file name is resolved (see
+    :func:`get_lexer_class_for_filename`).
+    """
+    names, extensions, patterns, mimes = {}, {}, [], {}
+    for module, class_name, filenames, mimetypes_ in _lexer_patterns():
+        entry = (module, class_name)
+        for pattern in filenames:
+            if not _GLOB_CHARS.search(pattern):
+                names.setdefault(pattern, []).append(entry)
+            elif pattern.startswith('*.') and \
+                    not _GLOB_CHARS.search(pattern[1:]):
+                extensions.setdefault(pattern[1:], []).append(entry)
+            else:
+                patterns.append((pattern, module, class_name))
+        for mime in mimetypes_:
+            mimes.setdefault(mime, entry)
+    return {
+        'names': names,
+        'extensions': extensions,
+        'patterns': patterns,
+        'mimetypes': mimes
+    }
+
+
+def _lexer_index_key():
+    """
+    Returns the key of the lexer index: the pygments version and the entry
+    points of the lexer plugins. The index is built again if it changes.
+    """
+    plugins = sorted(str(entry_point) for entry_point in
+                     iter_entry_points(LEXER_ENTRY_POINT))
+    return [_LEXER_INDEX_VERSION, pygments.__version__, plugins]
+
+
+def _lexer_index_path():
+    """
+    Returns the path of the lexer index file.
+    """
+    return os.path.join(os.path.dirname(default_cache_dir()), 'lexers.json')
+
+
+def _load_lexer_index():
+    """
+    Loads the lexer index from the cache file, the index is built (and
+    saved) if there is no file or if its key changed. Runs in a background
+    thread.
+    """
+    global _lexer_index
+    path = _lexer_index_path()
+    try:
+        key = _lexer_index_key()
+        try:
+            with open(path) as f:
+                index = json.load(f)
+        except (IOError, OSError, ValueError):
+            index = None
+        if not isinstance(index, dict) or index.get('key') != key:
+            _logger().debug('building the lexer index')
+            index = _build_lexer_index()
+            index['key'] = key
+            _save_lexer_index(path, index)
+        _lexer_index = index
+    except Exception:
+        _logger().exception('failed to build the lexer index')
+
+
+def _save_lexer_index(path, index):
+    try:
+        directory = os.path.dirname(path)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        tmp = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(index, f)
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(tmp, path)
+    except (IOError, OSError):
+        _logger().exception('failed to save the lexer index %s', path)
+
+
+def _get_lexer_index():
+    """
+    Gets the lexer index, None while it is being loaded (or built) in the
+    background.
+    """
+    global _index_thread
+    if _lexer_index is None and _index_thread is None:
+        _index_thread = threading.Thread(target=_load_lexer_index)
+        _index_thread.daemon = True
+        _index_thread.start()
+    return _lexer_index
+
+
+def _load_lexer_class(entry):
+    """
+    Imports the lexer class of an index entry.
+
+    :raises: ImportError if the lexer cannot be imported.
+    """
+    module, class_name = entry
+    try:
+        return getattr(importlib.import_module(module), class_name)
+    except AttributeError:
+        raise ImportError('cannot import %s.%s' % (module, class_name))
+
+
+def get_lexer_class_for_filename(filename):
+    """
+    Gets the pygments lexer class for a file name, using the lexer index (or
+    pygments while the index is being built).
+
+    :param filename: file name (or path)
+    :raises: ClassNotFound if no lexer matches the file name, ImportError if
+        the lexer cannot be imported.
+    """
+    index = _get_lexer_index()
+    if index is None:
+        return get_lexer_for_filename(filename).__class__
+    filename = os.path.basename(filename)
+    # candidate entries and their bonus, explicit patterns (without '*')
+    # get a bonus, like in pygments
+    candidates = {}
+
+    def add(entry, bonus):
+        entry = tuple(entry)
+        candidates[entry] = max(bonus, candidates.get(entry, bonus))
+
+    for entry in index['names'].get(filename, ()):
+        add(entry, 0.5)
+    for suffix in _suffixes(filename):
+        for entry in index['extensions'].get(suffix, ()):
+            add(entry, 0)
+    for pattern, module, class_name in index['patterns']:
+        if fnmatch.fnmatchcase(filename, pattern):
+            add((module, class_name), 0 if '*' in pattern else 0.5)
+    if not candidates:
+        raise ClassNotFound('no lexer for filename %r found' % filename)
+    if len(candidates) == 1:
+        return _load_lexer_class(next(iter(candidates)))
+
+    def rating(item):
+        # same rating as pygments.lexers.find_lexer_class_for_filename
+        lexer_class, bonus = item
+        return lexer_class.priority + bonus, lexer_class.__name__
+
+    return max(((_load_lexer_class(entry), bonus)
+                for entry, bonus in candidates.items()), key=rating)[0]
+
+
+def get_lexer_class_for_mimetype(mime):
+    """
+    Gets the pygments lexer class for a mime type, using the lexer index (or
+    pygments while the index is being built).
+
+    :param mime: mime type
+    :raises: ClassNotFound if no lexer matches the mime type, ImportError if
+        the lexer cannot be imported.
+    """
+    index = _get_lexer_index()
+    if index is None:
+        return get_lexer_for_mimetype(mime).__class__
+    try:
+        entry = index['mimetypes'][mime]
+    except KeyError:
+        raise ClassNotFound('no lexer for mimetype %r found' % mime)
+    return _load_lexer_class(entry)
+
+
+def get_shared_lexer(lexer_class):
+    """
+    Gets the lexer instance shared by all the highlighters that use a lexer
+    class (created the first time the lexer class is used).
+
+    :param lexer_class: pygments lexer class
+    """
+    try:
+        return _lexers[lexer_class]
+    except KeyError:
+        lexer = _lexers[lexer_class] = lexer_class()
+        return lexer
+
+
 class PygmentsSH(SyntaxHighlighter):
     """ Highlights code using the pygments parser.
 
@@ -137,13 +374,34 @@ class PygmentsSH(SyntaxHighlighter):
     namespace packages to see what other languages are available (at the time
     of writing, only python has specialised support).
 
-    .. warning:: There are some issues with multi-line comments, they are not
-                 properly highlighted until a full re-highlight is triggered.
-                 The text is automatically re-highlighted on save.
+    The lexer state at the end of each block (the pygments state stack) is
+    interned to a small integer id that is stored in the block user state
+    (see :class:`pyqode.core.api.TextBlockHelper`). When a block is
+    modified, QSyntaxHighlighter highlights the next blocks as long as their
+    state changes: the highlighting of a multi-line construct (comments,
+    strings,...) is updated and stops as soon as the state of a block is
+    unchanged.
     """
     #: Mode description
     DESCRIPTION = "Apply syntax highlighting to the editor using pygments"
 
+    #: Maximum number of interned state ids (the state is stored in the 16
+    #: lower bits of the block user state, the last value is reserved for
+    #: the blocks that are not highlighted yet).
+    MAX_STATES = SyntaxHighlighter.NOT_HIGHLIGHTED
+
+    #: Maximum number of lines whose tokens are cached, 0 disables the
+    #: cache.
+    max_cached_lines = 10000
+
+    # (lexer key, state stack) <-> state id, shared by all the instances
+    # since cloned editors highlight the same document (see _lexer_key).
+    _state_ids = {}
+    _states = []
+    # LRU cache of the lexed lines: (lexer key, state id of the previous
+    # block, text) -> (token runs, state id)
+    _runs = collections.OrderedDict()
+
     @property
     def pygments_style(self):
         """
@@ -163,12 +421,13 @@ class PygmentsSH(SyntaxHighlighter):
         self._pygments_style = self.color_scheme.name
         self._style = None
         self._formatter = HtmlFormatter(nowrap=True)
-        self._lexer = lexer if lexer else PythonLexer()
+        self._lexer = lexer if lexer else get_shared_lexer(PythonLexer)
+        #: the current lexer and its key (see _lexer_key)
+        self._key = (None, None)
 
         self._brushes = {}
         self._formats = {}
         self._init_style()
-        self._prev_block = None
 
     def _init_style(self):
         """ Init pygments style """
@@ -192,14 +451,14 @@ class PygmentsSH(SyntaxHighlighter):
             self.set_lexer_from_mime_type(mime_type)
         except ClassNotFound:
             _logger().exception('failed to get lexer from mimetype')
-            self._lexer = TextLexer()
+            self._lexer = get_shared_lexer(TextLexer)
             return False
         except ImportError:
             # import error while loading some pygments plugins, the editor
             # should not crash
             _logger().warning('failed to get lexer from mimetype (%s)' %
                               mime_type)
-            self._lexer = TextLexer()
+            self._lexer = get_shared_lexer(TextLexer)
             return False
         else:
             return True
@@ -211,32 +470,40 @@ class PygmentsSH(SyntaxHighlighter):
 
         :param filename: Filename or extension
         """
-        self._lexer = None
         if filename.endswith("~"):
             filename = filename[0:len(filename) - 1]
         try:
-            self._lexer = get_lexer_for_filename(filename)
+            lexer_class = get_lexer_class_for_filename(filename)
         except (ClassNotFound, ImportError):
-            print('class not found for url', filename)
+            _logger().debug('no lexer found for filename: %s, trying with '
+                            'the mime type', filename)
             try:
-                m = mimetypes.guess_type(filename)
-                print(m)
-                self._lexer = get_lexer_for_mimetype(m[0])
-            except (ClassNotFound, IndexError, ImportError):
-                self._lexer = get_lexer_for_mimetype('text/plain')
-        if self._lexer is None:
-            _logger().warning('failed to get lexer from filename: %s, using '
-                              'plain text instead...', filename)
-            self._lexer = TextLexer()
+                lexer_class = get_lexer_class_for_mimetype(
+                    mimetypes.guess_type(filename)[0])
+            except (ClassNotFound, ImportError):
+                _logger().debug('failed to get lexer from filename: %s, '
+                                'using plain text instead...', filename)
+                lexer_class = TextLexer
+        self._lexer = get_shared_lexer(lexer_class)
 
     def set_lexer_from_mime_type(self, mime, **options):
         """
         Sets the pygments lexer from mime type.
 
         :param mime: mime type
-        :param options: optional addtional options.
+        :param options: optional addtional options, the lexer instance is
+            shared with the other highlighters if there are no options.
         """
-        self._lexer = get_lexer_for_mimetype(mime, **options)
+        if options:
+            self._lexer = get_lexer_for_mimetype(mime, **options)
+        else:
+            try:
+                lexer_class = get_lexer_class_for_mimetype(mime)
+            except ImportError:
+                # let pygments try with the other lexers
+                self._lexer = get_lexer_for_mimetype(mime)
+            else:
+                self._lexer = get_shared_lexer(lexer_class)
         _logger().debug('lexer for mimetype (%s): %r', mime, self._lexer)
 
     def highlight_block(self, text, block):
@@ -249,48 +516,130 @@ class PygmentsSH(SyntaxHighlighter):
         if self.color_scheme.name != self._pygments_style:
             self._pygments_style = self.color_scheme.name
             self._update_style()
-        original_text = text
         if self.editor and self._lexer and self.enabled:
-            if block.blockNumber():
-                prev_data = self._prev_block.userData()
-                if prev_data:
-                    if hasattr(prev_data, "syntax_stack"):
-                        self._lexer._saved_state_stack = prev_data.syntax_stack
-                    elif hasattr(self._lexer, '_saved_state_stack'):
-                        del self._lexer._saved_state_stack
-
-            # Lex the text using Pygments
-            index = 0
-            usd = block.userData()
-            if usd is None:
-                usd = TextBlockUserData()
-                block.setUserData(usd)
-            tokens = list(self._lexer.get_tokens(text))
-            for token, text in tokens:
-                length = len(text)
-                fmt = self._get_format(token)
-                if token in [Token.Literal.String, Token.Literal.String.Doc,
-                             Token.Comment]:
-                    fmt.setObjectType(fmt.UserObject)
-                self.setFormat(index, length, fmt)
-                index += length
-
-            if hasattr(self._lexer, '_saved_state_stack'):
-                setattr(usd, "syntax_stack", self._lexer._saved_state_stack)
-                # Clean up for the next go-round.
-                del self._lexer._saved_state_stack
-
-            # spaces
-            text = original_text
-            expression = QRegExp(r'\s+')
-            index = expression.indexIn(text, 0)
-            while index >= 0:
-                index = expression.pos(0)
-                length = len(expression.cap(0))
-                self.setFormat(index, length, self._get_format(Whitespace))
-                index = expression.indexIn(text, index + length)
-
-            self._prev_block = block
+            # blocks are not always highlighted in order (see
+            # SyntaxHighlighter.highlight_budget), the lexer starts from the
+            # state of the previous block
+            previous_state = TextBlockHelper.get_state(block.previous())
+            key = (self._lexer_key(), previous_state, text)
+            try:
+                runs, state = self._runs.pop(key)
+            except KeyError:
+                runs, state = self._lex(text, previous_state)
+            if self.max_cached_lines:
+                self._runs[key] = runs, state
+                while len(self._runs) > self.max_cached_lines:
+                    self._runs.popitem(last=False)
+            for index, length, token in runs:
+                self.setFormat(index, length, self._get_format(token))
+            # the state of the next block is updated (and highlighted) only
+            # if the state of this block changed
+            TextBlockHelper.set_state(block, state)
+
+    def _highlight_whitespaces(self, text):
+        """
+        Nothing to do, the whitespaces are part of the token runs (see
+        :meth:`_lex`).
+        """
+        pass
+
+    def _lex(self, text, previous_state):
+        """
+        Lexes a line of text using pygments.
+
+        :param text: text to lex
+        :param previous_state: state id of the previous block
+        :return: the token runs (a tuple of (start, length, token type),
+            consecutive tokens of the same type are merged) and the state id
+            at the end of the line. The whitespace runs are split from the
+            tokens, with the Whitespace token type.
+        """
+        self._lexer._saved_state_stack = self._state_stack(previous_state)
+        runs = []
+
+        def append(start, end, token):
+            if runs and runs[-1][2] is token:
+                runs[-1][1] = end - runs[-1][0]
+            else:
+                runs.append([start, end - start, token])
+
+        index = 0
+        end_of_line = len(text)
+        for token, value in self._lexer.get_tokens(text):
+            if index >= end_of_line:
+                # pygments appends a newline to the text (the tokens must
+                # all be consumed to get the final state stack)
+                continue
+            offset = 0
+            for match in self.WHITESPACES.finditer(value):
+                start, end = match.span()
+                if start > offset:
+                    append(index + offset, index + start, token)
+                append(index + start, index + end, Whitespace)
+                offset = end
+            if offset < len(value):
+                append(index + offset, index + len(value), token)
+            index += len(value)
+        state = self._state_id(self._lexer._saved_state_stack)
+        # Clean up for the next go-round.
+        del self._lexer._saved_state_stack
+        return tuple(tuple(run) for run in runs), state
+
+    def _state_id(self, stack):
+        """
+        Returns the id of a lexer state stack, interning the stack if needed.
+
+        :param stack: pygments state stack
+        """
+        key = (self._lexer_key(), tuple(stack))
+        try:
+            return self._state_ids[key]
+        except KeyError:
+            if len(self._states) >= self.MAX_STATES:
+                # pathological case, the blocks that still use the old ids
+                # will be fixed the next time they are highlighted
+                _logger().debug('too many lexer states, resetting ids')
+                self._state_ids.clear()
+                del self._states[:]
+                self._runs.clear()
+            state = len(self._states)
+            self._state_ids[key] = state
+            self._states.append(key)
+            return state
+
+    def _state_stack(self, state):
+        """
+        Returns the lexer state stack of a state id. The root state is
+        returned for unknown ids (first block, block not highlighted yet or
+        deferred, see :attr:`SyntaxHighlighter.NOT_HIGHLIGHTED`, block
+        highlighted with another lexer).
+
+        :param state: state id (see :meth:`_state_id`)
+        """
+        if 0 <= state < len(self._states):
+            lexer_key, stack = self._states[state]
+            if lexer_key == self._lexer_key():
+                return stack
+        return ('root',)
+
+    def _lexer_key(self):
+        """
+        Returns the key of the current lexer in the state ids and in the
+        token cache: the lexer class and its options (two lexers of the same
+        class do not produce the same tokens if their options differ).
+        """
+        lexer = self._lexer
+        if self._key[0] is not lexer:
+            options = getattr(lexer, 'options', {})
+            try:
+                key = (lexer.__class__, frozenset(options.items()))
+                hash(key)
+            except TypeError:
+                # unhashable option values, states are not shared with the
+                # other instances
+                key = (lexer.__class__, lexer)
+            self._key = (lexer, key)
+        return self._key[1]
 
     def _update_style(self):
         """ Sets the style to the specified Pygments style.
@@ -327,6 +676,9 @@ class PygmentsSH(SyntaxHighlighter):
             return self._formats[token]
 
         result = self._get_format_from_style(token, self._style)
+        if token in [Token.Literal.String, Token.Literal.String.Doc,
+                     Token.Comment]:
+            result.setObjectType(result.UserObject)
 
         self._formats[token] = result
         return result
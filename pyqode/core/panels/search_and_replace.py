@@ -2,6 +2,7 @@
 """
 This module contains the search and replace panel
 """
+import bisect
 import re
 import sre_constants
 
@@ -90,6 +91,17 @@ class SearchAndReplacePanel(Panel, Ui_SearchPanel):
     #:    the extra selection used to highlight search result can be slow.
     MAX_HIGHLIGHTED_OCCURENCES = 500
 
+    #: Number of occurrences sent by the backend at once, the occurrences
+    #: closest to the cursor are sent first and the matches counter is updated
+    #: as the occurrences come in.
+    CHUNK_SIZE = 1000
+
+    #: Maximum number of occurrences searched: the search stops once this
+    #: number of occurrences (the closest to the cursor) has been found and
+    #: the counter shows e.g. "1000+ matches". Replace all still replaces all
+    #: the occurrences.
+    MAX_OCCURRENCES = 1000
+
     @property
     def background(self):
         """ Text decoration background """
@@ -138,6 +150,12 @@ class SearchAndReplacePanel(Panel, Ui_SearchPanel):
         self._separator = None
         self._decorations = []
         self._occurrences = []
+        # True if the search stopped at MAX_OCCURRENCES
+        self._truncated = False
+        # True if the current search is limited to MAX_OCCURRENCES
+        self._limited = False
+        # True until the first chunk of results of a new search is received
+        self._new_search = False
         self._current_occurrence_index = 0
         self._bg = None
         self._fg = None
@@ -493,6 +511,9 @@ class SearchAndReplacePanel(Panel, Ui_SearchPanel):
         :param text: The replacement text. If None, the content of the lineEdit
                      replace will be used instead
         """
+        if self._truncated:
+            # only the first occurrences have been searched
+            self._search_all()
         cursor = self.editor.textCursor()
         cursor.beginEditBlock()
         remains = self.replace(text=text)
@@ -531,40 +552,107 @@ class SearchAndReplacePanel(Panel, Ui_SearchPanel):
                 self.checkBoxWholeWords.isChecked(),
                 self.checkBoxInSelection.isChecked())
 
-    def _exec_search(self, sub, flags):
-        if self.editor is None:
-            return
+    def _request_data(self, sub, flags):
+        """
+        Returns the data of a search request and the key of the editor text
+        in the data (None if the search is made in the selection).
+        """
         regex, case_sensitive, whole_word, in_selection = flags
         tc = self.editor.textCursor()
         assert isinstance(tc, QtGui.QTextCursor)
-        if in_selection and tc.hasSelection():
-            text = tc.selectedText()
-            self._offset = tc.selectionStart()
-        else:
-            text = self.editor.toPlainText()
-            self._offset = 0
         request_data = {
-            'string': text,
             'sub': sub,
             'regex': regex,
             'whole_word': whole_word,
-            'case_sensitive': case_sensitive
+            'case_sensitive': case_sensitive,
+            'compact': True,
+            'chunk_size': self.CHUNK_SIZE,
+            # one more to know if there are more occurrences
+            'limit': self.MAX_OCCURRENCES + 1
         }
+        if in_selection and tc.hasSelection():
+            request_data['string'] = tc.selectedText()
+            self._offset = tc.selectionStart()
+            text_key = None
+        else:
+            # the backend already knows the editor text
+            self._offset = 0
+            text_key = 'string'
+            request_data['position'] = tc.position()
+        return request_data, text_key
+
+    def _search_all(self):
+        """
+        Searches all the occurrences, without limit (synchronously).
+        """
+        request_data, text_key = self._request_data(
+            self.lineEditSearch.text(), self._search_flags())
+        del request_data['limit']
+        del request_data['chunk_size']
+        if text_key:
+            request_data[text_key] = self.editor.toPlainText()
+        self._new_search = True
+        self._limited = False
+        self._on_results_available(
+            {'matches': findall(request_data), 'done': True})
+
+    def _exec_search(self, sub, flags):
+        if self.editor is None:
+            return
+        request_data, text_key = self._request_data(sub, flags)
+        self._new_search = True
+        self._limited = True
         try:
-            self.editor.backend.send_request(findall, request_data,
-                                             self._on_results_available)
+            self.editor.backend.send_request(
+                findall, request_data, self._on_results_available,
+                coalesce_key='search', text_key=text_key)
         except AttributeError:
-            self._on_results_available(findall(request_data))
+            request_data['string'] = self.editor.toPlainText()
+            for chunk in findall(request_data):
+                self._on_results_available(chunk)
         except NotRunning:
-            QtCore.QTimer.singleShot(100, self.request_search)
+            self.editor.backend.call_when_started(self.request_search)
 
     def _on_results_available(self, results):
-        self._occurrences = [(start + self._offset, end + self._offset)
-                             for start, end in results]
-        self._on_search_finished()
+        if self._new_search:
+            self._new_search = False
+            self._clear_occurrences()
+            self._clear_decorations()
+        # compact results: start, length, start, length,...
+        offset = self._offset
+        matches = results['matches']
+        occurrences = [(start + offset, start + length + offset)
+                       for start, length in zip(matches[0::2], matches[1::2])]
+        self._occurrences += occurrences
+        if results['done']:
+            # the occurrences closest to the cursor came first, the farthest
+            # one only tells that the search stopped at the limit
+            self._truncated = bool(self._limited and len(
+                self._occurrences) > self.MAX_OCCURRENCES)
+            if self._truncated:
+                del self._occurrences[self.MAX_OCCURRENCES:]
+            self._occurrences.sort()
+            self._on_search_finished()
+        else:
+            # show the progress: the first occurrences are highlighted and
+            # the counter is updated
+            for start, end in occurrences:
+                if len(self._decorations) >= self.MAX_HIGHLIGHTED_OCCURENCES:
+                    break
+                deco = self._create_decoration(start, end)
+                self._decorations.append(deco)
+                self.editor.decorations.append(deco)
+            self.cpt_occurences = min(len(self._occurrences),
+                                      self.MAX_OCCURRENCES)
+            self._update_label_matches()
 
     def _update_label_matches(self):
-        self.labelMatches.setText(_("{0} matches").format(self.cpt_occurences))
+        if self._truncated:
+            self.labelMatches.setText(_("{0}+ matches").format(
+                self.cpt_occurences))
+        else:
+            self.labelMatches.setText(_("{0} matches").format(
+                self.cpt_occurences))
         color = "#DD0000"
         if self.cpt_occurences:
             color = "#00DD00"
@@ -575,7 +663,14 @@ class SearchAndReplacePanel(Panel, Ui_SearchPanel):
     def _on_search_finished(self):
         self._clear_decorations()
         all_occurences = self.get_occurences()
-        occurrences = all_occurences[:self.MAX_HIGHLIGHTED_OCCURENCES]
+        # highlight the occurrences around the cursor
+        start = bisect.bisect_left(
+            all_occurences, (self.editor.textCursor().position(), ))
+        start = max(0, min(start - self.MAX_HIGHLIGHTED_OCCURENCES // 2,
+                           len(all_occurences) -
+                           self.MAX_HIGHLIGHTED_OCCURENCES))
+        occurrences = all_occurences[
+            start:start + self.MAX_HIGHLIGHTED_OCCURENCES]
         for i, occurrence in enumerate(occurrences):
             deco = self._create_decoration(occurrence[0],
                                            occurrence[1])
@@ -595,6 +690,7 @@ class SearchAndReplacePanel(Panel, Ui_SearchPanel):
 
     def _clear_occurrences(self):
         self._occurrences[:] = []
+        self._truncated = False
 
     def _create_decoration(self, selection_start, selection_end):
         """ Creates the text occurences decoration """
@@ -13,6 +13,7 @@ pyqode applications:
       any other object that have the same interface).
     - ErrorsTable: a QTableWidget specialised to show CheckerMessage.
     - OutlineTreeWidget: a widget that show the outline of an editor.
+    - FindInFilesWidget: searches the files of a directory tree.
 
 
 """
@@ -34,6 +35,7 @@ from pyqode.core.widgets.splittable_tab_widget import (
 from pyqode.core.widgets.filesystem_treeview import FileSystemTreeView
 from pyqode.core.widgets.filesystem_treeview import FileSystemContextMenu
 from pyqode.core.widgets.filesystem_treeview import FileSystemHelper
+from pyqode.core.widgets.find_in_files import FindInFilesWidget
 
 __all__ = [
     'ErrorsTable',
@@ -42,6 +44,7 @@ __all__ = [
     'InteractiveConsole',
     'FileIconProvider',
     'FileSystemHelper',
+    'FindInFilesWidget',
     'MenuRecentFiles',
     'RecentFilesManager',
     'TabWidget',
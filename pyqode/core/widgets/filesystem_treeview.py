@@ -11,6 +11,7 @@ import shutil
 import subprocess
 from pyqode.qt import QtCore, QtGui, QtWidgets
 from pyqode.core import icons
+from pyqode.core.backend.search import IGNORED_PATTERNS
 
 
 def _logger():
@@ -45,8 +46,7 @@ class FileSystemTreeView(QtWidgets.QTreeView):
         def __init__(self):
             super(FileSystemTreeView.FilterProxyModel, self).__init__()
             #: The list of file extension to exclude
-            self.ignored_patterns = [
-                '*.pyc', '*.pyo', '*.coverage', '.DS_Store', '__pycache__']
+            self.ignored_patterns = list(IGNORED_PATTERNS)
             self._ignored_unused = []
 
         def set_root_path(self, path):
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the find in files widget.
+"""
+import os
+
+from pyqode.qt import QtCore, QtWidgets
+
+from pyqode.core.api.utils import TextHelper
+from pyqode.core.backend import NotRunning
+from pyqode.core.backend.search import IGNORED_PATTERNS
+from pyqode.core.backend.workers import find_in_files
+from pyqode.core.managers import BackendManager
+from pyqode.core.widgets.prompt_line_edit import PromptLineEdit
+
+
+class FindInFilesWidget(QtWidgets.QWidget):
+    """
+    Searches the files of a directory tree and shows the results in a tree
+    (one item per file, one child item per match).
+
+    The search is performed by the backend (see
+    :func:`pyqode.core.backend.workers.find_in_files`), which must be started
+    before searching. The widget has its own backend process, searches are
+    run in the background threads of the backend pool and do not delay the
+    other requests::
+
+        widget = FindInFilesWidget(tab_widget)
+        widget.backend.start(server.__file__)
+        widget.root_path = '/path/to/project'
+
+    The results are shown as soon as they are found. Activating a result opens
+    the file using :meth:`SplittableCodeEditTabWidget.open_document` (if a
+    tab widget has been set) and selects the match.
+    """
+    #: Signal emitted when a match is activated. Parameters:
+    #:  - path (str): path of the file
+    #:  - line (int): line of the match (0 based)
+    #:  - column (int): column of the match (0 based)
+    #:  - length (int): length of the match
+    match_activated = QtCore.Signal(str, int, int, int)
+
+    #: Signal emitted when a search finished
+    search_finished = QtCore.Signal()
+
+    #: Maximum number of matches, the search stops when the limit has been
+    #: reached.
+    MAX_MATCHES = 10000
+
+    def __init__(self, tab_widget=None, parent=None):
+        """
+        :param tab_widget: optional SplittableCodeEditTabWidget used to open
+            the files.
+        :param parent: parent widget
+        """
+        super(FindInFilesWidget, self).__init__(parent)
+        #: Tab widget used to open the files that contain a match
+        self.tab_widget = tab_widget
+        #: Root directory of the search
+        self.root_path = ''
+        #: Files and directories that are not searched (see
+        #: :attr:`pyqode.core.widgets.FileSystemTreeView.FilterProxyModel`)
+        self.ignored_patterns = list(IGNORED_PATTERNS)
+        #: True to only search the files selected by the trigram index of the
+        #: root path (see :class:`pyqode.core.backend.index.TrigramIndex`).
+        #: The index is persisted by the backend, it makes the searches of
+        #: big projects faster once it has been built.
+        self.use_index = False
+        #: Backend used to search the files
+        self.backend = BackendManager(self)
+        self._request_id = None
+        self._nb_matches = 0
+        self._nb_files = 0
+        self._searched = 0
+        self._setup_ui()
+
+    def _setup_ui(self):
+        self.lineEditSearch = PromptLineEdit(
+            self, prompt_text=_(' Search in files'))
+        self.lineEditSearch.returnPressed.connect(self.search)
+        self.lineEditInclude = PromptLineEdit(
+            self, prompt_text=_(' File patterns, e.g. *.py *.txt'))
+        self.lineEditInclude.returnPressed.connect(self.search)
+        self.checkBoxRegex = QtWidgets.QCheckBox(_('Regex'), self)
+        self.checkBoxCase = QtWidgets.QCheckBox(_('Match case'), self)
+        self.checkBoxWholeWords = QtWidgets.QCheckBox(_('Whole words'), self)
+        self.checkBoxRegex.stateChanged.connect(
+            self.checkBoxWholeWords.setDisabled)
+        self.buttonSearch = QtWidgets.QPushButton(_('Search'), self)
+        self.buttonSearch.clicked.connect(self.search)
+        self.buttonStop = QtWidgets.QPushButton(_('Stop'), self)
+        self.buttonStop.clicked.connect(self.stop)
+        self.buttonStop.setEnabled(False)
+        self.labelMatches = QtWidgets.QLabel(self)
+        self.treeResults = QtWidgets.QTreeWidget(self)
+        self.treeResults.setHeaderHidden(True)
+        self.treeResults.itemActivated.connect(self._on_item_activated)
+
+        options = QtWidgets.QHBoxLayout()
+        options.addWidget(self.checkBoxRegex)
+        options.addWidget(self.checkBoxCase)
+        options.addWidget(self.checkBoxWholeWords)
+        options.addStretch()
+        options.addWidget(self.buttonSearch)
+        options.addWidget(self.buttonStop)
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.lineEditSearch)
+        layout.addWidget(self.lineEditInclude)
+        layout.addLayout(options)
+        layout.addWidget(self.labelMatches)
+        layout.addWidget(self.treeResults)
+
+    def search(self, text=None):
+        """
+        Searches the files of :attr:`root_path`.
+
+        :param text: text to search. If None, the content of lineEditSearch
+            is used.
+        """
+        if text is None or isinstance(text, bool):
+            text = self.lineEditSearch.text()
+        self.stop()
+        self.clear()
+        if not text or not self.root_path:
+            return
+        request_data = {
+            'root': self.root_path,
+            'sub': text,
+            'regex': self.checkBoxRegex.isChecked(),
+            'whole_word': self.checkBoxWholeWords.isChecked(),
+            'case_sensitive': self.checkBoxCase.isChecked(),
+            'ignored_patterns': self.ignored_patterns,
+            'include_patterns': self.lineEditInclude.text().split(),
+            'limit': self.MAX_MATCHES,
+            'use_index': self.use_index
+        }
+        try:
+            self._request_id = self.backend.send_request(
+                find_in_files, request_data, self._on_results_available,
+                coalesce_key='find_in_files')
+        except NotRunning:
+            self.backend.call_when_started(self.search)
+        else:
+            self.buttonStop.setEnabled(True)
+            self.labelMatches.setText(_('Searching...'))
+
+    def stop(self):
+        """
+        Stops the current search.
+        """
+        if self._request_id is not None:
+            self.backend.cancel_request(self._request_id)
+            self._request_id = None
+            self._on_search_finished()
+
+    def clear(self):
+        """
+        Clears the results.
+        """
+        self.treeResults.clear()
+        self.labelMatches.clear()
+        self._nb_matches = self._nb_files = self._searched = 0
+
+    def close(self):
+        """
+        Stops the search and the backend.
+        """
+        self.stop()
+        self.backend.stop()
+        super(FindInFilesWidget, self).close()
+
+    def _on_results_available(self, results):
+        for path, matches in results['files']:
+            file_item = QtWidgets.QTreeWidgetItem(self.treeResults)
+            file_item.setText(0, '%s (%d)' % (
+                os.path.relpath(path, self.root_path), len(matches)))
+            file_item.setToolTip(0, path)
+            file_item.setData(0, QtCore.Qt.UserRole, (path, 0, 0, 0))
+            for line, column, length, text in matches:
+                item = QtWidgets.QTreeWidgetItem(file_item)
+                item.setText(0, '%d: %s' % (line + 1, text.strip()))
+                item.setData(0, QtCore.Qt.UserRole,
+                             (path, line, column, length))
+            self._nb_matches += len(matches)
+            self._nb_files += 1
+        self._searched = results['searched']
+        if results['done']:
+            self._request_id = None
+            self._on_search_finished()
+        else:
+            self._update_label_matches()
+
+    def _on_search_finished(self):
+        self.buttonStop.setEnabled(False)
+        self._update_label_matches()
+        self.search_finished.emit()
+
+    def _update_label_matches(self):
+        self.labelMatches.setText(
+            _('{0} matches in {1} files ({2} files searched)').format(
+                self._nb_matches, self._nb_files, self._searched))
+
+    def _on_item_activated(self, item, _column):
+        path, line, column, length = item.data(0, QtCore.Qt.UserRole)
+        self.match_activated.emit(path, line, column, length)
+        if self.tab_widget is None:
+            return
+        editor = self.tab_widget.open_document(path)
+        if editor is None:
+            return
+        cursor = TextHelper(editor).goto_line(line, column)
+        cursor.movePosition(cursor.Right, cursor.KeepAnchor, length)
+        editor.setTextCursor(cursor)
+        editor.centerCursor()
+        editor.setFocus()
@@ -76,6 +76,7 @@ setup(
     description=DESCRIPTION,
     long_description=readme(),
     install_requires=[pygments_req, 'pyqode.qt', 'future'],
+    extras_require={'msgpack': ['msgpack']},
     tests_require=['pytest-xdist', 'pytest-cov', 'pytest-pep8', 'pytest'],
     entry_points={
         'console_scripts': [
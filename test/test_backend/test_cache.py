@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+from pyqode.core.backend.cache import ResultCache
+
+
+def test_key():
+    data = {'code': 'print("foo")', 'path': 'foo.py'}
+    key = ResultCache.key('worker', data)
+    assert key == ResultCache.key('worker', dict(data))
+    assert key != ResultCache.key('other_worker', data)
+    assert key != ResultCache.key('worker', dict(data, code='foo'))
+    # the document handle is not part of the key
+    document = {'id': 'foo', 'version': 3}
+    assert key == ResultCache.key('worker', dict(data, document=document))
+    # synchronized document: the digest is used instead of the text
+    key = ResultCache.key('worker', data, 'code', 'digest')
+    assert key == ResultCache.key('worker', dict(data, code='foo'), 'code',
+                                  'digest')
+    assert key != ResultCache.key('worker', data, 'code', 'other digest')
+    # data that cannot be hashed
+    assert ResultCache.key('worker', {'code': object()}) is None
+
+
+def test_lru():
+    cache = ResultCache(max_size=2)
+    assert cache.get(None) is None
+    cache.put('a', [1])
+    cache.put('b', [2])
+    assert cache.get('a') == [1]
+    cache.put('c', [3])
+    assert len(cache) == 2
+    # b is the least recently used entry
+    assert cache.get('b') is None
+    assert cache.get('a') == [1]
+    assert cache.get('c') == [3]
+    cache.clear()
+    assert cache.get('a') is None
+
+
+def test_disabled():
+    cache = ResultCache(max_size=0)
+    cache.put('a', [1])
+    assert cache.get('a') is None
@@ -0,0 +1,53 @@
+"""
+Test the server side document mirrors.
+"""
+from pyqode.core.backend import documents
+
+
+def test_sync():
+    document = documents.sync({'id': 'doc', 'version': 1,
+                               'text': 'hello world'})
+    assert document.text == 'hello world'
+    documents.sync({'id': 'doc', 'version': 2,
+                    'changes': [[0, 5, 'goodbye'], [13, 0, '!']]})
+    document = documents.get('doc')
+    assert document.text == 'goodbye world!'
+    assert document.version == 2
+    documents.sync({'id': 'doc', 'close': True})
+    assert documents.get('doc') is None
+
+
+def test_out_of_sync():
+    documents.sync({'id': 'doc', 'version': 1, 'text': 'hello world'})
+    # version 2 has been lost
+    assert documents.sync({'id': 'doc', 'version': 3,
+                           'changes': [[0, 0, 'foo']]}) is None
+    assert documents.get('doc') is None
+
+
+def test_digest():
+    documents.sync({'id': 'doc', 'version': 1, 'text': 'foo'})
+    documents.sync({'id': 'clone', 'version': 1, 'text': 'foo bar'})
+    digest = documents.digest('clone', 1)
+    assert digest != documents.digest('doc', 1)
+    documents.sync({'id': 'doc', 'version': 2, 'changes': [[3, 0, ' bar']]})
+    # same text, same digest
+    assert documents.digest('doc', 2) == digest
+    assert documents.digest('doc', 1) is None
+    documents.sync({'id': 'doc', 'version': 3, 'changes': [[3, 4, '']]})
+    assert documents.digest('doc', 3) != digest
+    documents.sync({'id': 'doc', 'close': True})
+    documents.sync({'id': 'clone', 'close': True})
+
+
+def test_astral_characters():
+    # the positions are expressed in UTF-16 code units, like in Qt: the
+    # emoji counts for two units
+    documents.sync({'id': 'doc', 'version': 1, 'text': u'a\U0001f600b c'})
+    documents.sync({'id': 'doc', 'version': 2,
+                    'changes': [[5, 1, u'd'], [6, 0, u'\U0001f600']]})
+    assert documents.get('doc').text == u'a\U0001f600b d\U0001f600'
+    documents.sync({'id': 'doc', 'version': 3,
+                    'changes': [[1, 2, u''], [4, 2, u'!']]})
+    assert documents.get('doc').text == u'ab d!'
+    documents.sync({'id': 'doc', 'close': True})
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import os
+
+import pytest
+
+from pyqode.core.backend import index, search, workers
+
+
+@pytest.fixture
+def tree(tmpdir, monkeypatch):
+    monkeypatch.setattr(search, 'processes', 0)
+    root = tmpdir.mkdir('project')
+    root.join('a.py').write('import os\nprint(os.sep)\n')
+    root.join('b.py').write('import sys\nprint(sys.path)\n')
+    root.join('c.txt').write('nothing to see here\n')
+    return str(root)
+
+
+def _paths(tree):
+    return list(search.walk(tree))
+
+
+def _names(paths):
+    return sorted(os.path.basename(p) for p in paths)
+
+
+def test_required_literals():
+    assert index.required_literals('foo.bar') == ['foo.bar']
+    assert index.required_literals(r'foo\.ba+r', regex=True) == [
+        'foo.b', 'r']
+    assert index.required_literals('foo|bar', regex=True) == []
+    assert index.required_literals('(', regex=True) == []
+
+
+def test_candidates(tree, tmpdir):
+    idx = index.TrigramIndex(tree, str(tmpdir.join('cache')))
+    paths = _paths(tree)
+    assert _names(idx.filter(paths, 'PRINT')) == ['a.py', 'b.py']
+    assert _names(idx.filter(paths, 'sys.path')) == ['b.py']
+    assert _names(idx.filter(paths, ['os.sep', 'see'])) == ['a.py', 'c.txt']
+    assert _names(idx.filter(paths, r'sys\.\w+', regex=True)) == ['b.py']
+    # too short or alternation: no filtering
+    assert idx.filter(paths, 'os') == paths
+    assert idx.filter(paths, 'os|sys', regex=True) == paths
+
+
+def test_incremental_update(tree, tmpdir):
+    cache = str(tmpdir.join('cache'))
+    idx = index.TrigramIndex(tree, cache)
+    paths = _paths(tree)
+    assert idx.update(paths)
+    assert not idx.update(paths)
+    assert not os.path.exists(idx.path)
+    idx.save()
+    # modify and remove files
+    path = os.path.join(tree, 'c.txt')
+    with open(path, 'w') as f:
+        f.write('import glob\n')
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+    os.remove(os.path.join(tree, 'a.py'))
+    paths = _paths(tree)
+    assert idx.update(paths)
+    assert _names(idx.filter(paths, 'import')) == ['b.py', 'c.txt']
+    assert 'a.py' not in _names(idx.files)
+    # the persisted index survives a restart
+    idx.save()
+    restored = index.TrigramIndex(tree, cache)
+    assert sorted(restored.files) == sorted(idx.files)
+    assert not restored.update(paths)
+    assert _names(restored.filter(paths, 'import glob')) == ['c.txt']
+
+
+def test_iter_filter(tree, tmpdir, monkeypatch):
+    monkeypatch.setattr(search, 'BATCH_SIZE', 1)
+    idx = index.TrigramIndex(tree, str(tmpdir.join('cache')))
+    # the paths are consumed lazily, the first candidate is generated before
+    # the whole tree has been walked
+    walked = []
+
+    def paths():
+        for path in search.walk(tree):
+            walked.append(path)
+            yield path
+
+    candidates = idx.iter_filter(paths(), 'PRINT')
+    assert os.path.basename(next(candidates)) == 'a.py'
+    assert len(walked) < 3
+    assert _names(candidates) == ['b.py']
+    assert os.path.exists(idx.path)
+    assert _names(idx.iter_filter(_paths(tree), 'sys.path')) == ['b.py']
+
+
+def test_find_in_files_with_index(tree, tmpdir):
+    data = {'root': tree, 'sub': 'sys.path', 'regex': False,
+            'whole_word': False, 'case_sensitive': True, 'use_index': True,
+            'index_dir': str(tmpdir.join('cache'))}
+    chunks = list(workers.find_in_files(data))
+    assert chunks[-1]['searched'] == 1
+    files = [f for chunk in chunks for f in chunk['files']]
+    assert [os.path.basename(path) for path, _ in files] == ['b.py']
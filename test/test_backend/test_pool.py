@@ -0,0 +1,67 @@
+"""
+Tests the worker pool used by the backend server.
+"""
+import threading
+import time
+
+from pyqode.core.backend.pool import (
+    WorkerPool, PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL)
+
+
+def wait_idle(pool, timeout=5):
+    end = time.time() + timeout
+    while pool.busy and time.time() < end:
+        time.sleep(0.01)
+
+
+def test_priority():
+    pool = WorkerPool(size=1)
+    event = threading.Event()
+    executed = []
+    # block the only thread of the pool until all jobs have been queued
+    pool.submit(event.wait)
+    pool.submit(lambda: executed.append('low'), priority=PRIORITY_LOW)
+    pool.submit(lambda: executed.append('normal'), priority=PRIORITY_NORMAL)
+    pool.submit(lambda: executed.append('high'), priority=PRIORITY_HIGH)
+    event.set()
+    wait_idle(pool)
+    pool.stop()
+    assert executed == ['high', 'normal', 'low']
+
+
+def test_concurrency_limit():
+    pool = WorkerPool(size=4)
+    lock = threading.Lock()
+    running = [0]
+    max_running = [0]
+
+    def job():
+        with lock:
+            running[0] += 1
+            max_running[0] = max(max_running[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+
+    for i in range(8):
+        pool.submit(job, group='lint', limit=2)
+    time.sleep(0.01)
+    wait_idle(pool)
+    pool.stop()
+    assert max_running[0] == 2
+
+
+def test_background_jobs():
+    pool = WorkerPool(size=1)
+    event = threading.Event()
+    executed = []
+    # a long background job does not hold the thread of the other jobs
+    pool.submit(event.wait, priority=PRIORITY_LOW, background=True)
+    pool.submit(lambda: executed.append('high'), priority=PRIORITY_HIGH)
+    end = time.time() + 5
+    while not executed and time.time() < end:
+        time.sleep(0.01)
+    assert executed == ['high']
+    event.set()
+    wait_idle(pool)
+    pool.stop()
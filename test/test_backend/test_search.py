@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+
+import pytest
+
+from pyqode.core.backend import search, workers
+
+
+@pytest.fixture
+def tree(tmpdir):
+    root = tmpdir.mkdir('project')
+    root.join('main.py').write('import os\nprint(os.sep)\n')
+    root.join('main.pyc').write('import os\n')
+    root.mkdir('__pycache__').join('main.py').write('import os\n')
+    with io.open(str(root.join('utf8.txt')), 'w', encoding='utf-8') as f:
+        f.write(u'h\xe9h\xe9 os\n')
+    root.join('binary.dat').write_binary(b'\0import os')
+    return str(root)
+
+
+def test_walk(tree):
+    paths = [os.path.relpath(p, tree) for p in search.walk(tree)]
+    assert paths == ['binary.dat', 'main.py', 'utf8.txt']
+    paths = list(search.walk(tree, include_patterns=['*.py']))
+    assert paths == [os.path.join(tree, 'main.py')]
+
+
+def test_search_file(tree):
+    expr = workers.compile_search('os', whole_word=True, case_sensitive=True,
+                                  encoding='utf-8')
+    matches = search.search_file(os.path.join(tree, 'main.py'),
+                                 expr.pattern, expr.flags)
+    assert matches == [(0, 7, 2, 'import os'), (1, 6, 2, 'print(os.sep)')]
+    # columns are expressed in characters
+    matches = search.search_file(os.path.join(tree, 'utf8.txt'),
+                                 expr.pattern, expr.flags)
+    assert matches == [(0, 5, 2, u'h\xe9h\xe9 os')]
+    # binary files are skipped
+    assert not search.search_file(os.path.join(tree, 'binary.dat'),
+                                  expr.pattern, expr.flags)
+
+
+def test_find_in_files(tree, monkeypatch):
+    monkeypatch.setattr(search, 'processes', 0)
+    data = {'root': tree, 'sub': 'os', 'regex': False, 'whole_word': True,
+            'case_sensitive': True}
+    chunks = list(workers.find_in_files(data))
+    assert chunks[-1]['done']
+    assert chunks[-1]['searched'] == 3
+    files = [f for chunk in chunks for f in chunk['files']]
+    assert [os.path.basename(path) for path, _ in files] == [
+        'main.py', 'utf8.txt']
+    data['limit'] = 1
+    files = [f for chunk in workers.find_in_files(data)
+             for f in chunk['files']]
+    assert len(files) == 1 and len(files[0][1]) == 1
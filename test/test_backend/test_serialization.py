@@ -0,0 +1,32 @@
+"""
+Test the message codecs.
+"""
+import pytest
+
+from pyqode.core.backend import serialization
+
+
+OBJ = {'request_id': 'id', 'results': [[0, 4], [10, 4]], 'text': u'\xe9t\xe9'}
+
+
+def test_json():
+    codec = serialization.JsonCodec
+    assert codec.loads(bytearray(codec.dumps(OBJ))) == OBJ
+
+
+@pytest.mark.skipif(serialization.msgpack is None,
+                    reason='msgpack is not installed')
+def test_msgpack():
+    codec = serialization.MsgPackCodec
+    assert codec.loads(bytearray(codec.dumps(OBJ))) == OBJ
+    # int keys are accepted, as with json
+    assert codec.loads(codec.dumps({1: 'foo'})) == {1: 'foo'}
+
+
+def test_negotiate():
+    assert serialization.negotiate(['foo']) is serialization.JsonCodec
+    assert serialization.negotiate(
+        serialization.available_codecs()).name == \
+        serialization.available_codecs()[0]
+    with pytest.raises(ValueError):
+        serialization.get_codec('foo')
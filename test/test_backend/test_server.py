@@ -0,0 +1,408 @@
+"""
+Test the backend server protocol using plain python sockets.
+"""
+import json
+import os
+import socket
+import struct
+import tempfile
+import threading
+
+import pytest
+
+from pyqode.core import backend
+from pyqode.core.backend import workers
+
+
+def pick_free_port():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(('127.0.0.1', 0))
+    port = int(sock.getsockname()[1])
+    sock.close()
+    return port
+
+
+def start_server():
+    port = pick_free_port()
+    args = backend.default_parser().parse_args([str(port)])
+    server = backend.JsonServer(args=args)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    server.thread = thread
+    return server, port
+
+
+def send(sock, obj):
+    msg = json.dumps(obj).encode('utf-8')
+    sock.sendall(struct.pack('=I', len(msg)) + msg)
+
+
+def recv_bytes(sock, size):
+    data = bytes()
+    while len(data) < size:
+        data += sock.recv(size - len(data))
+    return data
+
+
+def recv(sock):
+    size = struct.unpack('=I', recv_bytes(sock, 4))[0]
+    return json.loads(recv_bytes(sock, size).decode('utf-8'))
+
+
+def echo_request(request_id, data):
+    return {'request_id': request_id,
+            'worker': 'pyqode.core.backend.workers.echo_worker',
+            'data': data}
+
+
+def test_persistent_connection():
+    server, port = start_server()
+    try:
+        sock = socket.create_connection(('127.0.0.1', port))
+        send(sock, echo_request('1', 'some data'))
+        send(sock, echo_request('2', 'some other data'))
+        responses = {}
+        for i in range(2):
+            response = recv(sock)
+            responses[response['request_id']] = response['results']
+        assert responses == {'1': 'some data', '2': 'some other data'}
+        sock.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_concurrent_connections():
+    server, port = start_server()
+    try:
+        sock1 = socket.create_connection(('127.0.0.1', port))
+        sock2 = socket.create_connection(('127.0.0.1', port))
+        send(sock1, echo_request('1', 'foo'))
+        send(sock2, echo_request('2', 'bar'))
+        assert recv(sock2)['results'] == 'bar'
+        assert recv(sock1)['results'] == 'foo'
+        sock1.close()
+        sock2.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def sleep_worker(data):
+    import time
+    time.sleep(data)
+    return data
+
+
+def sleep_request(request_id, data, **kwargs):
+    request = {'request_id': request_id,
+               'worker': 'test.test_backend.test_server.sleep_worker',
+               'data': data}
+    request.update(kwargs)
+    return request
+
+
+def test_coalescing():
+    server, port = start_server()
+    try:
+        sock = socket.create_connection(('127.0.0.1', port))
+        # block the pool
+        send(sock, sleep_request('1', 0.2))
+        send(sock, sleep_request('2', 0, coalesce_key='key'))
+        send(sock, sleep_request('3', 0.01, coalesce_key='key'))
+        responses = dict((r['request_id'], r) for r in
+                         [recv(sock), recv(sock), recv(sock)])
+        assert responses['1']['results'] == 0.2
+        assert responses['2']['cancelled']
+        assert responses['3']['results'] == 0.01
+        sock.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_cancel():
+    server, port = start_server()
+    try:
+        sock = socket.create_connection(('127.0.0.1', port))
+        send(sock, sleep_request('1', 0.2))
+        send(sock, sleep_request('2', 0))
+        send(sock, {'request_id': '2', 'cancel': True})
+        responses = dict((r['request_id'], r) for r in
+                         [recv(sock), recv(sock)])
+        assert responses['1']['results'] == 0.2
+        assert responses['2']['cancelled']
+        sock.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_document_sync():
+    server, port = start_server()
+    try:
+        sock = socket.create_connection(('127.0.0.1', port))
+        handle = {'id': 'doc', 'version': 2, 'key': 'text'}
+        send(sock, {'sync': {'id': 'doc', 'version': 1, 'text': 'foo'}})
+        send(sock, {'sync': {'id': 'doc', 'version': 2,
+                             'changes': [[3, 0, ' bar']]}})
+        send(sock, dict(echo_request('1', {}), document=handle))
+        assert recv(sock)['results']['text'] == 'foo bar'
+        # unknown version
+        handle['version'] = 3
+        send(sock, dict(echo_request('2', {}), document=handle))
+        assert recv(sock)['resync']
+        sock.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_codec_negotiation():
+    server, port = start_server()
+    try:
+        sock = socket.create_connection(('127.0.0.1', port))
+        send(sock, {'hello': {'codecs': ['unknown', 'json']}})
+        assert recv(sock) == {'hello': {'codec': 'json'}}
+        send(sock, echo_request('1', 'foo'))
+        assert recv(sock)['results'] == 'foo'
+        sock.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_malformed_message():
+    server, port = start_server()
+    try:
+        sock = socket.create_connection(('127.0.0.1', port))
+        sock.sendall(struct.pack('=I', 9) + b'{not json')
+        response = recv(sock)
+        assert response['request_id'] is None
+        assert response['error']
+        # the connection is still usable
+        send(sock, echo_request('1', 'foo'))
+        assert recv(sock)['results'] == 'foo'
+        sock.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class PersistentWorker(object):
+    persistent = True
+    closed = []
+
+    def setup(self):
+        self.calls = 0
+
+    def close_document(self, document_id):
+        PersistentWorker.closed.append(document_id)
+
+    def __call__(self, data):
+        self.calls += 1
+        return self.calls
+
+
+def test_persistent_worker():
+    server, port = start_server()
+    try:
+        sock = socket.create_connection(('127.0.0.1', port))
+        name = 'test.test_backend.test_server.PersistentWorker'
+        for i in range(2):
+            send(sock, {'request_id': str(i), 'worker': name, 'data': {}})
+            assert recv(sock)['results'] == i + 1
+        send(sock, {'sync': {'id': 'doc', 'version': 1, 'text': ''}})
+        send(sock, {'sync': {'id': 'doc', 'close': True}})
+        send(sock, echo_request('3', 'foo'))
+        assert recv(sock)['results'] == 'foo'
+        assert PersistentWorker.closed == ['doc']
+        sock.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def streaming_worker(data):
+    for i in range(data):
+        yield i
+
+streaming_worker.streaming = True
+
+
+def test_streaming_worker():
+    server, port = start_server()
+    try:
+        sock = socket.create_connection(('127.0.0.1', port))
+        name = 'test.test_backend.test_server.streaming_worker'
+        send(sock, {'request_id': '1', 'worker': name, 'data': 3})
+        for i in range(3):
+            response = recv(sock)
+            assert response['results'] == i
+            assert response['more']
+        response = recv(sock)
+        assert response['request_id'] == '1'
+        assert response['end']
+        send(sock, echo_request('2', 'foo'))
+        assert recv(sock)['results'] == 'foo'
+        sock.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def detached_worker(data):
+    yield 'first'
+    yield backend.pool.DETACH
+    data['event'].wait(5)
+    yield 'late'
+
+detached_worker.streaming = True
+
+
+def test_detached_stream(monkeypatch):
+    server, port = start_server()
+    event = threading.Event()
+    # the event cannot be sent through the socket
+    monkeypatch.setattr(server.RequestHandlerClass, 'resolve_document',
+                        lambda self, data: data['data'].update(
+                            event=event) or True)
+    try:
+        sock = socket.create_connection(('127.0.0.1', port))
+        name = 'test.test_backend.test_server.detached_worker'
+        send(sock, {'request_id': '1', 'worker': name, 'data': {},
+                    'document': {}})
+        assert recv(sock)['results'] == 'first'
+        # the pool thread is not held while the worker waits
+        send(sock, echo_request('2', 'foo'))
+        assert recv(sock)['results'] == 'foo'
+        event.set()
+        assert recv(sock)['results'] == 'late'
+        response = recv(sock)
+        assert response['request_id'] == '1'
+        assert response['end']
+        sock.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def cacheable_worker(data):
+    cacheable_worker.calls += 1
+    return data['code'].upper()
+
+cacheable_worker.calls = 0
+cacheable_worker.cacheable = True
+
+
+def test_cacheable_worker():
+    server, port = start_server()
+    try:
+        sock = socket.create_connection(('127.0.0.1', port))
+        name = 'test.test_backend.test_server.cacheable_worker'
+        for i, code in enumerate(['foo', 'foo', 'bar', 'foo']):
+            send(sock, {'request_id': str(i), 'worker': name,
+                        'data': {'code': code}})
+            assert recv(sock)['results'] == code.upper()
+        assert cacheable_worker.calls == 2
+        assert server.stats.snapshot()[name]['cache_hits'] == 2
+        sock.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_findall_cache():
+    server, port = start_server()
+    try:
+        sock = socket.create_connection(('127.0.0.1', port))
+        name = 'pyqode.core.backend.workers.findall'
+        data = {'string': 'foo\nbar foo\nfoo', 'sub': 'foo',
+                'regex': False, 'whole_word': True, 'case_sensitive': True,
+                'compact': True}
+        requests = [{}, {'position': 5}, {'position': 5, 'limit': 1},
+                    {'chunk_size': 2}]
+        for i, params in enumerate(requests):
+            send(sock, {'request_id': str(i), 'worker': name,
+                        'data': dict(data, **params)})
+            results = recv(sock)['results']
+            if params.get('chunk_size'):
+                assert results == {'matches': [0, 3, 8, 3], 'done': False}
+                assert recv(sock)['results'] == {'matches': [12, 3],
+                                                 'done': True}
+                recv(sock)
+            else:
+                assert results == workers.findall(dict(data, **params))
+        # the requests share the occurrences found by the first one
+        assert server.stats.snapshot()[name]['cache_hits'] == 3
+        # synchronized documents with the same text share their results
+        for i, document_id in enumerate(['doc', 'clone']):
+            send(sock, {'sync': {'id': document_id, 'version': 1,
+                                 'text': data['string']}})
+            send(sock, {'request_id': 'doc%d' % i, 'worker': name,
+                        'data': dict(data, string=None),
+                        'document': {'id': document_id, 'version': 1,
+                                     'key': 'string'}})
+            assert recv(sock)['results'] == [0, 3, 8, 3, 12, 3]
+        assert server.stats.snapshot()[name]['cache_hits'] == 4
+        sock.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'),
+                    reason='unix domain sockets not supported')
+def test_local_transport():
+    path = os.path.join(tempfile.gettempdir(), 'pyqode-test.sock')
+    args = backend.default_parser().parse_args([path, '--transport',
+                                                'local'])
+    server = backend.JsonServer(args=args)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    try:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(path)
+        send(sock, echo_request('1', 'foo'))
+        assert recv(sock)['results'] == 'foo'
+        sock.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert not os.path.exists(path)
+
+
+def test_stats():
+    server, port = start_server()
+    try:
+        sock = socket.create_connection(('127.0.0.1', port))
+        send(sock, echo_request('1', 'foo'))
+        recv(sock)
+        send(sock, {'request_id': '2', 'stats': True})
+        response = recv(sock)
+        assert response['request_id'] == '2'
+        stats = response['results']['pyqode.core.backend.workers.echo_worker']
+        assert stats['requests'] == 1
+        assert stats['execution_time']['count'] == 1
+        assert stats['response_size']['max'] > 0
+        sock.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_shutdown_when_idle():
+    server, port = start_server()
+    server.timeout = 0.1
+    sock = socket.create_connection(('127.0.0.1', port))
+    send(sock, echo_request('1', 'foo'))
+    recv(sock)
+    # the server stays alive as long as the client is connected
+    server.thread.join(0.3)
+    assert server.thread.is_alive()
+    sock.close()
+    server.thread.join(5)
+    assert not server.thread.is_alive()
+    server.server_close()
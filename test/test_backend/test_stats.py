@@ -0,0 +1,18 @@
+"""
+Test the backend statistics.
+"""
+from pyqode.core.backend.stats import Statistics
+
+
+def test_statistics():
+    stats = Statistics()
+    stats.count('worker', 'requests')
+    stats.count('worker', 'requests')
+    stats.record('worker', 'execution_time', 1)
+    stats.record('worker', 'execution_time', 3)
+    snapshot = stats.snapshot()
+    assert snapshot['worker']['requests'] == 2
+    assert snapshot['worker']['execution_time'] == {
+        'count': 2, 'total': 4, 'mean': 2, 'max': 3}
+    stats.reset()
+    assert stats.snapshot() == {}
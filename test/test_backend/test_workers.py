@@ -1,3 +1,5 @@
+import time
+
 import pytest
 from pyqode.core.backend import workers
 
@@ -24,12 +26,15 @@ def test_code_completion_worker():
         'path': '',
         'encoding': 'utf-8',
         'prefix': '',
-        'request_id': 47
+        'request_id': 47,
+        'abs_pos': 0,
+        'mime_type': 'text/x-python'
     }
     completion_groups = worker(data)
     context = completion_groups[0]
     completion_groups = completion_groups[1:]
-    line, column, req_id = context
+    line, column, req_id, more = context
+    assert not more
     assert req_id == 47
     assert line == 1
     assert column == 0
@@ -104,6 +109,18 @@ with open('test/files/foo.py', 'r') as f:
         'regex': True,
         'whole_word': False,
         'case_sensitive': False}, 1),
+    ({
+        'string': 'import importable;\nimport',
+        'sub': 'mport',
+        'regex': True,
+        'whole_word': True,
+        'case_sensitive': True}, 3),
+    ({
+        'string': 'aaa a',
+        'sub': 'aa',
+        'regex': False,
+        'whole_word': False,
+        'case_sensitive': True}, 2),
     ({
         'string': 'super().__init__(foo, eggs)\nsuper(Foo,self).__init__()',
         'sub': '',
@@ -114,3 +131,161 @@ with open('test/files/foo.py', 'r') as f:
 def test_find_all(data, nb_expected):
     results = workers.findall(data)
     assert len(results) == nb_expected
+
+
+def test_find_all_compact():
+    data = {'string': 'import importable;\nimport', 'sub': 'import',
+            'regex': False, 'whole_word': True, 'case_sensitive': True,
+            'compact': True}
+    assert workers.findall(data) == [0, 6, 19, 6]
+
+
+def test_find_all_patterns():
+    data = {'string': 'foo.bar(foobar, Bar)', 'sub': ['bar', 'foobar'],
+            'regex': False, 'whole_word': True, 'case_sensitive': False}
+    assert workers.findall(data) == [(4, 7, 0), (8, 14, 1), (16, 19, 0)]
+    data['compact'] = True
+    assert workers.findall(data) == [4, 3, 0, 8, 6, 1, 16, 3, 0]
+
+
+def test_find_all_from_position():
+    data = {'string': 'foo\nfoo bar\nfoo', 'sub': 'foo', 'regex': False,
+            'whole_word': True, 'case_sensitive': True, 'compact': True,
+            'position': 6}
+    # starts on the line of the position and wraps around
+    assert workers.findall(data) == [4, 3, 12, 3, 0, 3]
+    data['limit'] = 2
+    assert workers.findall(data) == [4, 3, 12, 3]
+
+
+def test_find_all_chunks():
+    data = {'string': 'foo ' * 5, 'sub': 'foo', 'regex': False,
+            'whole_word': True, 'case_sensitive': True, 'compact': True,
+            'chunk_size': 2}
+    chunks = list(workers.findall(data))
+    assert chunks == [{'matches': [0, 3, 4, 3], 'done': False},
+                      {'matches': [8, 3, 12, 3], 'done': False},
+                      {'matches': [16, 3], 'done': True}]
+    data['sub'] = 'bar'
+    assert list(workers.findall(data)) == [{'matches': [], 'done': True}]
+
+
+def test_code_completion_filter():
+    completions = [{'name': name} for name in [
+        'foo', 'barfoo', 'Foobar', 'fxoo', 'bar', 'f']]
+    results, more = workers.CodeCompletionWorker.filter(completions, 'foo')
+    assert [c['name'] for c in results] == ['foo', 'Foobar', 'barfoo', 'fxoo']
+    assert not more
+    results, more = workers.CodeCompletionWorker.filter(
+        completions, 'foo', case_sensitive=True, max_results=2)
+    assert [c['name'] for c in results] == ['foo', 'barfoo']
+    assert more
+    results, more = workers.CodeCompletionWorker.filter(completions, '')
+    assert results == completions
+
+
+class StaticProvider(workers.CodeCompletionWorker.Provider):
+    def __init__(self, names, delay=0):
+        self.names = names
+        self.delay = delay
+
+    def complete(self, *args, **kwargs):
+        time.sleep(self.delay)
+        return [{'name': name} for name in self.names]
+
+
+def test_code_completion_worker_parallel(monkeypatch):
+    monkeypatch.setattr(workers.CodeCompletionWorker, 'providers', [
+        StaticProvider(['foo', 'bar'], delay=0.5), StaticProvider(['baz']),
+        StaticProvider(['bar', 'spam'])])
+    assert not workers.CodeCompletionWorker.streaming()
+    monkeypatch.setattr(workers.CodeCompletionWorker, 'parallel', True)
+    assert workers.CodeCompletionWorker.streaming()
+    worker = workers.CodeCompletionWorker()
+    data = {'code': '', 'line': 1, 'column': 0, 'path': '',
+            'encoding': 'utf-8', 'prefix': '', 'request_id': 47,
+            'abs_pos': 0, 'mime_type': 'text/plain'}
+    results = [chunk for chunk in worker(data) if chunk is not None]
+    # the slow provider is late: its completions come in a follow-up, the
+    # late providers are not waited for in a pool thread
+    assert results[1] is workers.DETACH
+    del results[1]
+    assert len(results) == 2
+    assert [c['name'] for c in results[0][1]] == ['baz', 'bar', 'spam']
+    assert [c['name'] for c in results[1][1]] == ['foo', 'bar', 'baz',
+                                                  'spam']
+    # the providers that are too late are dropped, the stream can be closed
+    # while waiting
+    monkeypatch.setattr(workers.CodeCompletionWorker, 'late_timeout', 0.1)
+    results = [chunk for chunk in worker(data)
+               if chunk not in (None, workers.DETACH)]
+    assert len(results) == 1
+    stream = worker(data)
+    start = time.time()
+    assert next(stream) is None
+    stream.close()
+    assert time.time() - start < 0.1
+
+
+def test_document_words_provider_index():
+    provider = workers.DocumentWordsProvider()
+    document = {'id': 'doc', 'version': 1}
+    code = 'import os\ndef foo(bar):\n    return bar.baz\n'
+    names = [c['name'] for c in provider.complete(code, document=document)]
+    assert names == workers.DocumentWordsProvider.split(
+        code, provider.separators)
+    # incremental update
+    code = 'import os\ndef foo(spam):\n    return eggs.baz\n'
+    names = [c['name'] for c in provider.complete(code, document=document)]
+    assert names == ['baz', 'def', 'eggs', 'foo', 'import', 'os', 'return',
+                     'spam']
+    assert provider.index('doc', code).lookup('e') == ['eggs']
+    provider.close_document('doc')
+    assert not provider._documents
+
+
+def test_document_words_provider_all_documents():
+    provider = workers.DocumentWordsProvider()
+    provider.all_documents = True
+    provider.complete('foo bar', document={'id': '1', 'version': 1})
+    names = [c['name'] for c in provider.complete(
+        'spam bar', document={'id': '2', 'version': 1})]
+    assert names == ['bar', 'foo', 'spam']
+    provider.complete('spam eggs', document={'id': '2', 'version': 2})
+    assert provider._all_words.words == ['bar', 'eggs', 'foo', 'spam']
+    provider.close_document('1')
+    assert provider._all_words.words == ['eggs', 'spam']
+
+
+def test_document_words_provider_prefix():
+    provider = workers.DocumentWordsProvider()
+    code = 'import os\nOsError = osname = foo\nfilename = pos = oxs\n'
+    names = [c['name'] for c in provider.complete(code, path='a.py',
+                                                  prefix='os')]
+    # same matching as the completion filter: contains or subsequence
+    assert names == ['OsError', 'os', 'osname', 'oxs', 'pos']
+    names = [c['name'] for c in provider.complete(code, path='a.py',
+                                                  prefix='name')]
+    assert names == ['filename', 'osname']
+    assert provider.index('a.py', code).lookup('Os') == ['OsError']
+
+
+def test_document_words_provider_unsynced_documents(monkeypatch):
+    monkeypatch.setattr(workers.DocumentWordsProvider,
+                        'max_unsynced_documents', 2)
+    provider = workers.DocumentWordsProvider()
+    provider.complete('foo', path='a.py')
+    provider.complete('bar', path='b.py')
+    provider.complete('spam', document={'id': 'doc', 'version': 1})
+    provider.complete('foo', path='a.py')
+    provider.complete('eggs', path='c.py')
+    # b.py is the least recently used unsynchronized document
+    assert sorted(provider._documents) == ['a.py', 'c.py', 'doc']
+
+
+def test_find_all_overlapping():
+    data = {'string': 'aaa\naaa', 'sub': 'AA', 'regex': False,
+            'whole_word': False, 'case_sensitive': False}
+    assert workers.findall(data) == [(0, 2), (1, 3), (4, 6), (5, 7)]
+    data['position'] = 5
+    assert workers.findall(data) == [(4, 6), (5, 7), (0, 2), (1, 3)]
@@ -1,5 +1,6 @@
 from pyqode.qt.QtTest import QTest
 from pyqode.core import modes
+from pyqode.core.api import TextBlockHelper
 from test.helpers import editor_open
 
 
@@ -27,3 +28,76 @@ def test_apply_all_pygments_styles(editor):
         mode.pygments_style = style
         assert mode.pygments_style == style
         QTest.qWait(500)
+
+
+def test_multiline_string_state(editor):
+    mode = get_mode(editor)
+    editor.setPlainText('a = 1\nb = 2\nc = 3', 'text/x-python', 'utf-8')
+    block = editor.document().lastBlock()
+    root = TextBlockHelper.get_state(block)
+    assert TextBlockHelper.get_state(block.previous()) == root
+    # opening a multi-line string changes the state of the next blocks
+    cursor = editor.textCursor()
+    cursor.movePosition(cursor.Start)
+    cursor.insertText('"""')
+    assert TextBlockHelper.get_state(block) != root
+    assert mode._state_stack(TextBlockHelper.get_state(block)) != ('root',)
+    # and closing it restores it
+    cursor.insertText('"""')
+    assert TextBlockHelper.get_state(block) == root
+
+
+def test_token_cache(editor):
+    mode = get_mode(editor)
+    mode._runs.clear()
+    editor.setPlainText('pass\npass\npass\npass', 'text/x-python', 'utf-8')
+    # the first line is lexed from an unknown state, all the other lines
+    # come from the cache after the second one.
+    assert len(mode._runs) == 2
+    mode.max_cached_lines = 0
+    mode.rehighlight()
+    assert not mode._runs
+    mode.max_cached_lines = 1
+    mode.rehighlight()
+    assert len(mode._runs) == 1
+    del mode.max_cached_lines
+
+
+def test_lexer_options(editor):
+    from pygments.lexers import PythonLexer
+    mode = get_mode(editor)
+    editor.setPlainText('def foo():\n    pass', 'text/x-python', 'utf-8')
+    state = TextBlockHelper.get_state(editor.document().lastBlock())
+    # same class, different options: the states and the cached tokens must
+    # not be shared
+    mode._lexer = PythonLexer(stripnl=False)
+    key = mode._lexer_key()
+    assert key != (PythonLexer, frozenset(PythonLexer().options.items()))
+    mode.rehighlight()
+    assert TextBlockHelper.get_state(
+        editor.document().lastBlock()) != state
+    assert any(k[0] == key for k in mode._runs)
+    mode.set_lexer_from_mime_type('text/x-python')
+
+
+def test_lexer_index(editor):
+    from pygments.lexers import get_lexer_for_filename
+    from pyqode.core.modes import pygments_sh
+    # the index is built in the background, pygments is used meanwhile
+    pygments_sh._get_lexer_index()
+    pygments_sh._index_thread.join()
+    assert pygments_sh._get_lexer_index()['key'] == \
+        pygments_sh._lexer_index_key()
+    mode = get_mode(editor)
+    for filename in ['setup.py', 'CMakeLists.txt', 'test.h', 'test.cpp',
+                     'fooSpec.hs', 'Makefile.am']:
+        mode.set_lexer_from_filename(filename)
+        lexer = mode._lexer
+        assert lexer.__class__ is get_lexer_for_filename(filename).__class__
+        # lexers are shared
+        mode.set_lexer_from_filename(filename)
+        assert mode._lexer is lexer
+    mode.set_lexer_from_filename('file.unknown-extension')
+    assert mode._lexer.__class__.__name__ == 'TextLexer'
+    mode.set_lexer_from_mime_type('text/x-python')
+    assert mode._lexer.__class__.__name__ == 'PythonLexer'
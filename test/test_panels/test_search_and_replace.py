@@ -139,6 +139,22 @@ def test_replace(editor):
     assert panel.cpt_occurences == nb_occurences + 1
 
 
+@editor_open(__file__)
+@ensure_connected
+def test_max_occurrences(editor, monkeypatch):
+    panel = get_panel(editor)
+    monkeypatch.setattr(panel, 'MAX_OCCURRENCES', 2)
+    panel.request_search('import')
+    QTest.qWait(2000)
+    # the search stops at the limit
+    assert panel.cpt_occurences == 2
+    assert panel.labelMatches.text() == '2+ matches'
+    panel.lineEditReplace.setText('IMPORT')
+    panel.replace_all()
+    assert panel.cpt_occurences == 0
+    assert 'import' not in editor.toPlainText()
+
+
 @editor_open(__file__)
 @ensure_connected
 def test_event_filter(editor):